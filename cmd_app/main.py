@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 
 import os
+import csv
 import json
 import datetime
 import time
@@ -9,7 +10,7 @@ from tabulate import tabulate
 from models.khach_hang import KhachHang
 from models.hoa_don import HoaDon
 from models.bang_gia import BangGia
-from utils.db_handler import DatabaseHandler
+from utils.sqlite_handler import open_database
 import sys
 import random
 import re
@@ -77,7 +78,8 @@ VTN_LOGO = f"""
 
 class QuanLyDien:
     def __init__(self):
-        self.db = DatabaseHandler()
+        # Mở cơ sở dữ liệu (SQLite, tự chuyển từ JSON ở lần chạy đầu tiên)
+        self.db = open_database(analytics=True)
         self.current_menu = self.menu_chinh
         # Lấy kích thước terminal
         self.terminal_width = self._get_terminal_width()
@@ -460,6 +462,9 @@ class QuanLyDien:
                 "[bold yellow]4.[/bold yellow] [white]Xóa hóa đơn",
                 "[bold yellow]5.[/bold yellow] [white]Tìm kiếm hóa đơn",
                 "[bold yellow]6.[/bold yellow] [white]Xuất hóa đơn",
+                "[bold yellow]7.[/bold yellow] [white]Lập hóa đơn hàng loạt",
+                "[bold yellow]8.[/bold yellow] [white]Nhập chỉ số công tơ từ file",
+                "[bold yellow]9.[/bold yellow] [white]Xuất PDF hóa đơn hàng loạt",
                 "[bold yellow]0.[/bold yellow] [white]Quay lại menu chính"
             ]
             
@@ -484,6 +489,9 @@ class QuanLyDien:
                 f"{MAIN_COLOR}4.{RESET} Xóa hóa đơn",
                 f"{MAIN_COLOR}5.{RESET} Tìm kiếm hóa đơn",
                 f"{MAIN_COLOR}6.{RESET} Xuất hóa đơn",
+                f"{MAIN_COLOR}7.{RESET} Lập hóa đơn hàng loạt",
+                f"{MAIN_COLOR}8.{RESET} Nhập chỉ số công tơ từ file",
+                f"{MAIN_COLOR}9.{RESET} Xuất PDF hóa đơn hàng loạt",
                 f"{MAIN_COLOR}0.{RESET} Quay lại menu chính"
             ]
             
@@ -504,6 +512,12 @@ class QuanLyDien:
                 self.tim_kiem_hoa_don()
             elif choice == "6":
                 self.xuat_hoa_don()
+            elif choice == "7":
+                self.lap_hoa_don_hang_loat()
+            elif choice == "8":
+                self.nhap_chi_so_cong_to()
+            elif choice == "9":
+                self.xuat_hoa_don_hang_loat()
             elif choice == "0":
                 self.current_menu = self.menu_chinh
             else:
@@ -527,6 +541,8 @@ class QuanLyDien:
                 "[bold yellow]1.[/bold yellow] [white]Xem bảng giá hiện tại",
                 "[bold yellow]2.[/bold yellow] [white]Cập nhật bảng giá",
                 "[bold yellow]3.[/bold yellow] [white]Xem lịch sử bảng giá",
+                "[bold yellow]4.[/bold yellow] [white]Tính lại tiền hóa đơn",
+                "[bold yellow]5.[/bold yellow] [white]Mô phỏng bảng giá dự kiến",
                 "[bold yellow]0.[/bold yellow] [white]Quay lại menu chính"
             ]
             
@@ -548,6 +564,8 @@ class QuanLyDien:
                 f"{MAIN_COLOR}1.{RESET} Xem bảng giá hiện tại",
                 f"{MAIN_COLOR}2.{RESET} Cập nhật bảng giá",
                 f"{MAIN_COLOR}3.{RESET} Xem lịch sử bảng giá",
+                f"{MAIN_COLOR}4.{RESET} Tính lại tiền hóa đơn",
+                f"{MAIN_COLOR}5.{RESET} Mô phỏng bảng giá dự kiến",
                 f"{MAIN_COLOR}0.{RESET} Quay lại menu chính"
             ]
             
@@ -562,6 +580,10 @@ class QuanLyDien:
                 self.cap_nhat_bang_gia()
             elif choice == "3":
                 self.xem_lich_su_bang_gia()
+            elif choice == "4":
+                self.tinh_lai_tien_hoa_don()
+            elif choice == "5":
+                self.mo_phong_bang_gia()
             elif choice == "0":
                 self.current_menu = self.menu_chinh
             else:
@@ -886,8 +908,8 @@ class QuanLyDien:
             typing_effect("Mã công tơ: ")
             ma_cong_to = input()
         
-        # Tạo mã khách hàng tự động
-        ma_khach_hang = f"KH{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}"
+        # Cấp mã khách hàng tự động
+        ma_khach_hang = self.db.tao_ma('KH')
         
         # Hiệu ứng loading khi đang thêm khách hàng
         if HAS_RICH:
@@ -1715,27 +1737,54 @@ class QuanLyDien:
                 input(self.center_text("\nNhấn Enter để tiếp tục..."))
             return
         
-        # Lấy thông tin hóa đơn gần nhất (nếu có) để lấy chỉ số cũ
-        hoa_don_list = self.db.get_hoa_don_by_khach_hang(khach_hang.ma_khach_hang)
-        chi_so_cu = 0
+        # Nhập kỳ hóa đơn
+        if HAS_RICH:
+            from rich.prompt import Prompt
+            thang = Prompt.ask("[yellow]Tháng hóa đơn (MM/YYYY)")
+        else:
+            thang = input(self.center_text("Tháng hóa đơn (MM/YYYY): "))
+        
+        try:
+            thang_hd, nam_hd = [int(x) for x in thang.split('/')]
+        except ValueError:
+            if HAS_RICH:
+                from rich.panel import Panel
+                from rich.align import Align
+                console.print(Align.center(
+                    Panel(
+                        "[bold red]Vui lòng nhập tháng theo dạng MM/YYYY!",
+                        border_style="red",
+                        title="[bold red]LỖI",
+                        width=60
+                    )
+                ))
+            else:
+                print(self.center_text(f"{Fore.RED if HAS_COLORAMA else ''}Vui lòng nhập tháng theo dạng MM/YYYY!{RESET}"))
+            time.sleep(1.5)
+            return
+        
+        # Chỉ số cũ là chỉ số cuối của hóa đơn gần nhất trước kỳ (nếu có)
+        chi_so_dau_ky = self.db.get_chi_so_dau_ky(khach_hang.ma_khach_hang, thang_hd, nam_hd)
+        chi_so_cu = chi_so_dau_ky["chi_so_dau"]
         
-        if hoa_don_list:
-            # Sắp xếp theo thời gian để lấy hóa đơn gần nhất
-            hoa_don_list.sort(key=lambda x: x.thang, reverse=True)
-            chi_so_cu = hoa_don_list[0].chi_so_cuoi
+        if chi_so_dau_ky["ky_truoc"]:
+            nam_truoc, thang_truoc = chi_so_dau_ky["ky_truoc"]
+            so_thang_thieu = chi_so_dau_ky["so_thang_thieu"]
             
             if HAS_RICH:
-                console.print(Align.center(f"[yellow]Chỉ số điện kỳ trước: [bold white]{chi_so_cu}[/bold white]"))
+                from rich.align import Align
+                console.print(Align.center(f"[yellow]Chỉ số điện kỳ trước ({thang_truoc:02d}/{nam_truoc}): [bold white]{chi_so_cu}[/bold white]"))
+                if so_thang_thieu:
+                    console.print(Align.center(f"[bold red]Cảnh báo: Thiếu hóa đơn {so_thang_thieu} tháng giữa kỳ {thang_truoc:02d}/{nam_truoc} và kỳ này"))
             else:
-                print(self.center_text(f"\nChỉ số điện kỳ trước: {chi_so_cu}"))
+                print(self.center_text(f"\nChỉ số điện kỳ trước ({thang_truoc:02d}/{nam_truoc}): {chi_so_cu}"))
+                if so_thang_thieu:
+                    print(self.center_text(f"{Fore.RED if HAS_COLORAMA else ''}Cảnh báo: Thiếu hóa đơn {so_thang_thieu} tháng giữa kỳ {thang_truoc:02d}/{nam_truoc} và kỳ này{RESET}"))
         
-        # Nhập thông tin hóa đơn
+        # Nhập chỉ số mới
         if HAS_RICH:
-            from rich.prompt import Prompt
-            thang = Prompt.ask("[yellow]Tháng hóa đơn (MM/YYYY)")
             chi_so_moi = int(Prompt.ask("[yellow]Chỉ số công tơ mới"))
         else:
-            thang = input(self.center_text("Tháng hóa đơn (MM/YYYY): "))
             chi_so_moi = int(input(self.center_text("Chỉ số công tơ mới: ")))
         
         if chi_so_moi < chi_so_cu:
@@ -1758,7 +1807,16 @@ class QuanLyDien:
                 return
         
         try:
-            pass  # Tiếp tục xử lý
+            # Tính tiền tạm tính theo bảng giá của kỳ, số tiền được lấy từ bảng tra cứu của bảng giá
+            hoa_don = HoaDon("", khach_hang.ma_khach_hang, thang_hd, nam_hd, chi_so_cu, chi_so_moi)
+            so_tien = self.db.tinh_tien_hoa_don(hoa_don, chia_theo_ngay=True)
+            
+            if HAS_RICH:
+                console.print(Align.center(f"[yellow]Lượng điện tiêu thụ: [bold white]{hoa_don.tieu_thu} kWh[/bold white]"))
+                console.print(Align.center(f"[yellow]Số tiền tạm tính: [bold white]{so_tien:,.0f} VNĐ[/bold white]"))
+            else:
+                print(self.center_text(f"Lượng điện tiêu thụ: {hoa_don.tieu_thu} kWh"))
+                print(self.center_text(f"Số tiền tạm tính: {so_tien:,.0f} VNĐ"))
         except ValueError:
             if HAS_RICH:
                 console.print(Align.center(
@@ -2629,10 +2687,10 @@ class QuanLyDien:
             print(self.center_text("Đang tạo báo cáo khách hàng tiêu thụ nhiều nhất..."))
             time.sleep(0.8)
         
-        # Lấy danh sách tất cả hóa đơn
-        hoa_don_list = self.db.get_all_hoa_don()
+        # Thống kê 10 khách hàng tiêu thụ nhiều nhất, đã sắp xếp theo lượng tiêu thụ giảm dần
+        top_10 = self.db.thong_ke_top_khach_hang(10)
         
-        if not hoa_don_list:
+        if not top_10:
             if HAS_RICH:
                 console.print(Align.center(
                     Panel(
@@ -2648,34 +2706,6 @@ class QuanLyDien:
             input(self.center_text("\nNhấn Enter để tiếp tục..."))
             return
         
-        # Thống kê theo khách hàng
-        thong_ke_khach_hang = {}
-        for hd in hoa_don_list:
-            ma_khach_hang = hd.ma_khach_hang
-            tieu_thu = hd.chi_so_cuoi - hd.chi_so_dau
-            
-            if ma_khach_hang not in thong_ke_khach_hang:
-                thong_ke_khach_hang[ma_khach_hang] = {
-                    'tong_tieu_thu': 0,
-                    'so_hoa_don': 0,
-                    'tong_tien': 0
-                }
-            
-            thong_ke_khach_hang[ma_khach_hang]['tong_tieu_thu'] += tieu_thu
-            thong_ke_khach_hang[ma_khach_hang]['so_hoa_don'] += 1
-            if hd.so_tien:
-                thong_ke_khach_hang[ma_khach_hang]['tong_tien'] += hd.so_tien
-        
-        # Sắp xếp theo lượng tiêu thụ (giảm dần)
-        top_khach_hang = sorted(
-            thong_ke_khach_hang.items(),
-            key=lambda x: x[1]['tong_tieu_thu'],
-            reverse=True
-        )
-        
-        # Lấy top 10 khách hàng
-        top_10 = top_khach_hang[:10]
-        
         # Hiển thị báo cáo
         if HAS_RICH:
             from rich.align import Align
@@ -2696,10 +2726,9 @@ class QuanLyDien:
             table.add_column("Trung bình/tháng", justify="right")
             table.add_column("Tổng thanh toán", justify="right", style="yellow")
             
-            for i, (ma_kh, data) in enumerate(top_10, 1):
-                # Lấy thông tin khách hàng
-                khach_hang = self.db.get_khach_hang(ma_kh)
-                ten_kh = khach_hang.ho_ten if khach_hang else "Không xác định"
+            for i, data in enumerate(top_10, 1):
+                ma_kh = data['ma_khach_hang']
+                ten_kh = data['ten_khach_hang']
                 
                 # Tính trung bình tiêu thụ mỗi tháng
                 trung_binh = data['tong_tieu_thu'] / data['so_hoa_don'] if data['so_hoa_don'] > 0 else 0
@@ -2722,10 +2751,9 @@ class QuanLyDien:
                 headers = [f"{MAIN_COLOR}{header}{RESET}" for header in headers]
             
             data = []
-            for i, (ma_kh, thong_ke) in enumerate(top_10, 1):
-                # Lấy thông tin khách hàng
-                khach_hang = self.db.get_khach_hang(ma_kh)
-                ten_kh = khach_hang.ho_ten if khach_hang else "Không xác định"
+            for i, thong_ke in enumerate(top_10, 1):
+                ma_kh = thong_ke['ma_khach_hang']
+                ten_kh = thong_ke['ten_khach_hang']
                 
                 # Tính trung bình tiêu thụ mỗi tháng
                 trung_binh = thong_ke['tong_tieu_thu'] / thong_ke['so_hoa_don'] if thong_ke['so_hoa_don'] > 0 else 0
@@ -2746,6 +2774,429 @@ class QuanLyDien:
         
         input(self.center_text("\nNhấn Enter để tiếp tục..."))
     
+    def tinh_lai_tien_hoa_don(self):
+        """Tính lại tiền các hóa đơn chưa thanh toán theo các bảng giá hiện có"""
+        self.clear_screen()
+        
+        # Hiển thị tiêu đề
+        self.display_centered_title("TÍNH LẠI TIỀN HÓA ĐƠN", 50)
+        
+        # Yêu cầu người dùng nhập kỳ hóa đơn (tùy chọn)
+        if HAS_RICH:
+            from rich.prompt import Prompt
+            ky = Prompt.ask("[yellow]Nhập kỳ (MM/YYYY), năm (YYYY) hoặc để trống để tính lại tất cả", default="")
+        else:
+            ky = input(self.center_text("Nhập kỳ (MM/YYYY), năm (YYYY) hoặc để trống để tính lại tất cả: "))
+        
+        thang = nam = None
+        try:
+            if '/' in ky:
+                thang, nam = [int(x) for x in ky.split('/')]
+            elif ky.strip():
+                nam = int(ky)
+        except ValueError:
+            print(self.center_text(f"{Fore.RED if HAS_COLORAMA else ''}Kỳ hóa đơn không hợp lệ!{RESET}"))
+            input(self.center_text("\nNhấn Enter để tiếp tục..."))
+            return
+        
+        # Tính thử trước để hiển thị chênh lệch
+        ket_qua = self.db.tinh_lai_tien_hoa_don(thang=thang, nam=nam, dry_run=True)
+        if ket_qua is None:
+            print(self.center_text(f"{Fore.RED if HAS_COLORAMA else ''}Không thể tính lại tiền hóa đơn!{RESET}"))
+            input(self.center_text("\nNhấn Enter để tiếp tục..."))
+            return
+        
+        tom_tat = [
+            f"Số hóa đơn chưa thanh toán: {ket_qua['so_hoa_don']}",
+            f"Số hóa đơn thay đổi số tiền: {ket_qua['so_thay_doi']}",
+            f"Tổng tiền hiện tại: {ket_qua['tong_tien_cu']:,.0f} VNĐ",
+            f"Tổng tiền sau khi tính lại: {ket_qua['tong_tien_moi']:,.0f} VNĐ",
+            f"Chênh lệch: {ket_qua['chenh_lech']:+,.0f} VNĐ"
+        ]
+        if HAS_RICH:
+            from rich.panel import Panel
+            from rich.align import Align
+            console.print(Align.center(
+                Panel(
+                    "\n".join(tom_tat),
+                    border_style="yellow",
+                    title="[bold yellow]KẾT QUẢ TÍNH THỬ",
+                    width=60
+                )
+            ))
+        else:
+            for line in tom_tat:
+                print(self.center_text(line))
+        
+        if not ket_qua['so_thay_doi']:
+            input(self.center_text("\nNhấn Enter để tiếp tục..."))
+            return
+        
+        # Xác nhận cập nhật
+        if HAS_RICH:
+            from rich.prompt import Confirm
+            confirm = Confirm.ask("[bold yellow]Cập nhật số tiền các hóa đơn này?", default=False, console=console)
+        else:
+            confirm_str = input(self.center_text("\nCập nhật số tiền các hóa đơn này? (y/n): "))
+            confirm = confirm_str.lower() == 'y'
+        
+        if confirm:
+            ket_qua = self.db.tinh_lai_tien_hoa_don(thang=thang, nam=nam, dry_run=False)
+            if ket_qua is not None:
+                print(self.center_text(f"\n{Fore.GREEN if HAS_COLORAMA else ''}Đã cập nhật số tiền của {ket_qua['so_thay_doi']} hóa đơn!{RESET}"))
+            else:
+                print(self.center_text(f"\n{Fore.RED if HAS_COLORAMA else ''}Tính lại tiền hóa đơn thất bại!{RESET}"))
+        
+        input(self.center_text("\nNhấn Enter để tiếp tục..."))
+    
+    def lap_hoa_don_hang_loat(self):
+        """Lập hóa đơn của một kỳ cho tất cả khách hàng từ file chỉ số công tơ (CSV)"""
+        self.clear_screen()
+        
+        # Hiển thị tiêu đề
+        self.display_centered_title("LẬP HÓA ĐƠN HÀNG LOẠT", 50)
+        
+        print(self.center_text("File CSV gồm các cột ma_khach_hang, chi_so_cuoi và chi_so_dau (không bắt buộc)"))
+        try:
+            ky = input(self.center_text("Nhập kỳ hóa đơn (MM/YYYY): "))
+            thang, nam = [int(x) for x in ky.split('/')]
+            file_path = input(self.center_text("Đường dẫn file chỉ số công tơ: ")).strip()
+            
+            chi_so = {}
+            with open(file_path, 'r', encoding='utf-8', newline='') as f:
+                for row in csv.DictReader(f):
+                    chi_so_cuoi = int(row['chi_so_cuoi'])
+                    if row.get('chi_so_dau'):
+                        chi_so[row['ma_khach_hang']] = (int(row['chi_so_dau']), chi_so_cuoi)
+                    else:
+                        chi_so[row['ma_khach_hang']] = chi_so_cuoi
+        except (ValueError, KeyError, OSError) as e:
+            print(self.center_text(f"{Fore.RED if HAS_COLORAMA else ''}Dữ liệu không hợp lệ: {e}{RESET}"))
+            input(self.center_text("\nNhấn Enter để tiếp tục..."))
+            return
+        
+        # Checkpoint theo kỳ để chạy lại sau khi bị gián đoạn sẽ tiếp tục từ lô kế tiếp
+        checkpoint_file = os.path.join(self.db.data_dir, f"lap_hoa_don_{nam}{thang:02d}.checkpoint")
+        
+        def tien_do(ket_qua):
+            print(self.center_text(
+                f"Đã xử lý {ket_qua['da_xu_ly']}/{ket_qua['so_khach_hang']} khách hàng, "
+                f"{ket_qua['so_hoa_don_moi']} hóa đơn mới ({ket_qua['hoa_don_moi_giay']:,.0f} hóa đơn/giây)"
+            ))
+        
+        ket_qua = self.db.lap_hoa_don_hang_loat(thang, nam, chi_so, checkpoint_file=checkpoint_file,
+                                                tien_do=tien_do)
+        if ket_qua is None:
+            print(self.center_text(f"{Fore.RED if HAS_COLORAMA else ''}Lập hóa đơn hàng loạt thất bại!{RESET}"))
+            input(self.center_text("\nNhấn Enter để tiếp tục..."))
+            return
+        
+        tom_tat = [
+            f"Kỳ hóa đơn: {thang:02d}/{nam}" + (" (chạy tiếp từ lần trước)" if ket_qua['tiep_tuc'] else ""),
+            f"Số khách hàng: {ket_qua['so_khach_hang']}",
+            f"Số hóa đơn mới: {ket_qua['so_hoa_don_moi']}",
+            f"Đã có hóa đơn trong kỳ: {ket_qua['so_da_co_hoa_don']}",
+            f"Thiếu chỉ số công tơ: {ket_qua['so_thieu_chi_so']}",
+            f"Thời gian: {ket_qua['thoi_gian']:.2f} giây ({ket_qua['hoa_don_moi_giay']:,.0f} hóa đơn/giây)"
+        ]
+        if HAS_RICH:
+            from rich.panel import Panel
+            from rich.align import Align
+            console.print(Align.center(
+                Panel(
+                    "\n".join(tom_tat),
+                    border_style="yellow",
+                    title="[bold yellow]KẾT QUẢ LẬP HÓA ĐƠN",
+                    width=60
+                )
+            ))
+        else:
+            for line in tom_tat:
+                print(self.center_text(line))
+        
+        input(self.center_text("\nNhấn Enter để tiếp tục..."))
+    
+    def nhap_chi_so_cong_to(self):
+        """Nhập chỉ số công tơ từ file CSV/NDJSON và lập hóa đơn cho các dòng hợp lệ"""
+        self.clear_screen()
+        
+        # Hiển thị tiêu đề
+        self.display_centered_title("NHẬP CHỈ SỐ CÔNG TƠ", 50)
+        
+        print(self.center_text("File CSV/NDJSON gồm ma_cong_to, ky (MM/YYYY) hoặc thang và nam, chi_so_cuoi, chi_so_dau (không bắt buộc)"))
+        file_path = input(self.center_text("Đường dẫn file chỉ số công tơ: ")).strip()
+        if not os.path.isfile(file_path):
+            print(self.center_text(f"{Fore.RED if HAS_COLORAMA else ''}Không tìm thấy file {file_path}!{RESET}"))
+            input(self.center_text("\nNhấn Enter để tiếp tục..."))
+            return
+        
+        # Các dòng bị loại được ghi cạnh file nguồn
+        rejects_file = os.path.splitext(file_path)[0] + "_loi.ndjson"
+        ket_qua = self.db.nhap_chi_so_cong_to(file_path, rejects_file=rejects_file)
+        if ket_qua is None:
+            print(self.center_text(f"{Fore.RED if HAS_COLORAMA else ''}Nhập chỉ số công tơ thất bại!{RESET}"))
+            input(self.center_text("\nNhấn Enter để tiếp tục..."))
+            return
+        
+        tom_tat = [
+            f"Số hóa đơn đã lập: {ket_qua['so_hoa_don']}",
+            f"Số dòng bị loại: {ket_qua['so_dong_loi']}"
+        ]
+        for ly_do, so_dong in ket_qua['loi_theo_ly_do'].items():
+            tom_tat.append(f"  - {ly_do}: {so_dong}")
+        if ket_qua['so_dong_loi']:
+            tom_tat.append(f"Chi tiết dòng bị loại: {rejects_file}")
+        tom_tat.append(f"Thời gian: {ket_qua['thoi_gian']:.2f} giây ({ket_qua['hoa_don_moi_giay']:,.0f} hóa đơn/giây)")
+        if HAS_RICH:
+            from rich.panel import Panel
+            from rich.align import Align
+            console.print(Align.center(
+                Panel(
+                    "\n".join(tom_tat),
+                    border_style="yellow",
+                    title="[bold yellow]KẾT QUẢ NHẬP CHỈ SỐ",
+                    width=70
+                )
+            ))
+        else:
+            for line in tom_tat:
+                print(self.center_text(line))
+        
+        input(self.center_text("\nNhấn Enter để tiếp tục..."))
+    
+    def xuat_hoa_don_hang_loat(self):
+        """Xuất PDF tất cả hóa đơn của một kỳ, tạo song song trên nhiều tiến trình hoặc gộp vào một file"""
+        self.clear_screen()
+        
+        # Hiển thị tiêu đề
+        self.display_centered_title("XUẤT PDF HÓA ĐƠN HÀNG LOẠT", 50)
+        
+        try:
+            thang, nam = [int(x) for x in input(self.center_text("Nhập kỳ hóa đơn (MM/YYYY): ")).split('/')]
+            gop = input(self.center_text("Gộp tất cả vào một file PDF? (y/n) [n]: ")).strip().lower() == 'y'
+            if gop:
+                khu_vuc = input(self.center_text("Khu vực (lọc theo địa chỉ, để trống để lấy tất cả): ")).strip()
+            else:
+                so_tien_trinh = input(self.center_text(f"Số tiến trình [{os.cpu_count()}]: ")).strip()
+                so_tien_trinh = int(so_tien_trinh) if so_tien_trinh else None
+        except ValueError:
+            print(self.center_text(f"{Fore.RED if HAS_COLORAMA else ''}Dữ liệu không hợp lệ!{RESET}"))
+            input(self.center_text("\nNhấn Enter để tiếp tục..."))
+            return
+        
+        hoa_don_list = self.db.get_hoa_don_theo_ky(thang, nam)
+        if not hoa_don_list:
+            print(self.center_text("Không có hóa đơn nào trong kỳ."))
+            input(self.center_text("\nNhấn Enter để tiếp tục..."))
+            return
+        
+        khach_hang_theo_ma = {kh.ma_khach_hang: kh for kh in self.db.get_all_khach_hang()}
+        bang_gia_theo_ky = {(thang, nam): self.db.get_bang_gia_theo_ky(thang, nam)}
+        
+        if gop:
+            self.xuat_hoa_don_gop(thang, nam, khu_vuc, hoa_don_list, khach_hang_theo_ma, bang_gia_theo_ky)
+            return
+        
+        def tien_do(ket_qua):
+            print(self.center_text(
+                f"Đã xuất {ket_qua['da_xu_ly']}/{ket_qua['so_hoa_don']} hóa đơn "
+                f"({ket_qua['hoa_don_moi_giay']:,.0f} hóa đơn/giây)"
+            ))
+        
+        try:
+            from models.hoa_don_pdf import tao_hoa_don_pdf_batch
+            ket_qua = tao_hoa_don_pdf_batch(hoa_don_list, khach_hang_theo_ma, bang_gia_theo_ky,
+                                            max_workers=so_tien_trinh, tien_do=tien_do,
+                                            buoc_tien_do=max(1, len(hoa_don_list) // 20))
+        except Exception as e:
+            print(self.center_text(f"{Fore.RED if HAS_COLORAMA else ''}Lỗi khi xuất hóa đơn PDF: {str(e)}{RESET}"))
+            input(self.center_text("\nNhấn Enter để tiếp tục..."))
+            return
+        
+        tom_tat = [
+            f"Kỳ hóa đơn: {thang:02d}/{nam}",
+            f"Số hóa đơn đã xuất: {ket_qua['so_thanh_cong']}/{ket_qua['so_hoa_don']}",
+            f"Thời gian: {ket_qua['thoi_gian']:.2f} giây ({ket_qua['hoa_don_moi_giay']:,.0f} hóa đơn/giây)"
+        ]
+        if ket_qua['files']:
+            tom_tat.append(f"Thư mục: {os.path.dirname(os.path.abspath(ket_qua['files'][0]))}")
+        for ma_hoa_don, loi in ket_qua['loi'][:10]:
+            tom_tat.append(f"  - {ma_hoa_don}: {loi}")
+        if len(ket_qua['loi']) > 10:
+            tom_tat.append(f"  ... và {len(ket_qua['loi']) - 10} hóa đơn lỗi khác")
+        if HAS_RICH:
+            from rich.panel import Panel
+            from rich.align import Align
+            console.print(Align.center(
+                Panel(
+                    "\n".join(tom_tat),
+                    border_style="yellow",
+                    title="[bold yellow]KẾT QUẢ XUẤT PDF",
+                    width=70
+                )
+            ))
+        else:
+            for line in tom_tat:
+                print(self.center_text(line))
+        
+        input(self.center_text("\nNhấn Enter để tiếp tục..."))
+    
+    def xuat_hoa_don_gop(self, thang, nam, khu_vuc, hoa_don_list, khach_hang_theo_ma, bang_gia_theo_ky):
+        """Xuất các hóa đơn của một kỳ và một khu vực vào một file PDF, sắp theo địa chỉ khách hàng"""
+        def dia_chi(hd):
+            return getattr(khach_hang_theo_ma.get(hd.ma_khach_hang), 'dia_chi', '') or ''
+        
+        if khu_vuc:
+            hoa_don_list = [hd for hd in hoa_don_list if khu_vuc.lower() in dia_chi(hd).lower()]
+            if not hoa_don_list:
+                print(self.center_text("Không có hóa đơn nào thuộc khu vực này."))
+                input(self.center_text("\nNhấn Enter để tiếp tục..."))
+                return
+        
+        # Sắp hóa đơn theo địa chỉ để in theo tuyến phát hóa đơn
+        hoa_don_list = sorted(hoa_don_list, key=lambda hd: (dia_chi(hd), hd.ma_khach_hang))
+        ten_file = f"hoa_don_gop_{thang:02d}_{nam}"
+        if khu_vuc:
+            ten_file += "_" + "_".join(khu_vuc.split())
+        file_name = os.path.join("exports", f"{ten_file}.pdf")
+        
+        def tien_do(ket_qua):
+            print(self.center_text(
+                f"Đã thêm {ket_qua['so_thanh_cong']}/{len(hoa_don_list)} hóa đơn "
+                f"({ket_qua['hoa_don_moi_giay']:,.0f} hóa đơn/giây)"
+            ))
+        
+        try:
+            from models.hoa_don_pdf import tao_hoa_don_pdf_gop
+            ket_qua = tao_hoa_don_pdf_gop(hoa_don_list, khach_hang_theo_ma, bang_gia_theo_ky, file_name,
+                                          tien_do=tien_do, buoc_tien_do=max(1, len(hoa_don_list) // 20))
+        except Exception as e:
+            print(self.center_text(f"{Fore.RED if HAS_COLORAMA else ''}Lỗi khi tạo file hóa đơn gộp: {str(e)}{RESET}"))
+            input(self.center_text("\nNhấn Enter để tiếp tục..."))
+            return
+        
+        tom_tat = [
+            f"Kỳ hóa đơn: {thang:02d}/{nam}" + (f" - Khu vực: {khu_vuc}" if khu_vuc else ""),
+            f"Số hóa đơn trong file: {ket_qua['so_thanh_cong']}/{len(hoa_don_list)} ({ket_qua['so_trang']} trang)",
+            f"Thời gian: {ket_qua['thoi_gian']:.2f} giây ({ket_qua['hoa_don_moi_giay']:,.0f} hóa đơn/giây)"
+        ]
+        if ket_qua['file']:
+            tom_tat.append(f"File: {os.path.abspath(ket_qua['file'])}")
+        for ma_hoa_don, loi in ket_qua['loi'][:10]:
+            tom_tat.append(f"  - {ma_hoa_don}: {loi}")
+        if len(ket_qua['loi']) > 10:
+            tom_tat.append(f"  ... và {len(ket_qua['loi']) - 10} hóa đơn lỗi khác")
+        if HAS_RICH:
+            from rich.panel import Panel
+            from rich.align import Align
+            console.print(Align.center(
+                Panel(
+                    "\n".join(tom_tat),
+                    border_style="yellow",
+                    title="[bold yellow]KẾT QUẢ XUẤT PDF GỘP",
+                    width=70
+                )
+            ))
+        else:
+            for line in tom_tat:
+                print(self.center_text(line))
+        
+        input(self.center_text("\nNhấn Enter để tiếp tục..."))
+    
+    def mo_phong_bang_gia(self):
+        """Mô phỏng doanh thu của các hóa đơn hiện có nếu áp dụng một bảng giá dự kiến"""
+        self.clear_screen()
+        
+        # Hiển thị tiêu đề
+        self.display_centered_title("MÔ PHỎNG BẢNG GIÁ DỰ KIẾN", 50)
+        
+        print(self.center_text("Nhập các bậc thang theo thứ tự, để trống định mức ở bậc cuối cùng"))
+        bac_thang = []
+        try:
+            while True:
+                bac = len(bac_thang) + 1
+                kwh_max = input(self.center_text(f"Bậc {bac} - định mức (kWh): ")).strip()
+                don_gia = float(input(self.center_text(f"Bậc {bac} - đơn giá (đ/kWh): ")))
+                if not kwh_max:
+                    bac_thang.append((float('inf'), don_gia))
+                    break
+                bac_thang.append((int(kwh_max), don_gia))
+            
+            vat = input(self.center_text("Thuế VAT (%) [10]: ")).strip()
+            vat = float(vat) / 100 if vat else 0.1
+            
+            ky = input(self.center_text("Nhập kỳ (MM/YYYY), năm (YYYY) hoặc để trống để mô phỏng tất cả: "))
+            thang = nam = None
+            if '/' in ky:
+                thang, nam = [int(x) for x in ky.split('/')]
+            elif ky.strip():
+                nam = int(ky)
+        except ValueError:
+            print(self.center_text(f"{Fore.RED if HAS_COLORAMA else ''}Dữ liệu không hợp lệ!{RESET}"))
+            input(self.center_text("\nNhấn Enter để tiếp tục..."))
+            return
+        
+        bang_gia = BangGia("Dự kiến", datetime.datetime.now(), bac_thang)
+        bang_gia.vat = vat
+        
+        ket_qua = self.db.mo_phong_bang_gia([bang_gia], thang=thang, nam=nam)
+        if ket_qua is None:
+            print(self.center_text(f"{Fore.RED if HAS_COLORAMA else ''}Không thể mô phỏng bảng giá!{RESET}"))
+            input(self.center_text("\nNhấn Enter để tiếp tục..."))
+            return
+        if not ket_qua['so_hoa_don']:
+            print(self.center_text("Không có hóa đơn nào để mô phỏng."))
+            input(self.center_text("\nNhấn Enter để tiếp tục..."))
+            return
+        
+        phuong_an = ket_qua['phuong_an'][0]
+        tom_tat = [
+            f"Số hóa đơn: {ket_qua['so_hoa_don']} ({ket_qua['tong_tieu_thu']:,} kWh)",
+            f"Doanh thu hiện tại: {ket_qua['tong_tien_hien_tai']:,.0f} VNĐ",
+            f"Doanh thu dự kiến: {phuong_an['tong_tien_moi']:,.0f} VNĐ",
+            f"Chênh lệch: {phuong_an['chenh_lech']:+,.0f} VNĐ ({phuong_an['ty_le_chenh_lech']:+.2f}%)"
+        ]
+        if HAS_RICH:
+            from rich.panel import Panel
+            from rich.align import Align
+            console.print(Align.center(
+                Panel(
+                    "\n".join(tom_tat),
+                    border_style="yellow",
+                    title="[bold yellow]KẾT QUẢ MÔ PHỎNG",
+                    width=60
+                )
+            ))
+        else:
+            for line in tom_tat:
+                print(self.center_text(line))
+        
+        # Chênh lệch theo bậc tiêu thụ
+        headers = ["Bậc", "Số hóa đơn", "Tiêu thụ (kWh)", "Hiện tại (VNĐ)", "Dự kiến (VNĐ)", "Chênh lệch (VNĐ)"]
+        data = [[bac, tong['so_hoa_don'], f"{tong['tieu_thu']:,}", f"{tong['tien_hien_tai']:,.0f}",
+                 f"{tong['tien_moi']:,.0f}", f"{tong['chenh_lech']:+,.0f}"]
+                for bac, tong in phuong_an['theo_bac'].items()]
+        print()
+        table = tabulate(data, headers=headers, tablefmt="grid", stralign="center", numalign="center")
+        for line in table.split('\n'):
+            print(self.center_text(line))
+        
+        # Các khách hàng bị ảnh hưởng nhiều nhất
+        for tieu_de, khoa in [("Khách hàng tăng tiền nhiều nhất", 'khach_hang_tang_tien'),
+                              ("Khách hàng giảm tiền nhiều nhất", 'khach_hang_giam_tien')]:
+            if not phuong_an[khoa]:
+                continue
+            print("\n" + self.center_text(tieu_de))
+            data = [[kh['ma_khach_hang'], kh['ten_khach_hang'], f"{kh['tien_hien_tai']:,.0f}",
+                     f"{kh['tien_moi']:,.0f}", f"{kh['chenh_lech']:+,.0f}"]
+                    for kh in phuong_an[khoa]]
+            table = tabulate(data, headers=["Mã KH", "Họ tên", "Hiện tại (VNĐ)", "Dự kiến (VNĐ)", "Chênh lệch (VNĐ)"],
+                             tablefmt="grid", stralign="center", numalign="center")
+            for line in table.split('\n'):
+                print(self.center_text(line))
+        
+        input(self.center_text("\nNhấn Enter để tiếp tục..."))
+    
     def startup_animation(self):
         """Hiển thị hiệu ứng khởi động đẹp mắt khi mở ứng dụng"""
         self.clear_screen()
@@ -3156,8 +3607,8 @@ class QuanLyDien:
                 input(self.center_text("\nNhấn Enter để tiếp tục..."))
                 return
             
-            # Lấy bảng giá
-            bang_gia = self.db.get_bang_gia_active()
+            # Lấy bảng giá của kỳ hóa đơn
+            bang_gia = self.db.get_bang_gia_theo_ky(hoa_don.thang, hoa_don.nam)
             if not bang_gia:
                 if HAS_RICH:
                     console.print(Align.center(
@@ -3486,12 +3937,9 @@ class QuanLyDien:
             hoa_don.chi_so_cuoi = chi_so_cuoi
             hoa_don.da_thanh_toan = da_thanh_toan.lower() == "y"
             
-            # Tính lại tiền điện
-            bang_gia = self.db.get_bang_gia_active() or self.db.get_bang_gia_hien_hanh()
-            if bang_gia:
-                # Tính lại tiền điện dựa trên chỉ số mới
-                dien_tieu_thu = hoa_don.chi_so_cuoi - hoa_don.chi_so_dau
-                hoa_don.so_tien = bang_gia.tinh_tien_dien(dien_tieu_thu)
+            # Tính lại tiền điện dựa trên chỉ số mới, theo bảng giá của kỳ hóa đơn
+            # (chia theo số ngày nếu bảng giá thay đổi giữa kỳ)
+            self.db.tinh_tien_hoa_don(hoa_don, chia_theo_ngay=True)
             
             # Hiệu ứng loading khi cập nhật
             if HAS_RICH:
@@ -3881,7 +4329,7 @@ class QuanLyDien:
             hoa_don_list = self.db.search_hoa_don(keyword)
         elif choice == "3":
             # Tìm theo tháng/năm
-            hoa_don_list = [hd for hd in self.db.get_all_hoa_don() if hd.thang == thang and hd.nam == nam]
+            hoa_don_list = self.db.get_hoa_don_theo_ky(thang, nam)
         
         # Hiển thị kết quả
         if not hoa_don_list:
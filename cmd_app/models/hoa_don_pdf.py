@@ -2,17 +2,20 @@
 # -*- coding: utf-8 -*-
 
 from reportlab.lib.pagesizes import A4
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image, Flowable, PageBreak
 from reportlab.lib import colors
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.lib.units import mm
 from reportlab.platypus.doctemplate import PageTemplate, BaseDocTemplate
 from reportlab.platypus.frames import Frame
 import os
+import time
 import datetime
+from io import BytesIO
+from concurrent.futures import ProcessPoolExecutor
 from num2words import num2words
+from models.pdf_registry import register_fonts, get_style_set
+from utils.pdf_cache import content_hash, get_pdf_cache, user_cache_dir
 import locale
 
 # Đặt locale cho tiếng Việt
@@ -28,6 +31,15 @@ except:
 VTN_YELLOW = colors.Color(1, 0.7, 0, 1)  # Màu vàng đậm
 VTN_GRAY = colors.Color(0.9, 0.9, 0.9, 1)  # Màu xám đậm hơn
 
+# Lề trang hóa đơn (point)
+PAGE_MARGINS = dict(rightMargin=20, leftMargin=20, topMargin=20, bottomMargin=20)
+
+# Phiên bản bố cục hóa đơn, tăng khi đổi bố cục để PDF trong bộ nhớ đệm không còn được dùng
+PDF_LAYOUT_VERSION = "cmd_app:1"
+
+# Thư mục bộ nhớ đệm PDF hóa đơn, nằm trong thư mục cache của người dùng
+PDF_CACHE_DIR = user_cache_dir('hoa_don_pdf')
+
 # Tạo class DocTemplate tùy chỉnh để thêm màu nền
 class HoaDonPDFTemplate(BaseDocTemplate):
     def __init__(self, filename, **kw):
@@ -45,101 +57,97 @@ class HoaDonPDFTemplate(BaseDocTemplate):
         canvas.rect(0, 0, doc.pagesize[0], doc.pagesize[1], fill=1, stroke=0)
         canvas.restoreState()
 
+def _tao_styles():
+    """Tạo các style của hóa đơn"""
+    sample_styles = getSampleStyleSheet()
+    sample_styles.add(ParagraphStyle(name='Normal_VN', fontName='Roboto', fontSize=10, leading=14))
+    sample_styles.add(ParagraphStyle(name='Title_VN', fontName='Roboto-Bold', fontSize=14, alignment=1, spaceAfter=10))
+    sample_styles.add(ParagraphStyle(name='Bold_VN', fontName='Roboto-Bold', fontSize=10, leading=14, spaceAfter=6))
+    sample_styles.add(ParagraphStyle(name='Footer_VN', fontName='Roboto', fontSize=8, leading=10, alignment=1))
+    styles = {'styles': sample_styles}
+    
+    # Style cho tiêu đề - màu vàng VTN
+    styles['title_style'] = ParagraphStyle(
+        name='Title_Style',
+        fontName='Roboto-Bold',
+        fontSize=14,
+        alignment=1,
+        spaceAfter=10,
+        textColor=VTN_YELLOW
+    )
+    
+    # Style cho subtitle - màu vàng VTN và căn giữa
+    styles['subtitle_style'] = ParagraphStyle(
+        name='Subtitle_Style',
+        fontName='Roboto',
+        fontSize=10,
+        alignment=1,
+        spaceAfter=10,
+        textColor=VTN_YELLOW
+    )
+    
+    # Style cho heading
+    styles['heading_style'] = ParagraphStyle(
+        name='Heading_Style',
+        fontName='Roboto-Bold',
+        fontSize=11,
+        leading=14,
+        textColor=colors.black
+    )
+    
+    # Style cho company text đậm - màu vàng VTN
+    styles['company_style'] = ParagraphStyle(
+        name='Company_Style',
+        fontName='Roboto-Bold',
+        fontSize=10,
+        leading=14,
+        textColor=VTN_YELLOW
+    )
+    
+    # Style cho thông tin khách hàng - màu vàng
+    styles['customer_style'] = ParagraphStyle(
+        name='Customer_Style',
+        fontName='Roboto-Bold',
+        fontSize=10,
+        leading=14,
+        textColor=VTN_YELLOW
+    )
+    
+    # Style cho giá trị thông tin - màu đen
+    styles['value_style'] = ParagraphStyle(
+        name='Value_Style',
+        fontName='Roboto',
+        fontSize=10,
+        leading=14,
+        textColor=colors.black
+    )
+    
+    # Style cho footer
+    styles['footer_style'] = ParagraphStyle(
+        name='Footer_Style',
+        fontName='Roboto',
+        fontSize=8,
+        leading=10,
+        alignment=1,
+        textColor=colors.black
+    )
+    
+    return styles
+
 class HoaDonPDF:
+    """
+    Bộ tạo PDF hóa đơn điện
+    
+    Font và style được đăng ký, tạo một lần cho cả tiến trình (models.pdf_registry) nên
+    việc tạo thêm đối tượng không tốn chi phí; dùng get_renderer để lấy bộ tạo dùng chung.
+    """
+    
     def __init__(self):
         # Đăng ký font Roboto hỗ trợ tiếng Việt
-        base_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        register_fonts()
         
-        # Đăng ký font Regular
-        font_regular_path = os.path.join(base_dir, 'font', 'Roboto-Regular.ttf')
-        if not os.path.exists(font_regular_path):
-            font_regular_path = os.path.join(base_dir, 'font', 'static', 'Roboto-Regular.ttf')
-            if not os.path.exists(font_regular_path):
-                print(f"Không tìm thấy font Roboto-Regular.ttf")
-                return
-        
-        # Đăng ký font Bold
-        font_bold_path = os.path.join(base_dir, 'font', 'static', 'Roboto-Bold.ttf')
-        if not os.path.exists(font_bold_path):
-            print(f"Không tìm thấy font Roboto-Bold.ttf")
-            font_bold_path = font_regular_path
-        
-        # Đăng ký các font
-        pdfmetrics.registerFont(TTFont('Roboto', font_regular_path))
-        pdfmetrics.registerFont(TTFont('Roboto-Bold', font_bold_path))
-        
-        # Tạo style cho các phần văn bản
-        self.styles = getSampleStyleSheet()
-        self.styles.add(ParagraphStyle(name='Normal_VN', fontName='Roboto', fontSize=10, leading=14))
-        self.styles.add(ParagraphStyle(name='Title_VN', fontName='Roboto-Bold', fontSize=14, alignment=1, spaceAfter=10))
-        self.styles.add(ParagraphStyle(name='Bold_VN', fontName='Roboto-Bold', fontSize=10, leading=14, spaceAfter=6))
-        self.styles.add(ParagraphStyle(name='Footer_VN', fontName='Roboto', fontSize=8, leading=10, alignment=1))
-        
-        # Style cho tiêu đề - màu vàng VTN
-        self.title_style = ParagraphStyle(
-            name='Title_Style',
-            fontName='Roboto-Bold',
-            fontSize=14,
-            alignment=1,
-            spaceAfter=10,
-            textColor=VTN_YELLOW
-        )
-        
-        # Style cho subtitle - màu vàng VTN và căn giữa
-        self.subtitle_style = ParagraphStyle(
-            name='Subtitle_Style',
-            fontName='Roboto',
-            fontSize=10,
-            alignment=1,
-            spaceAfter=10,
-            textColor=VTN_YELLOW
-        )
-        
-        # Style cho heading
-        self.heading_style = ParagraphStyle(
-            name='Heading_Style',
-            fontName='Roboto-Bold',
-            fontSize=11,
-            leading=14,
-            textColor=colors.black
-        )
-        
-        # Style cho company text đậm - màu vàng VTN
-        self.company_style = ParagraphStyle(
-            name='Company_Style',
-            fontName='Roboto-Bold',
-            fontSize=10,
-            leading=14,
-            textColor=VTN_YELLOW
-        )
-        
-        # Style cho thông tin khách hàng - màu vàng
-        self.customer_style = ParagraphStyle(
-            name='Customer_Style',
-            fontName='Roboto-Bold',
-            fontSize=10,
-            leading=14,
-            textColor=VTN_YELLOW
-        )
-        
-        # Style cho giá trị thông tin - màu đen
-        self.value_style = ParagraphStyle(
-            name='Value_Style',
-            fontName='Roboto',
-            fontSize=10,
-            leading=14,
-            textColor=colors.black
-        )
-        
-        # Style cho footer
-        self.footer_style = ParagraphStyle(
-            name='Footer_Style',
-            fontName='Roboto',
-            fontSize=8,
-            leading=10,
-            alignment=1,
-            textColor=colors.black
-        )
+        # Style dùng chung, không sửa trên từng đối tượng
+        vars(self).update(get_style_set('hoa_don', _tao_styles))
     
     def doc_so_thanh_chu(self, number):
         """Chuyển đổi số thành chữ tiếng Việt"""
@@ -190,11 +198,92 @@ class HoaDonPDF:
             else:
                 return f"{number} Đồng"
 
-    def tao_hoa_don(self, hoa_don, khach_hang, bang_gia, output_dir="exports"):
+    def tao_hoa_don(self, hoa_don, khach_hang, bang_gia, output_dir="exports", ngay_in=None):
         """Tạo file PDF hóa đơn điện"""
         # Đảm bảo thư mục lưu tồn tại
         os.makedirs(output_dir, exist_ok=True)
         
+        # Tạo tên file
+        file_name = f"{output_dir}/hoa_don_{hoa_don.ma_hoa_don}.pdf"
+        
+        # Tạo PDF (hoặc lấy từ bộ nhớ đệm) rồi ghi ra file
+        data = self.render_bytes(hoa_don, khach_hang, bang_gia, ngay_in=ngay_in)
+        with open(file_name, 'wb') as f:
+            f.write(data)
+        return file_name
+        
+    def cache_key(self, hoa_don, khach_hang, bang_gia, ngay_in=None):
+        """
+        Tính khóa nội dung của PDF hóa đơn
+        
+        Khóa gồm dữ liệu hóa đơn, khách hàng, bảng giá (mã, ngày áp dụng, bậc thang, VAT)
+        và phiên bản bố cục, nên thay đổi bất kỳ phần nào cũng tạo ra khóa mới. Ngày xuất
+        chỉ nằm trong khóa khi được truyền vào; khi không truyền, in lại hóa đơn không đổi
+        trả về đúng bản PDF đã xuất lần đầu (kèm ngày xuất của lần đó).
+        
+        Args:
+            hoa_don (HoaDon): Hóa đơn
+            khach_hang (KhachHang): Khách hàng của hóa đơn
+            bang_gia (BangGia): Bảng giá của kỳ hóa đơn
+            ngay_in (datetime.date, optional): Ngày xuất in trên hóa đơn
+        
+        Returns:
+            str: Mã băm SHA-256
+        """
+        # Số tiền không đưa vào khóa vì được tính lại từ chỉ số và bảng giá khi tạo PDF
+        du_lieu_hoa_don = {k: v for k, v in hoa_don.to_dict().items() if k != 'so_tien'}
+        return content_hash(PDF_LAYOUT_VERSION, du_lieu_hoa_don, khach_hang.to_dict(), bang_gia.to_dict(),
+                            ngay_in.isoformat() if ngay_in else None)
+    
+    def render_bytes(self, hoa_don, khach_hang, bang_gia, use_cache=True, ngay_in=None):
+        """
+        Tạo PDF hóa đơn trong bộ nhớ, không ghi file
+        
+        Hóa đơn không thay đổi được lấy từ bộ nhớ đệm PDF (PDF_CACHE_DIR) thay vì tạo lại.
+        
+        Args:
+            hoa_don (HoaDon): Hóa đơn
+            khach_hang (KhachHang): Khách hàng của hóa đơn
+            bang_gia (BangGia): Bảng giá của kỳ hóa đơn
+            use_cache (bool): Dùng bộ nhớ đệm PDF
+            ngay_in (datetime.date, optional): Ngày xuất in trên hóa đơn, mặc định là ngày
+                tạo PDF
+        
+        Returns:
+            bytes: Nội dung file PDF
+        """
+        if hoa_don is None or khach_hang is None or bang_gia is None:
+            raise ValueError("Dữ liệu đầu vào không hợp lệ")
+        
+        if use_cache:
+            cache = get_pdf_cache(PDF_CACHE_DIR)
+            key = self.cache_key(hoa_don, khach_hang, bang_gia, ngay_in)
+            data = cache.get(key)
+            if data is not None:
+                return data
+        
+        buffer = BytesIO()
+        doc = HoaDonPDFTemplate(buffer, pagesize=A4, **PAGE_MARGINS)
+        doc.build(self.tao_noi_dung(hoa_don, khach_hang, bang_gia, ngay_in))
+        data = buffer.getvalue()
+        
+        if use_cache:
+            cache.put(key, data)
+        return data
+    
+    def tao_noi_dung(self, hoa_don, khach_hang, bang_gia, ngay_in=None):
+        """
+        Tạo các phần tử (flowable) của một hóa đơn, dùng chung cho file PDF riêng và file gộp
+        
+        Args:
+            hoa_don (HoaDon): Hóa đơn
+            khach_hang (KhachHang): Khách hàng của hóa đơn
+            bang_gia (BangGia): Bảng giá của kỳ hóa đơn
+            ngay_in (datetime.date, optional): Ngày xuất in trên hóa đơn, mặc định là hôm nay
+        
+        Returns:
+            list: Các phần tử của hóa đơn cho trang A4 với lề PAGE_MARGINS
+        """
         # Kiểm tra và tính lại tieu_thu nếu cần
         if not hasattr(hoa_don, 'tieu_thu') or hoa_don.tieu_thu is None:
             if hasattr(hoa_don, 'chi_so_cuoi') and hasattr(hoa_don, 'chi_so_dau') and hoa_don.chi_so_cuoi is not None and hoa_don.chi_so_dau is not None:
@@ -203,11 +292,6 @@ class HoaDonPDF:
                 # Nếu không thể tính được tiêu thụ, gán giá trị mặc định
                 hoa_don.tieu_thu = 0
                 
-        # Tạo tên file
-        file_name = f"{output_dir}/hoa_don_{hoa_don.ma_hoa_don}.pdf"
-        
-        # Tạo tài liệu PDF với nền màu xám
-        doc = HoaDonPDFTemplate(file_name, pagesize=A4, rightMargin=20, leftMargin=20, topMargin=20, bottomMargin=20)
         elements = []
         
         # Tìm đường dẫn logo
@@ -392,7 +476,7 @@ class HoaDonPDF:
         elements.append(Paragraph(f"Trạng thái thanh toán: {'Đã thanh toán' if hoa_don.da_thanh_toan else 'Chưa thanh toán'}", self.styles["Normal_VN"]))
         
         # ===== KÝ TÊN =====
-        ngay_phat_hanh = datetime.datetime.now().strftime("%d/%m/%Y")
+        ngay_phat_hanh = (ngay_in or datetime.date.today()).strftime("%d/%m/%Y")
         elements.append(Spacer(1, 20))
         
         ky_ten_data = [
@@ -411,12 +495,246 @@ class HoaDonPDF:
         ]))
         elements.append(ky_ten_table)
         
-        # Xuất PDF
-        doc.build(elements)
-        return file_name
+        return elements
+
+# Bộ tạo PDF dùng chung của tiến trình
+_renderer = None
+
+
+def get_renderer():
+    """
+    Lấy bộ tạo PDF hóa đơn dùng chung của tiến trình, tạo ở lần gọi đầu tiên
+    
+    HoaDonPDF không giữ trạng thái giữa các lần tạo hóa đơn nên có thể dùng lại cho mọi
+    lần xuất.
+    
+    Returns:
+        HoaDonPDF: Bộ tạo PDF đã đăng ký font và tạo style
+    """
+    global _renderer
+    if _renderer is None:
+        _renderer = HoaDonPDF()
+    return _renderer
+
 
 # Hàm tiện ích để tạo hóa đơn trực tiếp từ mã hóa đơn
 def tao_hoa_don_pdf(hoa_don, khach_hang, bang_gia, output_dir="exports"):
     """Hàm tiện ích để tạo hóa đơn PDF"""
-    generator = HoaDonPDF()
+    generator = get_renderer()
     return generator.tao_hoa_don(hoa_don, khach_hang, bang_gia, output_dir)
+
+
+# ===== XUẤT HÓA ĐƠN HÀNG LOẠT =====
+def _khoi_tao_worker():
+    """Khởi tạo tiến trình con của tao_hoa_don_pdf_batch: đăng ký font và tạo style một lần"""
+    get_renderer()
+
+
+def _tao_hoa_don_worker(args):
+    """Tạo PDF của một hóa đơn trong tiến trình con, trả về (mã hóa đơn, đường dẫn, lỗi)"""
+    hoa_don, khach_hang, bang_gia, output_dir = args
+    try:
+        file_name = get_renderer().tao_hoa_don(hoa_don, khach_hang, bang_gia, output_dir)
+        return hoa_don.ma_hoa_don, file_name, None if file_name else "Không tạo được file PDF"
+    except Exception as e:
+        return hoa_don.ma_hoa_don, None, str(e)
+
+
+def tao_hoa_don_pdf_batch(hoa_don_list, khach_hang_theo_ma, bang_gia_theo_ky, output_dir="exports",
+                          max_workers=None, chunksize=4, tien_do=None, buoc_tien_do=100):
+    """
+    Tạo PDF cho nhiều hóa đơn song song trên nhiều tiến trình (ProcessPoolExecutor)
+    
+    Mỗi tiến trình con đăng ký font và tạo style một lần khi khởi động rồi lần lượt tạo
+    các hóa đơn được giao, nên việc xuất cả tháng dùng hết các lõi CPU. Hóa đơn thiếu
+    khách hàng hoặc bảng giá được ghi vào danh sách lỗi mà không dừng cả lô.
+    
+    Args:
+        hoa_don_list (iterable): Các hóa đơn cần xuất
+        khach_hang_theo_ma (dict): Mã khách hàng -> KhachHang
+        bang_gia_theo_ky (dict): (tháng, năm) -> BangGia của kỳ hóa đơn
+        output_dir (str): Thư mục lưu file PDF
+        max_workers (int, optional): Số tiến trình con, mặc định bằng số lõi CPU; 1 để tạo
+            ngay trong tiến trình hiện tại
+        chunksize (int): Số hóa đơn gửi cho tiến trình con mỗi lần
+        tien_do (callable, optional): Hàm nhận kết quả tạm thời sau mỗi buoc_tien_do hóa đơn
+        buoc_tien_do (int): Số hóa đơn giữa hai lần gọi tien_do
+        
+    Returns:
+        dict: Kết quả gồm số hóa đơn, số hóa đơn đã xử lý, số file đã tạo, danh sách file,
+            danh sách lỗi (mã hóa đơn, lỗi), thời gian chạy (giây) và số hóa đơn mỗi giây
+    """
+    bat_dau = time.perf_counter()
+    ket_qua = {
+        "so_hoa_don": 0,
+        "da_xu_ly": 0,
+        "so_thanh_cong": 0,
+        "files": [],
+        "loi": [],
+        "thoi_gian": 0.0,
+        "hoa_don_moi_giay": 0
+    }
+    
+    tasks = []
+    for hd in hoa_don_list:
+        khach_hang = khach_hang_theo_ma.get(hd.ma_khach_hang)
+        bang_gia = bang_gia_theo_ky.get((hd.thang, hd.nam))
+        if khach_hang is None or bang_gia is None:
+            ket_qua["loi"].append((hd.ma_hoa_don, "Không tìm thấy khách hàng hoặc bảng giá của hóa đơn"))
+            continue
+        tasks.append((hd, khach_hang, bang_gia, output_dir))
+    ket_qua["so_hoa_don"] = len(tasks) + len(ket_qua["loi"])
+    ket_qua["da_xu_ly"] = len(ket_qua["loi"])
+    
+    def cap_nhat(ma_hoa_don, file_name, loi):
+        ket_qua["da_xu_ly"] += 1
+        if loi is None:
+            ket_qua["so_thanh_cong"] += 1
+            ket_qua["files"].append(file_name)
+        else:
+            ket_qua["loi"].append((ma_hoa_don, loi))
+        ket_qua["thoi_gian"] = round(time.perf_counter() - bat_dau, 3)
+        if ket_qua["thoi_gian"] > 0:
+            ket_qua["hoa_don_moi_giay"] = round(ket_qua["so_thanh_cong"] / ket_qua["thoi_gian"], 1)
+        if tien_do and (ket_qua["da_xu_ly"] % buoc_tien_do == 0
+                        or ket_qua["da_xu_ly"] == ket_qua["so_hoa_don"]):
+            tien_do(ket_qua)
+    
+    if max_workers == 1:
+        for ket_qua_hd in map(_tao_hoa_don_worker, tasks):
+            cap_nhat(*ket_qua_hd)
+    elif tasks:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_khoi_tao_worker) as executor:
+            for ket_qua_hd in executor.map(_tao_hoa_don_worker, tasks, chunksize=chunksize):
+                cap_nhat(*ket_qua_hd)
+    
+    ket_qua["thoi_gian"] = round(time.perf_counter() - bat_dau, 3)
+    if ket_qua["thoi_gian"] > 0:
+        ket_qua["hoa_don_moi_giay"] = round(ket_qua["so_thanh_cong"] / ket_qua["thoi_gian"], 1)
+    return ket_qua
+
+
+# ===== XUẤT HÓA ĐƠN GỘP MỘT FILE =====
+class _HoaDonKeTiep(Flowable):
+    """Vị trí trong danh sách phần tử nơi nội dung của hóa đơn kế tiếp được thêm vào"""
+    
+    def wrap(self, availWidth, availHeight):
+        return 0, 0
+    
+    def draw(self):
+        pass
+
+
+class HoaDonGopPDFTemplate(HoaDonPDFTemplate):
+    """
+    Tài liệu gồm nhiều hóa đơn, mỗi hóa đơn bắt đầu ở một trang mới
+    
+    Nội dung hóa đơn được lấy dần từ một iterator ngay trước khi cần vẽ, nên danh sách
+    phần tử chỉ chứa một hóa đơn tại một thời điểm. Font được nhúng và nền trang được ghi
+    một lần cho cả file.
+    """
+    
+    def __init__(self, filename, nguon, **kw):
+        """
+        Khởi tạo tài liệu
+        
+        Args:
+            filename (str): Đường dẫn file PDF
+            nguon (iterator): Sinh danh sách phần tử của từng hóa đơn
+        """
+        self.nguon = nguon
+        self.so_hoa_don_da_them = 0
+        HoaDonPDFTemplate.__init__(self, filename, **kw)
+    
+    def filterFlowables(self, flowables):
+        """Thay vị trí chờ ở đầu danh sách bằng nội dung của hóa đơn kế tiếp"""
+        if not flowables or not isinstance(flowables[0], _HoaDonKeTiep):
+            return
+        elements = next(self.nguon, None)
+        if elements is None:
+            flowables[0] = None
+            return
+        if self.so_hoa_don_da_them:
+            elements.insert(0, PageBreak())
+        self.so_hoa_don_da_them += 1
+        flowables[0:1] = elements + [_HoaDonKeTiep()]
+    
+    def build_gop(self):
+        """Tạo file PDF từ toàn bộ hóa đơn của nguồn"""
+        self.build([_HoaDonKeTiep()])
+
+
+def tao_hoa_don_pdf_gop(hoa_don_list, khach_hang_theo_ma, bang_gia_theo_ky, file_name,
+                        tien_do=None, buoc_tien_do=100):
+    """
+    Tạo một file PDF chứa nhiều hóa đơn (ví dụ toàn bộ hóa đơn của một khu vực để phát tay)
+    
+    Dùng bố cục của HoaDonPDF.tao_noi_dung, mỗi hóa đơn một trang mới. Hóa đơn được đọc
+    lần lượt từ hoa_don_list khi đến lượt vẽ nên có thể truyền một generator với số lượng
+    lớn. Hóa đơn thiếu khách hàng, bảng giá hoặc lỗi khi tạo nội dung được ghi vào danh
+    sách lỗi mà không dừng cả file.
+    
+    Args:
+        hoa_don_list (iterable): Các hóa đơn theo thứ tự in
+        khach_hang_theo_ma (dict): Mã khách hàng -> KhachHang
+        bang_gia_theo_ky (dict): (tháng, năm) -> BangGia của kỳ hóa đơn
+        file_name (str): Đường dẫn file PDF
+        tien_do (callable, optional): Hàm nhận kết quả tạm thời sau mỗi buoc_tien_do hóa đơn
+        buoc_tien_do (int): Số hóa đơn giữa hai lần gọi tien_do
+        
+    Returns:
+        dict: Kết quả gồm số hóa đơn đã xử lý, số hóa đơn đã đưa vào file, đường dẫn file
+            (None nếu không có hóa đơn nào), số trang, danh sách lỗi (mã hóa đơn, lỗi), thời
+            gian chạy (giây) và số hóa đơn mỗi giây
+    """
+    bat_dau = time.perf_counter()
+    ket_qua = {
+        "da_xu_ly": 0,
+        "so_thanh_cong": 0,
+        "file": None,
+        "so_trang": 0,
+        "loi": [],
+        "thoi_gian": 0.0,
+        "hoa_don_moi_giay": 0
+    }
+    renderer = get_renderer()
+    
+    def cap_nhat_thoi_gian():
+        ket_qua["thoi_gian"] = round(time.perf_counter() - bat_dau, 3)
+        if ket_qua["thoi_gian"] > 0:
+            ket_qua["hoa_don_moi_giay"] = round(ket_qua["so_thanh_cong"] / ket_qua["thoi_gian"], 1)
+    
+    def nguon():
+        for hd in hoa_don_list:
+            ket_qua["da_xu_ly"] += 1
+            khach_hang = khach_hang_theo_ma.get(hd.ma_khach_hang)
+            bang_gia = bang_gia_theo_ky.get((hd.thang, hd.nam))
+            if khach_hang is None or bang_gia is None:
+                ket_qua["loi"].append((hd.ma_hoa_don, "Không tìm thấy khách hàng hoặc bảng giá của hóa đơn"))
+                continue
+            try:
+                elements = renderer.tao_noi_dung(hd, khach_hang, bang_gia)
+            except Exception as e:
+                ket_qua["loi"].append((hd.ma_hoa_don, str(e)))
+                continue
+            ket_qua["so_thanh_cong"] += 1
+            if tien_do and ket_qua["so_thanh_cong"] % buoc_tien_do == 0:
+                cap_nhat_thoi_gian()
+                tien_do(ket_qua)
+            yield elements
+    
+    output_dir = os.path.dirname(os.path.abspath(file_name))
+    os.makedirs(output_dir, exist_ok=True)
+    doc = HoaDonGopPDFTemplate(file_name, nguon(), pagesize=A4, **PAGE_MARGINS)
+    doc.build_gop()
+    
+    if ket_qua["so_thanh_cong"]:
+        ket_qua["file"] = file_name
+        ket_qua["so_trang"] = doc.page
+    else:
+        os.remove(file_name)
+    cap_nhat_thoi_gian()
+    if tien_do:
+        tien_do(ket_qua)
+    return ket_qua
+
@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import datetime
+import pytest
+from models.hoa_don import HoaDon
+from utils.db_handler import DatabaseHandler
+
+
+@pytest.fixture
+def db(data_dir, bang_gia_don_gian):
+    """Dữ liệu có bảng giá thay đổi ngày 16/06/2025 (tháng 6 chia đôi 15 + 15 ngày)"""
+    db = DatabaseHandler(data_dir)
+    assert db.add_bang_gia(bang_gia_don_gian("BG1", datetime.datetime(2025, 1, 1), 1000))
+    assert db.add_bang_gia(bang_gia_don_gian("BG2", datetime.datetime(2025, 6, 16), 1300))
+    return db
+
+
+def test_chia_ky_theo_ngay_ap_dung(db):
+    cac_bang_gia = db.get_bang_gia_trong_ky(6, 2025)
+    assert [(bg.ma_bang_gia, so_ngay) for bg, so_ngay in cac_bang_gia] == [("BG1", 15), ("BG2", 15)]
+    
+    assert [(bg.ma_bang_gia, so_ngay) for bg, so_ngay in db.get_bang_gia_trong_ky(7, 2025)] == [("BG2", 31)]
+    assert db.get_bang_gia_trong_ky(13, 2025) == []
+
+
+def test_tinh_tien_chia_theo_ngay(db):
+    cac_bang_gia = db.get_bang_gia_trong_ky(6, 2025)
+    (bg1, _), (bg2, _) = cac_bang_gia
+    hd = HoaDon("HD1", "KH1", 6, 2025, 0, 100)
+    
+    so_tien = hd.tinh_tien_chia_theo_ngay(cac_bang_gia)
+    assert so_tien == round((bg1.tinh_tien(100) + bg2.tinh_tien(100)) / 2)
+    assert bg1.tinh_tien(100) < so_tien < bg2.tinh_tien(100)
+    
+    # Kỳ chỉ có một bảng giá được tính như bình thường
+    assert hd.tinh_tien_chia_theo_ngay([(bg2, 31)]) == hd.tinh_tien(bg2)
+
+
+def test_tinh_lai_tien_mac_dinh_chi_tinh_thu(db):
+    assert db.add_hoa_don(HoaDon("HD1", "KH1", 6, 2025, 0, 100))
+    hd = db.get_hoa_don("HD1")
+    hd.so_tien = 1
+    assert db.update_hoa_don(hd)
+    
+    ket_qua = db.tinh_lai_tien_hoa_don(6, 2025)
+    assert ket_qua["dry_run"]
+    assert ket_qua["so_thay_doi"] == 1
+    assert db.get_hoa_don("HD1").so_tien == 1
+    
+    ket_qua = db.tinh_lai_tien_hoa_don(6, 2025, dry_run=False)
+    assert not ket_qua["dry_run"]
+    assert db.get_hoa_don("HD1").so_tien == ket_qua["tong_tien_moi"]
+    assert db.tinh_lai_tien_hoa_don(6, 2025)["so_thay_doi"] == 0
@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import json
+from models.hoa_don import HoaDon
+from models.khach_hang import KhachHang
+from utils import id_allocator
+from utils.id_allocator import IdAllocator
+from utils.db_handler import DatabaseHandler
+
+
+def test_cap_ma_lien_tiep_va_chi_luu_so_da_cap(tmp_path):
+    path = str(tmp_path / "ma_so.json")
+    allocator = IdAllocator(path)
+    
+    assert allocator.next_id("HD") == "HD0000000001"
+    assert allocator.allocate("HD", 3) == ["HD0000000002", "HD0000000003", "HD0000000004"]
+    assert allocator.next_id("KH") == "KH0000000001"
+    with open(path, encoding='utf-8') as f:
+        assert json.load(f) == {"HD": 4, "KH": 1}
+    
+    # Bộ cấp mã mới trên cùng file không bỏ phí số thứ tự nào
+    assert IdAllocator(path).next_id("HD") == "HD0000000005"
+
+
+def test_noi_tiep_ma_hien_co(tmp_path):
+    allocator = IdAllocator(str(tmp_path / "ma_so.json"))
+    lan_goi = []
+    
+    def seed(prefix):
+        lan_goi.append(prefix)
+        return 41
+    
+    assert allocator.next_id("HD", seed=seed) == "HD0000000042"
+    assert allocator.next_id("HD", seed=seed) == "HD0000000043"
+    assert lan_goi == ["HD"]
+
+
+def test_database_handler_noi_tiep_ma_cu(data_dir, monkeypatch):
+    db = DatabaseHandler(data_dir)
+    assert db.add_khach_hang(KhachHang("KH007", "A", "B", "0900", "CT1"))
+    assert db.add_hoa_don(HoaDon("HD20250101120000", "KH007", 1, 2025, 0, 100))
+    
+    assert db.tao_ma("KH") == "KH0000000008"
+    assert db.tao_ma_hang_loat("HD", 2) == ["HD20250101120001", "HD20250101120002"]
+    
+    # Khởi động lại tiến trình: số thứ tự được đọc từ file
+    monkeypatch.setattr(id_allocator, "_ALLOCATORS", {})
+    assert DatabaseHandler(data_dir).tao_ma("HD") == "HD20250101120003"
+    assert os.path.exists(os.path.join(data_dir, "ma_so.json"))
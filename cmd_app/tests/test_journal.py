@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import pytest
+from models.hoa_don import HoaDon
+from utils.journal import JournaledTableCache
+from utils.db_handler import DatabaseHandler
+
+
+def _tao_cache(tmp_path):
+    """Tạo bộ nhớ đệm có nhật ký với bản chụp rỗng"""
+    path = str(tmp_path / "hoa_don.json")
+    cache = JournaledTableCache(path, HoaDon, 'ma_hoa_don')
+    cache.save([])
+    return cache
+
+
+def _doc_lai(cache):
+    """Đọc lại dữ liệu từ file bằng một bộ nhớ đệm mới"""
+    return JournaledTableCache(cache.path, HoaDon, 'ma_hoa_don').load()
+
+
+def test_ghi_nhat_ky_va_doc_lai(tmp_path):
+    cache = _tao_cache(tmp_path)
+    cache.append(puts=[HoaDon("HD1", "KH1", 1, 2025, 0, 100), HoaDon("HD2", "KH1", 2, 2025, 100, 150)])
+    cache.append(deletes=["HD1"])
+    
+    with open(cache.journal_path, encoding='utf-8') as f:
+        assert len(f.readlines()) == 3
+    assert list(_doc_lai(cache)) == ["HD2"]
+
+
+def test_cat_dong_ghi_do_o_cuoi(tmp_path):
+    cache = _tao_cache(tmp_path)
+    cache.append(puts=[HoaDon("HD1", "KH1", 1, 2025, 0, 100)])
+    kich_thuoc = os.path.getsize(cache.journal_path)
+    with open(cache.journal_path, 'ab') as f:
+        f.write(b'{"op": "put", "data": {"ma_ho')
+    
+    assert list(_doc_lai(cache)) == ["HD1"]
+    assert os.path.getsize(cache.journal_path) == kich_thuoc
+    
+    # Bản ghi ghi thêm sau đó không bị dính vào dòng hỏng
+    cache.append(puts=[HoaDon("HD2", "KH1", 2, 2025, 100, 150)])
+    assert sorted(_doc_lai(cache)) == ["HD1", "HD2"]
+
+
+def test_dong_hong_o_giua_bao_loi_va_giu_nguyen_file(tmp_path):
+    cache = _tao_cache(tmp_path)
+    cache.append(puts=[HoaDon("HD1", "KH1", 1, 2025, 0, 100)])
+    with open(cache.journal_path, 'ab') as f:
+        f.write(b'{"op": "put", "data": {"ma_ho\n')
+        f.write(json.dumps({"op": "delete", "key": "HD1"}).encode() + b'\n')
+    kich_thuoc = os.path.getsize(cache.journal_path)
+    
+    with pytest.raises(ValueError, match="dòng 2"):
+        _doc_lai(cache)
+    assert os.path.getsize(cache.journal_path) == kich_thuoc
+
+
+def test_gop_nhat_ky_vao_ban_chup(tmp_path):
+    cache = _tao_cache(tmp_path)
+    cache.append(puts=[HoaDon("HD1", "KH1", 1, 2025, 0, 100), HoaDon("HD2", "KH1", 2, 2025, 100, 150)])
+    cache.append(deletes=["HD2"])
+    
+    cache.compact()
+    
+    assert not os.path.exists(cache.journal_path)
+    assert not os.path.exists(cache.compacting_path)
+    with open(cache.path, encoding='utf-8') as f:
+        assert [item["ma_hoa_don"] for item in json.load(f)] == ["HD1"]
+    assert list(_doc_lai(cache)) == ["HD1"]
+
+
+def test_database_handler_ghi_hoa_don_qua_nhat_ky(data_dir):
+    db = DatabaseHandler(data_dir, journal=True)
+    assert db.add_hoa_don(HoaDon("HD1", "KH1", 1, 2025, 0, 100))
+    assert os.path.exists(os.path.join(data_dir, "hoa_don.journal"))
+    
+    db.compact_journal()
+    assert not os.path.exists(os.path.join(data_dir, "hoa_don.journal"))
+    assert DatabaseHandler(data_dir).get_hoa_don("HD1") is not None
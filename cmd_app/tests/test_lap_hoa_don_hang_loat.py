@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+from collections import Counter
+import pytest
+from models.khach_hang import KhachHang
+from utils.db_handler import DatabaseHandler
+from utils.sqlite_handler import SQLiteDatabaseHandler
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def db(request, data_dir):
+    if request.param == "json":
+        yield DatabaseHandler(data_dir, journal=True)
+    else:
+        db = SQLiteDatabaseHandler(data_dir)
+        yield db
+        db.close()
+
+
+def _them_khach_hang(db, ma):
+    assert db.add_khach_hang(KhachHang(ma, f"Khách {ma}", "Hà Nội", "0900", f"CT-{ma}"))
+
+
+def _dung_sau_lo_dau(ket_qua):
+    """Hàm tiến độ giả lập tiến trình bị dừng sau lô đầu tiên"""
+    raise RuntimeError("dừng giữa chừng")
+
+
+def test_chay_lai_cung_ky_khong_tao_trung(db):
+    for i in range(1, 6):
+        _them_khach_hang(db, f"KH{i:02d}")
+    chi_so = {f"KH{i:02d}": 100 * i for i in range(1, 6)}
+    
+    ket_qua = db.lap_hoa_don_hang_loat(3, 2025, chi_so, chunk_size=2)
+    assert ket_qua["so_hoa_don_moi"] == 5
+    assert ket_qua["so_lo"] == 3
+    
+    ket_qua = db.lap_hoa_don_hang_loat(3, 2025, chi_so, chunk_size=2)
+    assert ket_qua["so_hoa_don_moi"] == 0
+    assert ket_qua["so_da_co_hoa_don"] == 5
+    assert len(db.get_hoa_don_theo_ky(3, 2025)) == 5
+
+
+def test_tiep_tuc_theo_ma_khi_danh_sach_khach_hang_thay_doi(db, data_dir):
+    for i in range(1, 7):
+        _them_khach_hang(db, f"KH{i:02d}")
+    checkpoint_file = os.path.join(data_dir, "lap_hoa_don.checkpoint")
+    
+    assert db.lap_hoa_don_hang_loat(3, 2025, {f"KH{i:02d}": 100 * i for i in range(1, 7)},
+                                    checkpoint_file=checkpoint_file, chunk_size=2,
+                                    tien_do=_dung_sau_lo_dau) is None
+    assert os.path.exists(checkpoint_file)
+    assert sorted(hd.ma_khach_hang for hd in db.get_hoa_don_theo_ky(3, 2025)) == ["KH01", "KH02"]
+    
+    # Giữa hai lần chạy: thêm một khách hàng có mã đứng trước điểm dừng và xóa một khách hàng
+    _them_khach_hang(db, "K01")
+    assert db.delete_khach_hang("KH04")
+    chi_so = {ma: 50 for ma in ["K01", "KH01", "KH02", "KH03", "KH05", "KH06"]}
+    
+    ket_qua = db.lap_hoa_don_hang_loat(3, 2025, chi_so, checkpoint_file=checkpoint_file, chunk_size=2)
+    assert ket_qua["tiep_tuc"]
+    # Số hóa đơn mới được cộng dồn từ lần chạy bị gián đoạn
+    assert ket_qua["so_hoa_don_moi"] == 6
+    assert ket_qua["da_xu_ly"] == ket_qua["so_khach_hang"] == 6
+    assert not os.path.exists(checkpoint_file)
+    
+    so_hoa_don = Counter(hd.ma_khach_hang for hd in db.get_hoa_don_theo_ky(3, 2025))
+    # Mỗi khách hàng còn lại có đúng một hóa đơn trong kỳ
+    assert so_hoa_don == Counter(chi_so.keys())
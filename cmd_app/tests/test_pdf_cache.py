@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import time
+from utils.pdf_cache import PdfCache, content_hash, user_cache_dir
+
+
+def _lam_cu(cache, key, so_giay):
+    """Lùi thời điểm dùng gần nhất của một mục"""
+    thoi_diem = time.time() - so_giay
+    os.utime(cache._file(key), (thoi_diem, thoi_diem))
+
+
+def test_luu_va_doc_lai(tmp_path):
+    cache = PdfCache(str(tmp_path / "pdf"))
+    key = content_hash({"ma_hoa_don": "HD1"}, "1.0")
+    assert cache.get(key) is None
+    
+    cache.put(key, b"%PDF-1")
+    assert cache.get(key) == b"%PDF-1"
+    assert key == content_hash({"ma_hoa_don": "HD1"}, "1.0")
+    assert key != content_hash({"ma_hoa_don": "HD2"}, "1.0")
+
+
+def test_xoa_muc_qua_han_va_muc_lau_khong_dung(tmp_path):
+    cache = PdfCache(str(tmp_path / "pdf"), max_bytes=10, max_age=100)
+    cache.put("cu", b"1234")
+    _lam_cu(cache, "cu", 200)
+    assert cache.get("cu") is None
+    
+    cache.put("a", b"12345")
+    cache.put("b", b"12345")
+    _lam_cu(cache, "a", 50)
+    _lam_cu(cache, "b", 10)
+    cache.put("c", b"12345")
+    
+    # Vượt dung lượng: mục lâu không dùng nhất bị xóa trước
+    assert cache.get("a") is None
+    assert cache.get("b") == b"12345"
+    assert cache.get("c") == b"12345"
+
+
+def test_thu_muc_cache_nam_ngoai_ma_nguon(monkeypatch, tmp_path):
+    monkeypatch.setattr(os, "name", "posix")
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    assert user_cache_dir("hoa_don_pdf") == os.path.join(str(tmp_path), "vtn_vip", "hoa_don_pdf")
@@ -0,0 +1,422 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import datetime
+
+try:
+    import numpy as np
+    import pandas as pd
+    HAS_PANDAS = True
+except ImportError:
+    HAS_PANDAS = False
+
+
+def _py(value):
+    """Chuyển giá trị numpy về kiểu Python để kết quả có thể xuất JSON"""
+    return value.item() if hasattr(value, 'item') else value
+
+
+def _sum(series):
+    """Tính tổng một cột, trả về 0 như sum() khi cột rỗng"""
+    return _py(series.sum()) if len(series) else 0
+
+
+def _columns(frame, *names):
+    """Lấy các cột của bảng kết quả dưới dạng danh sách giá trị Python"""
+    return [frame[name].tolist() for name in names]
+
+
+def _numeric_column(values):
+    """
+    Tạo cột số từ danh sách giá trị
+    
+    Giữ kiểu số nguyên nếu mọi giá trị đều là số nguyên để tổng không bị đổi sang số thực.
+    Giá trị None được chuyển thành NaN.
+    
+    Args:
+        values (list): Các giá trị số
+    
+    Returns:
+        numpy.ndarray: Cột số
+    """
+    if any(value is None for value in values):
+        return np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+    if all(isinstance(value, int) for value in values):
+        return np.array(values, dtype=np.int64)
+    return np.array(values, dtype=np.float64)
+
+
+class AnalyticsFrame:
+    """
+    Khung dữ liệu dạng cột của hóa đơn dùng cho thống kê vectơ hóa
+    
+    Được tạo một lần từ danh sách hóa đơn: ma_khach_hang là cột phân loại, các cột
+    nam, thang, chi_so_dau, chi_so_cuoi, so_tien, da_thanh_toan là mảng có kiểu.
+    Các báo cáo trả về dict cùng cấu trúc với các phương thức thong_ke_* của
+    DatabaseHandler.
+    """
+    
+    def __init__(self, hoa_don_list, generation=None):
+        """
+        Tạo khung dữ liệu
+        
+        Args:
+            hoa_don_list (iterable): Danh sách hóa đơn
+            generation: Phiên bản dữ liệu nguồn, dùng để biết khi nào cần tạo lại
+        """
+        rows = list(hoa_don_list)
+        self.generation = generation
+        
+        df = pd.DataFrame({
+            "ma_khach_hang": pd.Categorical([hd.ma_khach_hang for hd in rows]),
+            "nam": np.array([hd.nam for hd in rows], dtype=np.int64),
+            "thang": np.array([hd.thang for hd in rows], dtype=np.int64),
+            "chi_so_dau": _numeric_column([hd.chi_so_dau for hd in rows]),
+            "chi_so_cuoi": _numeric_column([hd.chi_so_cuoi for hd in rows]),
+            "so_tien": _numeric_column([hd.so_tien for hd in rows]),
+            "da_thanh_toan": np.array([bool(hd.da_thanh_toan) for hd in rows], dtype=bool),
+        })
+        df["tieu_thu"] = np.maximum(df["chi_so_cuoi"] - df["chi_so_dau"], 0)
+        # Ngày đầu kỳ hóa đơn, kỳ không hợp lệ thành NaT
+        df["ngay_hoa_don"] = pd.to_datetime(
+            pd.DataFrame({"year": df["nam"], "month": df["thang"], "day": 1}), errors='coerce'
+        )
+        self.df = df
+        
+        # Vị trí các dòng theo kỳ và theo năm, tính một lần để lấy nhanh từng phần
+        self._theo_ky = df.groupby(["nam", "thang"], sort=False).indices if rows else {}
+        self._theo_nam = df.groupby("nam", sort=False).indices if rows else {}
+    
+    def _ky(self, thang, nam):
+        """Lấy các hóa đơn của một kỳ"""
+        return self.df.iloc[self._theo_ky.get((nam, thang), [])]
+    
+    def _nam(self, nam):
+        """Lấy các hóa đơn của một năm"""
+        return self.df.iloc[self._theo_nam.get(nam, [])]
+    
+    def doanh_thu_theo_thang(self, thang, nam):
+        """Thống kê doanh thu của một kỳ, xem DatabaseHandler.thong_ke_doanh_thu_theo_thang"""
+        ky = self._ky(thang, nam)
+        tong_doanh_thu = _sum(ky["so_tien"])
+        so_hoa_don = len(ky)
+        da_thanh_toan = int(ky["da_thanh_toan"].sum())
+        tong_tien_da_thanh_toan = _sum(ky["so_tien"][ky["da_thanh_toan"]])
+        
+        return {
+            "thang": thang,
+            "nam": nam,
+            "tong_doanh_thu": tong_doanh_thu,
+            "so_hoa_don": so_hoa_don,
+            "da_thanh_toan": da_thanh_toan,
+            "chua_thanh_toan": so_hoa_don - da_thanh_toan,
+            "tong_tien_da_thanh_toan": tong_tien_da_thanh_toan,
+            "tong_tien_chua_thanh_toan": tong_doanh_thu - tong_tien_da_thanh_toan
+        }
+    
+    def doanh_thu_theo_nam(self, nam):
+        """Thống kê doanh thu của một năm, xem DatabaseHandler.thong_ke_doanh_thu_theo_nam"""
+        hd_nam = self._nam(nam)
+        theo_thang = hd_nam.groupby("thang").agg(
+            doanh_thu=("so_tien", "sum"),
+            so_hoa_don=("so_tien", "size"),
+            da_thanh_toan=("da_thanh_toan", "sum")
+        )
+        
+        cac_thang = dict(zip(theo_thang.index.tolist(),
+                             zip(*_columns(theo_thang, "doanh_thu", "so_hoa_don", "da_thanh_toan"))))
+        
+        thong_ke_thang = {}
+        for thang in range(1, 13):
+            doanh_thu, so_hoa_don, da_thanh_toan = cac_thang.get(thang, (0, 0, 0))
+            thong_ke_thang[thang] = {
+                "doanh_thu": doanh_thu,
+                "so_hoa_don": so_hoa_don,
+                "da_thanh_toan": da_thanh_toan,
+                "chua_thanh_toan": so_hoa_don - da_thanh_toan
+            }
+        
+        so_hoa_don = len(hd_nam)
+        da_thanh_toan = int(hd_nam["da_thanh_toan"].sum())
+        return {
+            "nam": nam,
+            "tong_doanh_thu": _sum(hd_nam["so_tien"]),
+            "so_hoa_don": so_hoa_don,
+            "da_thanh_toan": da_thanh_toan,
+            "chua_thanh_toan": so_hoa_don - da_thanh_toan,
+            "theo_thang": thong_ke_thang
+        }
+    
+    def tieu_thu_theo_thang(self, thang, nam, bac_tieu_thu, bac_keys):
+        """
+        Thống kê tiêu thụ của một kỳ, xem DatabaseHandler.thong_ke_tieu_thu_theo_thang
+        
+        Args:
+            thang (int): Tháng cần thống kê
+            nam (int): Năm cần thống kê
+            bac_tieu_thu (list): Cận trên của các bậc tiêu thụ (trừ bậc cuối)
+            bac_keys (list): Tên các bậc, nhiều hơn số cận trên một phần tử
+        """
+        ky = self._ky(thang, nam)
+        tong_tieu_thu = _sum(ky["tieu_thu"])
+        so_khach_hang = int(ky["ma_khach_hang"].nunique())
+        
+        # Phân loại theo bậc: bậc i gồm các giá trị trong (cận i-1, cận i]
+        bac = np.searchsorted(np.asarray(bac_tieu_thu), ky["tieu_thu"].to_numpy(), side='left')
+        so_luong = np.bincount(bac, minlength=len(bac_keys))
+        
+        return {
+            "thang": thang,
+            "nam": nam,
+            "tong_tieu_thu": tong_tieu_thu,
+            "so_khach_hang": so_khach_hang,
+            "trung_binh_tieu_thu": tong_tieu_thu / so_khach_hang if so_khach_hang > 0 else 0,
+            "phan_loai_tieu_thu": {key: int(so_luong[i]) for i, key in enumerate(bac_keys)}
+        }
+    
+    def tieu_thu_theo_nam(self, nam):
+        """Thống kê tiêu thụ của một năm, xem DatabaseHandler.thong_ke_tieu_thu_theo_nam"""
+        hd_nam = self._nam(nam)
+        theo_thang = hd_nam.groupby("thang").agg(
+            tieu_thu=("tieu_thu", "sum"),
+            so_khach_hang=("ma_khach_hang", "nunique")
+        )
+        
+        cac_thang = dict(zip(theo_thang.index.tolist(),
+                             zip(*_columns(theo_thang, "tieu_thu", "so_khach_hang"))))
+        
+        thong_ke_thang = {}
+        for thang in range(1, 13):
+            tieu_thu_thang, so_khach_hang = cac_thang.get(thang, (0, 0))
+            thong_ke_thang[thang] = {
+                "tieu_thu": tieu_thu_thang,
+                "so_khach_hang": so_khach_hang,
+                "trung_binh_tieu_thu": tieu_thu_thang / so_khach_hang if so_khach_hang > 0 else 0
+            }
+        
+        return {
+            "nam": nam,
+            "tong_tieu_thu": _sum(hd_nam["tieu_thu"]),
+            "so_hoa_don": len(hd_nam),
+            "theo_thang": thong_ke_thang
+        }
+    
+    def bac_gia(self, thang, nam, can_bac_cua_ky):
+        """
+        Thống kê theo bậc giá, xem DatabaseHandler.thong_ke_bac_gia
+        
+        Args:
+            thang (int | None): Tháng cần thống kê, None để thống kê cả năm
+            nam (int): Năm cần thống kê
+            can_bac_cua_ky (callable): (thang, nam) -> cận trên các bậc của bảng giá trong kỳ
+        
+        Returns:
+            dict: Bậc (tính từ 1) -> (số hóa đơn, tiêu thụ, doanh thu)
+        """
+        if thang is not None:
+            cac_ky = [(nam, thang)] if (nam, thang) in self._theo_ky else []
+        else:
+            cac_ky = [ky for ky in self._theo_ky if ky[0] == nam]
+        if not cac_ky:
+            return {}
+        
+        # Mỗi kỳ có thể dùng bảng giá khác nhau nên phân bậc theo từng kỳ
+        tieu_thu = self.df["tieu_thu"].to_numpy()
+        cac_vi_tri = []
+        cac_bac = []
+        for ky in cac_ky:
+            vi_tri = self._theo_ky[ky]
+            can_bac = np.asarray(can_bac_cua_ky(int(ky[1]), int(ky[0])))
+            cac_vi_tri.append(vi_tri)
+            cac_bac.append(np.searchsorted(can_bac, tieu_thu[vi_tri], side='left') + 1)
+        
+        rows = self.df.iloc[np.concatenate(cac_vi_tri)]
+        theo_bac = rows.assign(
+            bac=np.concatenate(cac_bac),
+            doanh_thu=rows["so_tien"].fillna(0)
+        ).groupby("bac").agg(
+            so_hoa_don=("bac", "size"),
+            tieu_thu=("tieu_thu", "sum"),
+            doanh_thu=("doanh_thu", "sum")
+        )
+        
+        return dict(zip(theo_bac.index.tolist(),
+                        zip(*_columns(theo_bac, "so_hoa_don", "tieu_thu", "doanh_thu"))))
+    
+    def no_dong(self, so_ngay, khoang_qua_han, khoang_keys, so_luong_top=10):
+        """
+        Thống kê nợ đọng, xem DatabaseHandler.thong_ke_no_dong
+        
+        Args:
+            so_ngay (int): Số ngày cho phép thanh toán sau khi tạo hóa đơn
+            khoang_qua_han (list): Cận trên của các khoảng thời gian nợ (ngày)
+            khoang_keys (list): Tên các khoảng, nhiều hơn số cận trên một phần tử
+            so_luong_top (int): Số khách hàng nợ nhiều nhất cần lấy
+        
+        Returns:
+            dict: Thống kê nợ đọng; top_khach_hang_no chưa có tên khách hàng
+        """
+        now = datetime.datetime.now()
+        han = pd.Timedelta(days=so_ngay)
+        df = self.df
+        
+        # Hóa đơn chưa thanh toán có ngày đầu kỳ trước hạn thanh toán
+        qua_han = df[~df["da_thanh_toan"] & (df["ngay_hoa_don"] < pd.Timestamp(now) - han)]
+        ngay_qua_han = ((pd.Timestamp(now) - (qua_han["ngay_hoa_don"] + han)) // pd.Timedelta(days=1)).to_numpy()
+        
+        khoang = np.searchsorted(np.asarray(khoang_qua_han), ngay_qua_han, side='left')
+        theo_khoang = qua_han["so_tien"].groupby(khoang).agg(["size", "sum"])
+        cac_khoang = dict(zip(theo_khoang.index.tolist(), zip(*_columns(theo_khoang, "size", "sum"))))
+        theo_thoi_gian = {}
+        for i, key in enumerate(khoang_keys):
+            so_hoa_don, tong_tien = cac_khoang.get(i, (0, 0))
+            theo_thoi_gian[key] = {"so_hoa_don": so_hoa_don, "tong_tien": tong_tien}
+        
+        # Khách hàng nợ nhiều nhất, giữ thứ tự xuất hiện khi bằng nhau
+        theo_khach_hang = qua_han.groupby("ma_khach_hang", sort=False, observed=True)["so_tien"].agg(["size", "sum"])
+        theo_khach_hang = theo_khach_hang.sort_values("sum", ascending=False, kind='stable').head(so_luong_top)
+        top_khach_hang_no = [
+            {
+                "ma_khach_hang": ma_khach_hang,
+                "so_hoa_don": so_hoa_don,
+                "tong_tien": tong_tien
+            }
+            for ma_khach_hang, so_hoa_don, tong_tien in zip(
+                theo_khach_hang.index.tolist(), *_columns(theo_khach_hang, "size", "sum"))
+        ]
+        
+        return {
+            "tong_hoa_don_no": len(qua_han),
+            "tong_tien_no": _sum(qua_han["so_tien"]),
+            "theo_thoi_gian": theo_thoi_gian,
+            "top_khach_hang_no": top_khach_hang_no
+        }
+    
+    def top_khach_hang(self, so_luong=10, thang=None, nam=None):
+        """
+        Thống kê khách hàng tiêu thụ nhiều nhất, xem DatabaseHandler.thong_ke_top_khach_hang
+        
+        Args:
+            so_luong (int): Số khách hàng cần lấy, None để lấy tất cả
+            thang (int, optional): Chỉ tính hóa đơn của tháng này (cùng với nam)
+            nam (int, optional): Chỉ tính hóa đơn của năm này
+        
+        Returns:
+            list: Thống kê từng khách hàng; chưa có tên khách hàng
+        """
+        if thang is not None and nam is not None:
+            df = self._ky(thang, nam)
+        elif nam is not None:
+            df = self._nam(nam)
+        else:
+            df = self.df
+        
+        theo_khach_hang = df.groupby("ma_khach_hang", sort=False, observed=True).agg(
+            tong_tieu_thu=("tieu_thu", "sum"),
+            so_hoa_don=("tieu_thu", "size"),
+            tong_tien=("so_tien", "sum")
+        ).sort_values("tong_tieu_thu", ascending=False, kind='stable')
+        if so_luong is not None:
+            theo_khach_hang = theo_khach_hang.head(so_luong)
+        
+        return [
+            {
+                "ma_khach_hang": ma_khach_hang,
+                "tong_tieu_thu": tong_tieu_thu,
+                "so_hoa_don": so_hoa_don,
+                "tong_tien": tong_tien
+            }
+            for ma_khach_hang, tong_tieu_thu, so_hoa_don, tong_tien in zip(
+                theo_khach_hang.index.tolist(),
+                *_columns(theo_khach_hang, "tong_tieu_thu", "so_hoa_don", "tong_tien"))
+        ]
+
+    def mo_phong_bang_gia(self, cac_phuong_an, thang, nam, bang_gia_cua_ky, so_khach_hang=10):
+        """
+        Tính doanh thu theo các bảng giá dự kiến, xem DatabaseHandler.mo_phong_bang_gia
+        
+        Số tiền hiện tại được tính cho từng kỳ bằng một lần gọi BangGia.tinh_tien_batch với
+        bảng giá của kỳ, số tiền theo mỗi bảng giá dự kiến bằng một lần gọi cho toàn bộ
+        hóa đơn. Các dòng được xếp liền nhau theo kỳ nên tổng theo kỳ là tổng từng đoạn,
+        tổng theo bậc và theo khách hàng được tính bằng numpy.bincount.
+        
+        Args:
+            cac_phuong_an (list): Các cặp (bảng giá dự kiến, cận trên các bậc trừ bậc cuối)
+            thang (int | None): Tháng cần mô phỏng (cùng với nam)
+            nam (int | None): Năm cần mô phỏng, None để mô phỏng toàn bộ lịch sử
+            bang_gia_cua_ky (callable): (thang, nam) -> bảng giá có hiệu lực trong kỳ
+            so_khach_hang (int): Số khách hàng tăng tiền, giảm tiền nhiều nhất cần lấy
+        
+        Returns:
+            list: Với mỗi phương án, bộ (theo kỳ, theo bậc, tăng tiền, giảm tiền): kỳ (nam,
+                thang) và bậc -> (số hóa đơn, tiêu thụ, tiền hiện tại, tiền mới); các khách
+                hàng tăng tiền, giảm tiền nhiều nhất là danh sách (mã khách hàng, tiền hiện
+                tại, tiền mới)
+        """
+        if thang is not None and nam is not None:
+            cac_ky = [(nam, thang)] if (nam, thang) in self._theo_ky else []
+        else:
+            cac_ky = [ky for ky in self._theo_ky if nam is None or ky[0] == nam]
+        
+        cac_vi_tri = [self._theo_ky[ky] for ky in cac_ky]
+        vi_tri = np.concatenate(cac_vi_tri) if cac_vi_tri else np.zeros(0, dtype=np.int64)
+        tieu_thu = self.df["tieu_thu"].to_numpy()[vi_tri]
+        do_dai = np.array([len(v) for v in cac_vi_tri], dtype=np.int64)
+        dau_doan = np.concatenate(([0], np.cumsum(do_dai)[:-1])) if cac_vi_tri else do_dai
+        
+        tien_hien_tai = np.zeros(len(vi_tri), dtype=np.float64)
+        for ky, bat_dau, so_dong in zip(cac_ky, dau_doan.tolist(), do_dai.tolist()):
+            bang_gia = bang_gia_cua_ky(int(ky[1]), int(ky[0]))
+            tien_hien_tai[bat_dau:bat_dau + so_dong] = bang_gia.tinh_tien_batch(tieu_thu[bat_dau:bat_dau + so_dong])
+        
+        # Mã khách hàng dạng số thứ tự của danh mục, 0 dành cho mã khách hàng trống
+        khach_hang = self.df["ma_khach_hang"].array
+        ma_so = khach_hang.codes[vi_tri].astype(np.int64) + 1
+        danh_muc = [None] + list(khach_hang.categories)
+        so_hoa_don_kh = np.bincount(ma_so, minlength=len(danh_muc))
+        hien_tai_kh = np.bincount(ma_so, weights=tien_hien_tai, minlength=len(danh_muc))
+        
+        def tong_doan(values):
+            return np.add.reduceat(values, dau_doan).tolist() if len(values) else []
+        
+        def tong_nhom(nhom, values, so_nhom):
+            tong = np.bincount(nhom, weights=values, minlength=so_nhom)
+            return tong.astype(values.dtype) if values.dtype.kind in 'iu' else tong
+        
+        def xep_hang(chenh_lech, chon, giam_dan):
+            # Theo chênh lệch đã làm tròn, bằng nhau thì theo mã khách hàng (danh mục đã sắp xếp)
+            ma = np.flatnonzero(chon)
+            thu_tu = np.lexsort((ma, -chenh_lech[ma] if giam_dan else chenh_lech[ma]))
+            return ma[thu_tu[:so_khach_hang]]
+        
+        ket_qua = []
+        for bang_gia, can_bac in cac_phuong_an:
+            tien_moi = np.asarray(bang_gia.tinh_tien_batch(tieu_thu), dtype=np.float64)
+            
+            theo_ky = dict(zip(
+                [(int(n), int(t)) for n, t in cac_ky],
+                zip(do_dai.tolist(), tong_doan(tieu_thu), tong_doan(tien_hien_tai), tong_doan(tien_moi))
+            ))
+            
+            bac = np.searchsorted(np.asarray(can_bac), tieu_thu, side='left')
+            so_bac = len(can_bac) + 1
+            so_hoa_don_bac = np.bincount(bac, minlength=so_bac)
+            theo_bac = {
+                i + 1: gia_tri for i, gia_tri in enumerate(zip(
+                    so_hoa_don_bac.tolist(),
+                    tong_nhom(bac, tieu_thu, so_bac).tolist(),
+                    tong_nhom(bac, tien_hien_tai, so_bac).tolist(),
+                    tong_nhom(bac, tien_moi, so_bac).tolist()
+                )) if so_hoa_don_bac[i]
+            }
+            
+            moi_kh = np.bincount(ma_so, weights=tien_moi, minlength=len(danh_muc))
+            chenh_lech = np.round(moi_kh - hien_tai_kh, 2)
+            co_hoa_don = so_hoa_don_kh > 0
+            cac_khach_hang = []
+            for chon, giam_dan in ((co_hoa_don & (chenh_lech > 0), True), (co_hoa_don & (chenh_lech < 0), False)):
+                cac_khach_hang.append([(danh_muc[i], hien_tai_kh[i].item(), moi_kh[i].item())
+                                       for i in xep_hang(chenh_lech, chon, giam_dan).tolist()])
+            
+            ket_qua.append((theo_ky, theo_bac, cac_khach_hang[0], cac_khach_hang[1]))
+        return ket_qua
@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import json
+
+
+class Checkpoint:
+    """
+    File ghi lại tiến độ của một tác vụ chạy theo lô để có thể chạy tiếp khi bị gián đoạn
+    
+    Trạng thái là một dictionary được ghi ra file tạm rồi đổi tên sau mỗi lô, nên file
+    checkpoint luôn chứa trạng thái đầy đủ của lô cuối cùng đã ghi xong.
+    """
+    
+    def __init__(self, path):
+        """
+        Khởi tạo checkpoint
+        
+        Args:
+            path (str): Đường dẫn file checkpoint
+        """
+        self.path = path
+    
+    def load(self):
+        """
+        Đọc trạng thái đã lưu
+        
+        Returns:
+            dict: Trạng thái đã lưu hoặc None nếu chưa có file checkpoint
+        """
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    
+    def save(self, state):
+        """
+        Ghi trạng thái xuống file một cách nguyên tử
+        
+        Args:
+            state (dict): Trạng thái cần lưu
+        """
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+    
+    def clear(self):
+        """Xóa file checkpoint khi tác vụ đã hoàn thành"""
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -3,24 +3,91 @@
 
 import os
 import json
+import time
 import datetime
+import bisect
+import operator
+import threading
+import contextlib
 from models.khach_hang import KhachHang
 from models.hoa_don import HoaDon
 from models.bang_gia import BangGia
+from utils.cache import get_table_cache, clone
+from utils.journal import JournaledTableCache
+from utils.aggregate import aggregate, SUM, COUNT, COUNT_DISTINCT
+from utils.analytics import AnalyticsFrame, HAS_PANDAS
+from utils.tariff_index import TariffIndex
+from utils.checkpoint import Checkpoint
+from utils.reading_index import LatestReadingIndex, missing_months
+from utils.id_allocator import get_id_allocator
+from utils.ingest import (RejectLog, read_records, normalize_records, validate_readings,
+                          price_batches)
+
+# Cận trên của các khoảng thời gian nợ (ngày) dùng trong thống kê nợ đọng
+KHOANG_QUA_HAN = [30, 60, 90]
+KHOANG_QUA_HAN_KEYS = ["duoi_30_ngay", "tu_30_60_ngay", "tu_60_90_ngay", "tren_90_ngay"]
+
+
+def _can_bac_gia(bang_gia):
+    """
+    Lấy cận trên của các bậc giá dùng để phân loại lượng tiêu thụ
+    
+    Bậc i (tính từ 1) gồm các lượng tiêu thụ trong (cận i-1, cận i]. Bậc cuối nhận mọi
+    lượng tiêu thụ lớn hơn cận của bậc áp chót (kể cả khi bậc cuối có giới hạn) nên cận
+    của bậc cuối được bỏ đi.
+    
+    Args:
+        bang_gia (BangGia): Bảng giá
+    
+    Returns:
+        list: Cận trên của các bậc trừ bậc cuối, số bậc là độ dài danh sách cộng 1
+    """
+    return [float('inf') if kwh_max is None else kwh_max for kwh_max in bang_gia.max_values[:-1]]
+
+
+def _hoa_don_gan_nhat_truoc_ky(hoa_don_list, thang, nam):
+    """
+    Tìm chỉ số của hóa đơn có kỳ gần nhất trước một kỳ trong các hóa đơn của một khách hàng
+    
+    Returns:
+        tuple: (năm, tháng, chỉ số cuối) hoặc None nếu không có hóa đơn nào trước kỳ
+    """
+    gan_nhat = None
+    for hd in hoa_don_list:
+        if hd.nam is None or hd.thang is None or (hd.nam, hd.thang) >= (nam, thang):
+            continue
+        if gan_nhat is None or (hd.nam, hd.thang) >= gan_nhat[:2]:
+            gan_nhat = (hd.nam, hd.thang, hd.chi_so_cuoi)
+    return gan_nhat
+
+
+def _khoang_qua_han(hoa_don):
+    """Xác định khoảng thời gian nợ của hóa đơn quá hạn"""
+    return KHOANG_QUA_HAN_KEYS[bisect.bisect_left(KHOANG_QUA_HAN, hoa_don.ngay_qua_han)]
+
 
 class DatabaseHandler:
     """
     Lớp xử lý lưu trữ và truy xuất dữ liệu cho ứng dụng
     """
     
-    def __init__(self, data_dir="../data"):
+    def __init__(self, data_dir="../data", journal=False, analytics=False):
         """
         Khởi tạo DatabaseHandler
         
         Args:
             data_dir (str): Thư mục lưu trữ dữ liệu
+            journal (bool): Ghi thay đổi hóa đơn vào nhật ký hoa_don.journal thay vì
+                ghi lại toàn bộ file hoa_don.json
+            analytics (bool): Tính các thống kê bằng pandas/numpy (nếu đã cài đặt)
         """
         self.data_dir = data_dir
+        self.journal = journal
+        self.analytics = analytics
+        self._analytics_frame = None
+        self._tariff_index = None
+        # Giao dịch đang mở của từng luồng (xem transaction())
+        self._local = threading.local()
         self.khach_hang_file = os.path.join(data_dir, "khach_hang.json")
         self.hoa_don_file = os.path.join(data_dir, "hoa_don.json")
         self.bang_gia_file = os.path.join(data_dir, "bang_gia.json")
@@ -30,6 +97,26 @@ class DatabaseHandler:
         
         # Khởi tạo dữ liệu nếu chưa có
         self._init_data_files()
+        
+        # Bộ nhớ đệm dùng chung trong tiến trình cho từng file dữ liệu
+        self._khach_hang_cache = get_table_cache(self.khach_hang_file, KhachHang, 'ma_khach_hang')
+        # Hóa đơn luôn được đọc kèm nhật ký (nếu có), kể cả khi không bật chế độ nhật ký
+        self._hoa_don_cache = get_table_cache(self.hoa_don_file, HoaDon, 'ma_hoa_don',
+                                              JournaledTableCache)
+        
+        # Chỉ mục phụ: mã khách hàng -> các hóa đơn, (năm, tháng) và năm -> các hóa đơn trong kỳ
+        self._hoa_don_cache.add_index('ma_khach_hang', operator.attrgetter('ma_khach_hang'))
+        self._hoa_don_cache.add_index('ky', operator.attrgetter('nam', 'thang'))
+        self._hoa_don_cache.add_index('nam', operator.attrgetter('nam'))
+        # Chỉ mục (mã khách hàng, năm, tháng): mỗi khách hàng chỉ có một hóa đơn trong một kỳ
+        self._hoa_don_cache.add_index('khach_hang_ky', operator.attrgetter('ma_khach_hang', 'nam', 'thang'))
+        # Chỉ mục dẫn xuất: mã khách hàng -> chỉ số của hóa đơn mới nhất
+        self._hoa_don_cache.add_derived_index('chi_so_moi_nhat', lambda cache: LatestReadingIndex(
+            cache.records.values(), lambda ma_khach_hang: cache.lookup('ma_khach_hang', ma_khach_hang)))
+        self._bang_gia_cache = get_table_cache(self.bang_gia_file, BangGia, 'ma_bang_gia')
+        
+        # Bộ cấp mã KH/HD/BG, số thứ tự đã cấp được lưu trong ma_so.json
+        self._id_allocator = get_id_allocator(os.path.join(data_dir, "ma_so.json"))
     
     def _ensure_data_dir(self):
         """Đảm bảo thư mục dữ liệu tồn tại"""
@@ -57,6 +144,116 @@ class DatabaseHandler:
             with open(self.bang_gia_file, 'w', encoding='utf-8') as f:
                 json.dump([bang_gia_mac_dinh.to_dict()], f, ensure_ascii=False, indent=4)
     
+    def _write(self, cache, puts=(), deletes=()):
+        """
+        Ghi các thay đổi của một file dữ liệu, hoặc giữ lại nếu đang trong giao dịch
+        
+        Args:
+            cache (TableCache): Bộ nhớ đệm của file cần ghi
+            puts (iterable): Các đối tượng cần thêm hoặc thay thế
+            deletes (iterable): Các khóa chính cần xóa
+        """
+        pending = getattr(self._local, 'transaction', None)
+        if pending is None:
+            self._flush(cache, puts, deletes)
+            return
+        
+        if cache not in pending:
+            # Giữ khóa của file đến hết giao dịch để luồng khác không thấy thay đổi dở dang
+            cache.lock.acquire()
+            pending[cache] = {}
+        keys = pending[cache]
+        for key in deletes:
+            cache.remove(key)
+            keys[key] = None
+        for obj in puts:
+            cache.put(obj)
+            keys[getattr(obj, cache.key_attr)] = None
+    
+    def _flush(self, cache, puts=(), deletes=()):
+        """
+        Ghi các thay đổi của một file dữ liệu xuống đĩa rồi cập nhật bộ nhớ đệm
+        
+        Ở chế độ nhật ký, thay đổi hóa đơn được ghi thêm vào nhật ký; các trường hợp
+        khác ghi lại toàn bộ file một cách nguyên tử.
+        
+        Args:
+            cache (TableCache): Bộ nhớ đệm của file cần ghi
+            puts (iterable): Các đối tượng cần thêm hoặc thay thế
+            deletes (iterable): Các khóa chính cần xóa
+        """
+        with cache.lock:
+            if self.journal and isinstance(cache, JournaledTableCache):
+                cache.append(puts, deletes)
+                return
+            
+            puts = list(puts)
+            deletes = list(deletes)
+            records = dict(cache.load())
+            for key in deletes:
+                records.pop(key, None)
+            for obj in puts:
+                records[getattr(obj, cache.key_attr)] = obj
+            
+            cache.save(records.values())
+            cache.apply(puts, deletes)
+            cache.mark_written()
+    
+    @contextlib.contextmanager
+    def transaction(self):
+        """
+        Gom các thao tác thêm, sửa, xóa thành một giao dịch
+        
+        Các thay đổi được áp dụng vào bộ nhớ đệm và chỉ được ghi xuống đĩa một lần cho
+        mỗi file khi kết thúc khối with. Nếu có ngoại lệ, toàn bộ thay đổi bị hủy.
+        Giao dịch lồng nhau được gộp vào giao dịch ngoài cùng.
+        
+        Ví dụ:
+            with db.transaction():
+                for hoa_don in danh_sach_hoa_don:
+                    db.add_hoa_don(hoa_don)
+        
+        Yields:
+            DatabaseHandler: Chính đối tượng này
+        """
+        if getattr(self._local, 'transaction', None) is not None:
+            yield self
+            return
+        
+        pending = self._local.transaction = {}
+        try:
+            yield self
+            
+            # Ghi mỗi file đã thay đổi đúng một lần
+            for cache, keys in pending.items():
+                records = cache.records
+                self._flush(cache,
+                            puts=[records[key] for key in keys if key in records],
+                            deletes=[key for key in keys if key not in records])
+        except BaseException:
+            # Hủy các thay đổi chưa ghi bằng cách đọc lại dữ liệu từ file
+            for cache in pending:
+                cache.invalidate()
+            raise
+        finally:
+            self._local.transaction = None
+            for cache in pending:
+                cache.lock.release()
+    
+    def compact_journal(self):
+        """
+        Gộp nhật ký hóa đơn vào file hoa_don.json
+        
+        Returns:
+            bool: True nếu thành công, False nếu thất bại
+        """
+        try:
+            self._hoa_don_cache.compact()
+            return True
+        except Exception as e:
+            print(f"Lỗi khi gộp nhật ký hóa đơn: {e}")
+            return False
+    
     # Các phương thức quản lý khách hàng
     def get_all_khach_hang(self):
         """
@@ -66,9 +263,7 @@ class DatabaseHandler:
             list: Danh sách các đối tượng KhachHang
         """
         try:
-            with open(self.khach_hang_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                return [KhachHang.from_dict(item) for item in data]
+            return [clone(kh) for kh in self._khach_hang_cache.load().values()]
         except Exception as e:
             print(f"Lỗi khi đọc dữ liệu khách hàng: {e}")
             return []
@@ -83,10 +278,12 @@ class DatabaseHandler:
         Returns:
             KhachHang: Đối tượng khách hàng hoặc None nếu không tìm thấy
         """
-        for kh in self.get_all_khach_hang():
-            if kh.ma_khach_hang == ma_khach_hang:
-                return kh
-        return None
+        try:
+            kh = self._khach_hang_cache.load().get(ma_khach_hang)
+        except Exception as e:
+            print(f"Lỗi khi đọc dữ liệu khách hàng: {e}")
+            return None
+        return clone(kh) if kh else None
     
     def add_khach_hang(self, khach_hang):
         """
@@ -99,17 +296,14 @@ class DatabaseHandler:
             bool: True nếu thành công, False nếu thất bại
         """
         try:
-            khach_hang_list = self.get_all_khach_hang()
+            with self._khach_hang_cache.lock:
+                records = self._khach_hang_cache.load()
             
-            # Kiểm tra mã khách hàng đã tồn tại chưa
-            for kh in khach_hang_list:
-                if kh.ma_khach_hang == khach_hang.ma_khach_hang:
+                # Kiểm tra mã khách hàng đã tồn tại chưa
+                if khach_hang.ma_khach_hang in records:
                     return False
             
-            khach_hang_list.append(khach_hang)
-            
-            with open(self.khach_hang_file, 'w', encoding='utf-8') as f:
-                json.dump([kh.to_dict() for kh in khach_hang_list], f, ensure_ascii=False, indent=4)
+                self._write(self._khach_hang_cache, puts=[clone(khach_hang)])
             
             return True
         except Exception as e:
@@ -127,18 +321,15 @@ class DatabaseHandler:
             bool: True nếu thành công, False nếu thất bại
         """
         try:
-            khach_hang_list = self.get_all_khach_hang()
+            with self._khach_hang_cache.lock:
+                records = self._khach_hang_cache.load()
             
-            for i, kh in enumerate(khach_hang_list):
-                if kh.ma_khach_hang == khach_hang.ma_khach_hang:
-                    khach_hang_list[i] = khach_hang
+                if khach_hang.ma_khach_hang not in records:
+                    return False
                     
-                    with open(self.khach_hang_file, 'w', encoding='utf-8') as f:
-                        json.dump([kh.to_dict() for kh in khach_hang_list], f, ensure_ascii=False, indent=4)
+                self._write(self._khach_hang_cache, puts=[clone(khach_hang)])
                     
-                    return True
-            
-            return False
+            return True
         except Exception as e:
             print(f"Lỗi khi cập nhật khách hàng: {e}")
             return False
@@ -154,18 +345,15 @@ class DatabaseHandler:
             bool: True nếu thành công, False nếu thất bại
         """
         try:
-            khach_hang_list = self.get_all_khach_hang()
+            with self._khach_hang_cache.lock:
+                records = self._khach_hang_cache.load()
             
-            for i, kh in enumerate(khach_hang_list):
-                if kh.ma_khach_hang == ma_khach_hang:
-                    del khach_hang_list[i]
+                if ma_khach_hang not in records:
+                    return False
                     
-                    with open(self.khach_hang_file, 'w', encoding='utf-8') as f:
-                        json.dump([kh.to_dict() for kh in khach_hang_list], f, ensure_ascii=False, indent=4)
+                self._write(self._khach_hang_cache, deletes=[ma_khach_hang])
                     
-                    return True
-            
-            return False
+            return True
         except Exception as e:
             print(f"Lỗi khi xóa khách hàng: {e}")
             return False
@@ -179,9 +367,7 @@ class DatabaseHandler:
             list: Danh sách các đối tượng HoaDon
         """
         try:
-            with open(self.hoa_don_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                return [HoaDon.from_dict(item) for item in data]
+            return [clone(hd) for hd in self._hoa_don_cache.load().values()]
         except Exception as e:
             print(f"Lỗi khi đọc dữ liệu hóa đơn: {e}")
             return []
@@ -196,10 +382,12 @@ class DatabaseHandler:
         Returns:
             HoaDon: Đối tượng hóa đơn hoặc None nếu không tìm thấy
         """
-        for hd in self.get_all_hoa_don():
-            if hd.ma_hoa_don == ma_hoa_don:
-                return hd
-        return None
+        try:
+            hd = self._hoa_don_cache.load().get(ma_hoa_don)
+        except Exception as e:
+            print(f"Lỗi khi đọc dữ liệu hóa đơn: {e}")
+            return None
+        return clone(hd) if hd else None
     
     def add_hoa_don(self, hoa_don):
         """
@@ -212,17 +400,18 @@ class DatabaseHandler:
             bool: True nếu thành công, False nếu thất bại
         """
         try:
-            hoa_don_list = self.get_all_hoa_don()
+            with self._hoa_don_cache.lock:
+                records = self._hoa_don_cache.load()
             
-            # Kiểm tra mã hóa đơn đã tồn tại chưa
-            for hd in hoa_don_list:
-                if hd.ma_hoa_don == hoa_don.ma_hoa_don:
+                # Kiểm tra mã hóa đơn đã tồn tại chưa
+                if hoa_don.ma_hoa_don in records:
                     return False
             
-            hoa_don_list.append(hoa_don)
+                # Kiểm tra khách hàng đã có hóa đơn trong kỳ chưa
+                if self._hoa_don_trung_ky(hoa_don) is not None:
+                    return False
             
-            with open(self.hoa_don_file, 'w', encoding='utf-8') as f:
-                json.dump([hd.to_dict() for hd in hoa_don_list], f, ensure_ascii=False, indent=4)
+                self._write(self._hoa_don_cache, puts=[clone(hoa_don)])
             
             return True
         except Exception as e:
@@ -240,22 +429,102 @@ class DatabaseHandler:
             bool: True nếu thành công, False nếu thất bại
         """
         try:
-            hoa_don_list = self.get_all_hoa_don()
+            with self._hoa_don_cache.lock:
+                records = self._hoa_don_cache.load()
             
-            for i, hd in enumerate(hoa_don_list):
-                if hd.ma_hoa_don == hoa_don.ma_hoa_don:
-                    hoa_don_list[i] = hoa_don
+                if hoa_don.ma_hoa_don not in records:
+                    return False
                     
-                    with open(self.hoa_don_file, 'w', encoding='utf-8') as f:
-                        json.dump([hd.to_dict() for hd in hoa_don_list], f, ensure_ascii=False, indent=4)
+                # Không cho chuyển hóa đơn sang kỳ đã có hóa đơn khác của khách hàng
+                if self._hoa_don_trung_ky(hoa_don) is not None:
+                    return False
                     
-                    return True
-            
-            return False
+                self._write(self._hoa_don_cache, puts=[clone(hoa_don)])
+                    
+            return True
         except Exception as e:
             print(f"Lỗi khi cập nhật hóa đơn: {e}")
             return False
     
+    def _hoa_don_trung_ky(self, hoa_don):
+        """
+        Tìm hóa đơn khác của cùng khách hàng trong cùng kỳ (dùng chỉ mục khách hàng - kỳ)
+        
+        Args:
+            hoa_don (HoaDon): Hóa đơn cần kiểm tra
+            
+        Returns:
+            str: Mã hóa đơn trùng kỳ hoặc None nếu không có
+        """
+        with self._hoa_don_cache.lock:
+            for hd in self._hoa_don_cache.lookup(
+                    'khach_hang_ky', (hoa_don.ma_khach_hang, hoa_don.nam, hoa_don.thang)):
+                if hd.ma_hoa_don != hoa_don.ma_hoa_don:
+                    return hd.ma_hoa_don
+        return None
+    
+    def tao_ma(self, tien_to):
+        """
+        Cấp mã mới không trùng lặp
+        
+        Args:
+            tien_to (str): 'KH' (khách hàng), 'HD' (hóa đơn) hoặc 'BG' (bảng giá)
+            
+        Returns:
+            str: Mã mới, ví dụ HD0000000001
+        """
+        return self._id_allocator.next_id(tien_to, seed=self._so_thu_tu_lon_nhat)
+    
+    def tao_ma_hang_loat(self, tien_to, so_luong):
+        """
+        Cấp một khối mã liên tiếp cho các lần ghi hàng loạt
+        
+        Args:
+            tien_to (str): 'KH', 'HD' hoặc 'BG'
+            so_luong (int): Số mã cần cấp
+            
+        Returns:
+            list: Các mã mới theo thứ tự tăng dần
+        """
+        return self._id_allocator.allocate(tien_to, so_luong, seed=self._so_thu_tu_lon_nhat)
+    
+    def _ma_hien_co(self, tien_to):
+        """
+        Lấy các mã đang dùng của loại dữ liệu ứng với tiền tố
+        
+        Args:
+            tien_to (str): 'KH', 'HD' hoặc 'BG'
+            
+        Returns:
+            list: Các mã khách hàng, hóa đơn hoặc bảng giá
+        """
+        cache = {'KH': self._khach_hang_cache, 'HD': self._hoa_don_cache,
+                 'BG': self._bang_gia_cache}.get(tien_to)
+        if cache is None:
+            return []
+        with cache.lock:
+            return list(cache.load())
+    
+    def _so_thu_tu_lon_nhat(self, tien_to):
+        """
+        Tìm số thứ tự lớn nhất trong các mã đang dùng có dạng tiền tố + chữ số
+        
+        Dùng để bộ cấp mã nối tiếp các mã đã có, kể cả mã cũ tạo theo thời gian
+        (HD20250101120000).
+        
+        Args:
+            tien_to (str): 'KH', 'HD' hoặc 'BG'
+            
+        Returns:
+            int: Số thứ tự lớn nhất, 0 nếu chưa có mã nào
+        """
+        so_lon_nhat = 0
+        for ma in self._ma_hien_co(tien_to):
+            so = str(ma)[len(tien_to):]
+            if str(ma).startswith(tien_to) and so.isdigit():
+                so_lon_nhat = max(so_lon_nhat, int(so))
+        return so_lon_nhat
+    
     def delete_hoa_don(self, ma_hoa_don):
         """
         Xóa hóa đơn theo mã
@@ -267,18 +536,15 @@ class DatabaseHandler:
             bool: True nếu thành công, False nếu thất bại
         """
         try:
-            hoa_don_list = self.get_all_hoa_don()
+            with self._hoa_don_cache.lock:
+                records = self._hoa_don_cache.load()
             
-            for i, hd in enumerate(hoa_don_list):
-                if hd.ma_hoa_don == ma_hoa_don:
-                    del hoa_don_list[i]
+                if ma_hoa_don not in records:
+                    return False
                     
-                    with open(self.hoa_don_file, 'w', encoding='utf-8') as f:
-                        json.dump([hd.to_dict() for hd in hoa_don_list], f, ensure_ascii=False, indent=4)
+                self._write(self._hoa_don_cache, deletes=[ma_hoa_don])
                     
-                    return True
-            
-            return False
+            return True
         except Exception as e:
             print(f"Lỗi khi xóa hóa đơn: {e}")
             return False
@@ -292,9 +558,7 @@ class DatabaseHandler:
             list: Danh sách các đối tượng BangGia
         """
         try:
-            with open(self.bang_gia_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                return [BangGia.from_dict(item) for item in data]
+            return [clone(bg) for bg in self._bang_gia_cache.load().values()]
         except Exception as e:
             print(f"Lỗi khi đọc dữ liệu bảng giá: {e}")
             return []
@@ -309,10 +573,52 @@ class DatabaseHandler:
         Returns:
             BangGia: Đối tượng bảng giá hoặc None nếu không tìm thấy
         """
-        for bg in self.get_all_bang_gia():
-            if bg.ma_bang_gia == ma_bang_gia:
-                return bg
-        return None
+        try:
+            bg = self._bang_gia_cache.load().get(ma_bang_gia)
+        except Exception as e:
+            print(f"Lỗi khi đọc dữ liệu bảng giá: {e}")
+            return None
+        return clone(bg) if bg else None
+    
+    def _bang_gia_generation(self):
+        """
+        Lấy phiên bản dữ liệu bảng giá, thay đổi mỗi khi bảng giá được ghi
+        
+        Returns:
+            int: Phiên bản dữ liệu bảng giá
+        """
+        with self._bang_gia_cache.lock:
+            self._bang_gia_cache.load()
+            return self._bang_gia_cache.generation
+    
+    def get_tariff_index(self):
+        """
+        Lấy chỉ mục khoảng hiệu lực của các bảng giá, tạo lại khi bảng giá thay đổi
+        
+        Các bảng giá trong chỉ mục dùng chung, không được sửa trực tiếp.
+        
+        Returns:
+            TariffIndex: Chỉ mục bảng giá theo ngày áp dụng
+        """
+        generation = self._bang_gia_generation()
+        index = self._tariff_index
+        if index is None or index.generation != generation:
+            index = self._tariff_index = TariffIndex(self.get_all_bang_gia(), generation)
+        return index
+    
+    def tariff_at(self, date):
+        """
+        Lấy bảng giá có hiệu lực tại một thời điểm
+        
+        Args:
+            date (date | datetime): Thời điểm cần tra cứu
+            
+        Returns:
+            BangGia: Bảng giá có ngày áp dụng gần nhất không sau thời điểm đó, hoặc None
+                nếu thời điểm trước mọi bảng giá
+        """
+        bang_gia = self.get_tariff_index().tariff_at(date)
+        return clone(bang_gia) if bang_gia else None
     
     def get_bang_gia_hien_hanh(self):
         """
@@ -321,34 +627,532 @@ class DatabaseHandler:
         Returns:
             BangGia: Đối tượng bảng giá hiện hành hoặc None nếu không có
         """
-        bang_gia_list = self.get_all_bang_gia()
+        index = self.get_tariff_index()
+        
+        # Lấy bảng giá có ngày áp dụng gần nhất không vượt quá ngày hiện tại,
+        # nếu không có bảng giá thỏa mãn thì lấy bảng giá mới nhất
+        hien_hanh = index.tariff_at(datetime.datetime.now()) or index.latest()
+        if hien_hanh is None:
+            # Không có bảng giá nào có ngày áp dụng
+            bang_gia_list = self.get_all_bang_gia()
+            if not bang_gia_list:
+                return None
+            hien_hanh = bang_gia_list[0]
+        
+        hien_hanh = clone(hien_hanh)
+        hien_hanh.trang_thai = True  # Đánh dấu bảng giá này là bảng giá hiện hành
+        return hien_hanh
+    
+    def get_bang_gia_theo_ky(self, thang, nam):
+        """
+        Lấy bảng giá có hiệu lực trong một kỳ hóa đơn
+        
+        Là bảng giá có ngày áp dụng gần nhất không sau ngày đầu kỳ. Kỳ trước mọi bảng giá
+        dùng bảng giá sớm nhất, khi chưa có bảng giá nào thì dùng bậc thang mặc định.
+        
+        Args:
+            thang (int): Tháng của kỳ hóa đơn
+            nam (int): Năm của kỳ hóa đơn
+            
+        Returns:
+            BangGia: Bảng giá có hiệu lực trong kỳ
+        """
+        index = self.get_tariff_index()
+        if not len(index):
+            return BangGia(None, None)
+        
+        try:
+            ngay_dau_ky = datetime.datetime(nam, thang, 1)
+        except (TypeError, ValueError):
+            # Kỳ không hợp lệ: dùng bảng giá hiện hành
+            return self.get_bang_gia_hien_hanh()
+        
+        return clone(index.tariff_at(ngay_dau_ky) or index.earliest())
+        
+    def get_bang_gia_trong_ky(self, thang, nam):
+        """
+        Lấy các bảng giá có hiệu lực trong một kỳ hóa đơn cùng số ngày áp dụng
+        
+        Kỳ hóa đơn tính từ ngày đầu tháng đến hết tháng. Phần đầu kỳ trước mọi bảng giá
+        dùng bảng giá sớm nhất.
+        
+        Args:
+            thang (int): Tháng của kỳ hóa đơn
+            nam (int): Năm của kỳ hóa đơn
+            
+        Returns:
+            list: Các cặp (bảng giá, số ngày áp dụng) theo thứ tự thời gian, rỗng nếu kỳ
+                không hợp lệ hoặc chưa có bảng giá
+        """
+        try:
+            ngay_dau_ky = datetime.datetime(nam, thang, 1)
+            ngay_dau_ky_sau = datetime.datetime(nam + thang // 12, thang % 12 + 1, 1)
+        except (TypeError, ValueError):
+            return []
+        
+        return [(clone(bang_gia), thoi_luong.total_seconds() / 86400)
+                for bang_gia, thoi_luong in self.get_tariff_index().segments(ngay_dau_ky, ngay_dau_ky_sau)]
+    
+    def tinh_tien_hoa_don(self, hoa_don, chia_theo_ngay=False):
+        """
+        Tính tiền hóa đơn theo bảng giá có hiệu lực trong kỳ của hóa đơn
         
-        if not bang_gia_list:
+        Args:
+            hoa_don (HoaDon): Hóa đơn cần tính tiền, so_tien được cập nhật trực tiếp
+            chia_theo_ngay (bool): Khi bảng giá thay đổi giữa kỳ, tính tiền theo từng bảng
+                giá tỷ lệ với số ngày áp dụng trong kỳ thay vì chỉ dùng bảng giá đầu kỳ
+            
+        Returns:
+            float: Số tiền phải thanh toán
+        """
+        if chia_theo_ngay:
+            cac_bang_gia = self.get_bang_gia_trong_ky(hoa_don.thang, hoa_don.nam)
+            if len(cac_bang_gia) > 1:
+                return hoa_don.tinh_tien_chia_theo_ngay(cac_bang_gia)
+        return hoa_don.tinh_tien(self.get_bang_gia_theo_ky(hoa_don.thang, hoa_don.nam))
+    
+    def tinh_lai_tien_hoa_don(self, thang=None, nam=None, da_thanh_toan=False,
+                              chia_theo_ngay=True, dry_run=True):
+        """
+        Tính lại tiền hàng loạt hóa đơn theo các bảng giá hiện có, dùng sau khi thêm bảng giá
+        
+        Hóa đơn được gom theo kỳ và tính bằng HoaDon.tinh_tien_hang_loat với bảng giá của kỳ
+        (kỳ có nhiều bảng giá được tính chia theo ngày như tinh_tien_hoa_don). Chỉ số tiền
+        của các hóa đơn thực sự thay đổi được ghi lại, tất cả trong một giao dịch. Mặc định
+        chỉ tính thử; phải truyền dry_run=False để ghi thay đổi.
+        
+        Args:
+            thang (int, optional): Chỉ tính lại hóa đơn của tháng này
+            nam (int, optional): Chỉ tính lại hóa đơn của năm này
+            da_thanh_toan (bool, optional): Trạng thái thanh toán của các hóa đơn cần tính
+                lại, None để tính lại mọi hóa đơn. Mặc định chỉ tính hóa đơn chưa thanh toán
+            chia_theo_ngay (bool): Tính chia theo ngày khi bảng giá thay đổi giữa kỳ
+            dry_run (bool): Chỉ tính và báo cáo chênh lệch, không ghi thay đổi (mặc định)
+            
+        Returns:
+            dict: Kết quả gồm số hóa đơn được chọn, số hóa đơn thay đổi, tổng tiền trước và
+                sau khi tính lại, chênh lệch và dry_run; None nếu có lỗi
+        """
+        try:
+            # Gom hóa đơn theo kỳ để mỗi kỳ chỉ tra cứu bảng giá một lần
+            theo_ky = {}
+            for hd in self._hoa_don_can_tinh_lai(thang, nam, da_thanh_toan):
+                theo_ky.setdefault((hd.nam, hd.thang), []).append(hd)
+            
+            so_hoa_don = 0
+            so_thay_doi = 0
+            tong_tien_cu = 0
+            tong_tien_moi = 0
+            thay_doi = {}
+            for (nam_hd, thang_hd), hoa_don_list in theo_ky.items():
+                cac_bang_gia = self.get_bang_gia_trong_ky(thang_hd, nam_hd) if chia_theo_ngay else []
+                if len(cac_bang_gia) > 1:
+                    so_tien_moi = [clone(hd).tinh_tien_chia_theo_ngay(cac_bang_gia) for hd in hoa_don_list]
+                else:
+                    so_tien_moi = HoaDon.so_tien_hang_loat(hoa_don_list, self.get_bang_gia_theo_ky(thang_hd, nam_hd))
+                
+                so_hoa_don += len(hoa_don_list)
+                tong_tien_cu += sum(hd.so_tien or 0 for hd in hoa_don_list)
+                tong_tien_moi += sum(so_tien_moi)
+                
+                for hd, so_tien in zip(hoa_don_list, so_tien_moi):
+                    if hd.so_tien != so_tien:
+                        so_thay_doi += 1
+                        if not dry_run:
+                            thay_doi[hd.ma_hoa_don] = so_tien
+            
+            if thay_doi:
+                self._cap_nhat_so_tien_hoa_don(thay_doi)
+            
+            return {
+                "so_hoa_don": so_hoa_don,
+                "so_thay_doi": so_thay_doi,
+                "tong_tien_cu": round(tong_tien_cu, 2),
+                "tong_tien_moi": round(tong_tien_moi, 2),
+                "chenh_lech": round(tong_tien_moi - tong_tien_cu, 2),
+                "dry_run": dry_run
+            }
+        except Exception as e:
+            print(f"Lỗi khi tính lại tiền hóa đơn: {e}")
             return None
+    
+    def _hoa_don_can_tinh_lai(self, thang, nam, da_thanh_toan):
+        """
+        Lấy các hóa đơn cần tính lại tiền, dùng chỉ mục kỳ và năm khi có thể
         
-        # Sắp xếp theo ngày áp dụng giảm dần (mới nhất đầu tiên)
-        bang_gia_list.sort(key=lambda bg: bg.ngay_ap_dung, reverse=True)
+        Các hóa đơn là đối tượng trong bộ nhớ đệm (không sao chép) nên chỉ được đọc.
         
-        # Lấy bảng giá có ngày áp dụng gần nhất không vượt quá ngày hiện tại
-        hien_hanh = None
-        now = datetime.datetime.now()
+        Args:
+            thang (int): Tháng hóa đơn hoặc None
+            nam (int): Năm hóa đơn hoặc None
+            da_thanh_toan (bool): Trạng thái thanh toán hoặc None
+            
+        Returns:
+            list: Danh sách hóa đơn
+        """
+        with self._hoa_don_cache.lock:
+            if nam is not None and thang is not None:
+                hoa_don_list = self._hoa_don_cache.lookup('ky', (nam, thang))
+            elif nam is not None:
+                hoa_don_list = self._hoa_don_cache.lookup('nam', nam)
+            else:
+                hoa_don_list = self._hoa_don_cache.load().values()
+            
+            return [hd for hd in hoa_don_list
+                    if (thang is None or hd.thang == thang)
+                    and (da_thanh_toan is None or bool(hd.da_thanh_toan) == da_thanh_toan)]
+    
+    def _cap_nhat_so_tien_hoa_don(self, so_tien_moi):
+        """
+        Ghi số tiền mới của các hóa đơn trong một giao dịch, giữ nguyên các trường khác
+        
+        Args:
+            so_tien_moi (dict): Mã hóa đơn -> số tiền mới
+        """
+        with self.transaction():
+            with self._hoa_don_cache.lock:
+                records = self._hoa_don_cache.load()
+                
+                cap_nhat = []
+                for ma_hoa_don, so_tien in so_tien_moi.items():
+                    hd = records.get(ma_hoa_don)
+                    if hd is not None:
+                        hd = clone(hd)
+                        hd.so_tien = so_tien
+                        cap_nhat.append(hd)
+                
+                self._write(self._hoa_don_cache, puts=cap_nhat)
+    
+    def lap_hoa_don_hang_loat(self, thang, nam, chi_so, checkpoint_file=None, chunk_size=10000,
+                              chia_theo_ngay=True, tien_do=None):
+        """
+        Lập hóa đơn của một kỳ cho tất cả khách hàng từ nguồn chỉ số công tơ
+        
+        Khách hàng được duyệt theo thứ tự mã và ghi theo từng lô chunk_size khách hàng,
+        mỗi lô được tính tiền bằng bảng giá của kỳ (HoaDon.tinh_tien_hang_loat, kỳ có
+        nhiều bảng giá được tính chia theo ngày) và ghi trong một lần. Khách hàng đã có hóa
+        đơn trong kỳ được bỏ qua nên chạy lại cùng một kỳ không tạo hóa đơn trùng; mã hóa
+        đơn của mỗi lô được cấp một lần bằng tao_ma_hang_loat. Với file checkpoint, mã khách
+        hàng cuối cùng đã xử lý được lưu sau mỗi lô để lần chạy sau tiếp tục từ các mã lớn
+        hơn; khách hàng đứng trước mã đó nhưng chưa có hóa đơn dù có chỉ số (thêm vào sau khi
+        bị gián đoạn) cũng được lập hóa đơn. File được xóa khi chạy xong. Chỉ số kỳ
+        trước được lấy từ chỉ mục chỉ số mới nhất; khách hàng có hóa đơn gần nhất không
+        phải tháng liền trước kỳ được liệt kê trong khach_hang_thieu_ky.
+        
+        Với dữ liệu JSON nên bật chế độ nhật ký (journal=True) để mỗi lô chỉ ghi thêm các
+        hóa đơn mới thay vì ghi lại toàn bộ file hoa_don.json.
+        
+        Args:
+            thang (int): Tháng của kỳ hóa đơn
+            nam (int): Năm của kỳ hóa đơn
+            chi_so (dict | iterable): Mã khách hàng -> chỉ số cuối kỳ hoặc cặp (chỉ số đầu
+                kỳ, chỉ số cuối kỳ), hoặc các cặp (mã khách hàng, chỉ số) tương ứng. Khi chỉ
+                có chỉ số cuối kỳ, chỉ số đầu kỳ là chỉ số cuối của hóa đơn gần nhất trước kỳ
+            checkpoint_file (str, optional): File lưu tiến độ để chạy tiếp khi bị gián đoạn
+            chunk_size (int): Số khách hàng trong mỗi lô ghi
+            chia_theo_ngay (bool): Tính chia theo ngày khi bảng giá thay đổi giữa kỳ
+            tien_do (callable, optional): Hàm nhận kết quả tạm thời sau mỗi lô
+            
+        Returns:
+            dict: Kết quả gồm số khách hàng, số hóa đơn mới, số khách hàng đã có hóa đơn, số
+                khách hàng thiếu chỉ số, các khách hàng bị thiếu kỳ trước, số lô, thời gian chạy
+                (giây), số hóa đơn mới mỗi giây và tiep_tuc (True nếu chạy tiếp từ checkpoint);
+                None nếu có lỗi
+        """
+        try:
+            bat_dau = time.perf_counter()
+            datetime.datetime(nam, thang, 1)  # Kiểm tra kỳ hợp lệ
+            if not isinstance(chi_so, dict):
+                chi_so = dict(chi_so)
+            
+            checkpoint = Checkpoint(checkpoint_file) if checkpoint_file else None
+            trang_thai = checkpoint.load() if checkpoint else None
+            if trang_thai is None:
+                trang_thai = {
+                    "thang": thang,
+                    "nam": nam,
+                    "ma_khach_hang_cuoi": None,
+                    "so_hoa_don_moi": 0,
+                    "so_da_co_hoa_don": 0,
+                    "so_thieu_chi_so": 0,
+                    "so_lo": 0,
+                    "thoi_gian": 0.0,
+                    "khach_hang_thieu_ky": []
+                }
+            elif (trang_thai.get("thang"), trang_thai.get("nam")) != (thang, nam):
+                raise ValueError(f"File checkpoint {checkpoint_file} thuộc kỳ "
+                                 f"{trang_thai.get('thang')}/{trang_thai.get('nam')}")
+            tiep_tuc = trang_thai["ma_khach_hang_cuoi"] is not None
+            thoi_gian_truoc = trang_thai["thoi_gian"]
+            
+            ma_khach_hang_list = self._ma_khach_hang_can_lap_hoa_don()
+            da_co_hoa_don = self._ma_khach_hang_da_co_hoa_don(thang, nam)
+            chi_so_truoc = self._chi_so_cuoi_truoc_ky(thang, nam)
+            
+            cac_bang_gia = self.get_bang_gia_trong_ky(thang, nam) if chia_theo_ngay else []
+            bang_gia = self.get_bang_gia_theo_ky(thang, nam)
+            
+            # Tiếp tục theo mã khách hàng thay vì vị trí vì danh sách khách hàng có thể thay
+            # đổi giữa hai lần chạy
+            bat_dau_tu = 0
+            if tiep_tuc:
+                bat_dau_tu = bisect.bisect_right(ma_khach_hang_list, trang_thai["ma_khach_hang_cuoi"])
+            bo_sung = [ma for ma in ma_khach_hang_list[:bat_dau_tu]
+                       if ma not in da_co_hoa_don and ma in chi_so]
+            # Các lô (danh sách mã, True nếu là lô theo thứ tự mã)
+            cac_lo = [(bo_sung[i:i + chunk_size], False) for i in range(0, len(bo_sung), chunk_size)]
+            cac_lo += [(ma_khach_hang_list[i:i + chunk_size], True)
+                       for i in range(bat_dau_tu, len(ma_khach_hang_list), chunk_size)]
+            
+            for lo, theo_thu_tu in cac_lo:
+                hoa_don_list = []
+                for ma_khach_hang in lo:
+                    if ma_khach_hang in da_co_hoa_don:
+                        trang_thai["so_da_co_hoa_don"] += 1
+                        continue
+                    
+                    chi_so_kh = chi_so.get(ma_khach_hang)
+                    if chi_so_kh is None:
+                        trang_thai["so_thieu_chi_so"] += 1
+                        continue
+                    
+                    truoc = chi_so_truoc.get(ma_khach_hang)
+                    if isinstance(chi_so_kh, (tuple, list)):
+                        chi_so_dau, chi_so_cuoi = chi_so_kh
+                    else:
+                        chi_so_dau, chi_so_cuoi = (truoc[2] if truoc else 0), chi_so_kh
+                    if missing_months(truoc, thang, nam):
+                        trang_thai["khach_hang_thieu_ky"].append(ma_khach_hang)
+                    
+                    hoa_don_list.append(HoaDon(None, ma_khach_hang, thang, nam, chi_so_dau, chi_so_cuoi))
+                
+                if hoa_don_list:
+                    for hd, ma_hoa_don in zip(hoa_don_list, self.tao_ma_hang_loat('HD', len(hoa_don_list))):
+                        hd.ma_hoa_don = ma_hoa_don
+                    if len(cac_bang_gia) > 1:
+                        for hd in hoa_don_list:
+                            hd.tinh_tien_chia_theo_ngay(cac_bang_gia)
+                    else:
+                        HoaDon.tinh_tien_hang_loat(hoa_don_list, bang_gia)
+                    self._them_hoa_don_hang_loat(hoa_don_list)
+                
+                if theo_thu_tu:
+                    trang_thai["ma_khach_hang_cuoi"] = lo[-1]
+                trang_thai["so_hoa_don_moi"] += len(hoa_don_list)
+                trang_thai["so_lo"] += 1
+                trang_thai["thoi_gian"] = thoi_gian_truoc + time.perf_counter() - bat_dau
+                if checkpoint:
+                    checkpoint.save(trang_thai)
+                if tien_do:
+                    tien_do(self._ket_qua_lap_hoa_don(trang_thai, ma_khach_hang_list, tiep_tuc))
+            
+            if checkpoint:
+                checkpoint.clear()
+            
+            trang_thai["thoi_gian"] = thoi_gian_truoc + time.perf_counter() - bat_dau
+            return self._ket_qua_lap_hoa_don(trang_thai, ma_khach_hang_list, tiep_tuc)
+        except Exception as e:
+            print(f"Lỗi khi lập hóa đơn hàng loạt: {e}")
+            return None
+    
+    @staticmethod
+    def _ket_qua_lap_hoa_don(trang_thai, ma_khach_hang_list, tiep_tuc):
+        """Tạo kết quả lập hóa đơn hàng loạt từ trạng thái của lần chạy"""
+        thoi_gian = trang_thai["thoi_gian"]
+        ma_cuoi = trang_thai["ma_khach_hang_cuoi"]
+        return {
+            "thang": trang_thai["thang"],
+            "nam": trang_thai["nam"],
+            "so_khach_hang": len(ma_khach_hang_list),
+            "da_xu_ly": bisect.bisect_right(ma_khach_hang_list, ma_cuoi) if ma_cuoi is not None else 0,
+            "so_hoa_don_moi": trang_thai["so_hoa_don_moi"],
+            "so_da_co_hoa_don": trang_thai["so_da_co_hoa_don"],
+            "so_thieu_chi_so": trang_thai["so_thieu_chi_so"],
+            "so_thieu_ky": len(trang_thai["khach_hang_thieu_ky"]),
+            "khach_hang_thieu_ky": list(trang_thai["khach_hang_thieu_ky"]),
+            "so_lo": trang_thai["so_lo"],
+            "thoi_gian": round(thoi_gian, 3),
+            "hoa_don_moi_giay": round(trang_thai["so_hoa_don_moi"] / thoi_gian, 1) if thoi_gian > 0 else 0,
+            "tiep_tuc": tiep_tuc
+        }
+    
+    def _ma_khach_hang_can_lap_hoa_don(self):
+        """
+        Lấy mã của các khách hàng cần lập hóa đơn, theo thứ tự mã
         
-        # Đặt trang_thai cho tất cả bảng giá là False
-        for bg in bang_gia_list:
-            bg.trang_thai = False
+        Returns:
+            list: Danh sách mã khách hàng
+        """
+        with self._khach_hang_cache.lock:
+            return sorted(self._khach_hang_cache.load())
+    
+    def _ma_khach_hang_da_co_hoa_don(self, thang, nam):
+        """
+        Lấy mã của các khách hàng đã có hóa đơn trong một kỳ (dùng chỉ mục kỳ)
         
-        for bg in bang_gia_list:
-            if bg.ngay_ap_dung <= now:
-                bg.trang_thai = True  # Đánh dấu bảng giá này là bảng giá hiện hành
-                hien_hanh = bg
-                break
+        Args:
+            thang (int): Tháng của kỳ hóa đơn
+            nam (int): Năm của kỳ hóa đơn
+            
+        Returns:
+            set: Tập mã khách hàng
+        """
+        with self._hoa_don_cache.lock:
+            return {hd.ma_khach_hang for hd in self._hoa_don_cache.lookup('ky', (nam, thang))}
+    
+    def _chi_so_cuoi_truoc_ky(self, thang, nam):
+        """
+        Lấy chỉ số của hóa đơn gần nhất trước một kỳ của từng khách hàng
         
-        # Nếu không có bảng giá thỏa mãn, trả về bảng giá đầu tiên
-        if hien_hanh is None and bang_gia_list:
-            bang_gia_list[0].trang_thai = True
-            hien_hanh = bang_gia_list[0]
+        Dùng chỉ mục chỉ số mới nhất; chỉ các khách hàng đã có hóa đơn từ kỳ này trở đi
+        mới phải tìm trong các hóa đơn của khách hàng.
         
-        return hien_hanh
+        Args:
+            thang (int): Tháng của kỳ hóa đơn
+            nam (int): Năm của kỳ hóa đơn
+            
+        Returns:
+            dict: Mã khách hàng -> (năm, tháng, chỉ số cuối kỳ)
+        """
+        chi_so_truoc = {}
+        with self._hoa_don_cache.lock:
+            for ma_khach_hang, moi_nhat in self._hoa_don_cache.derived_index('chi_so_moi_nhat').items():
+                if moi_nhat[:2] < (nam, thang):
+                    chi_so_truoc[ma_khach_hang] = moi_nhat[:3]
+                    continue
+                truoc = _hoa_don_gan_nhat_truoc_ky(
+                    self._hoa_don_cache.lookup('ma_khach_hang', ma_khach_hang), thang, nam)
+                if truoc is not None:
+                    chi_so_truoc[ma_khach_hang] = truoc
+        return chi_so_truoc
+    
+    def _them_hoa_don_hang_loat(self, hoa_don_list):
+        """
+        Ghi một lô hóa đơn mới trong một lần ghi
+        
+        Args:
+            hoa_don_list (list): Các hóa đơn mới, được đưa thẳng vào bộ nhớ đệm
+        
+        Raises:
+            ValueError: Nếu có hóa đơn trùng mã hoặc trùng kỳ của khách hàng; khi đó cả lô
+                không được ghi
+        """
+        with self._hoa_don_cache.lock:
+            records = self._hoa_don_cache.load()
+            # Khách hàng đã có hóa đơn theo từng kỳ của lô, bổ sung dần các hóa đơn trong lô
+            da_co_theo_ky = {}
+            for hd in hoa_don_list:
+                da_co = da_co_theo_ky.get((hd.thang, hd.nam))
+                if da_co is None:
+                    da_co = da_co_theo_ky[(hd.thang, hd.nam)] = self._ma_khach_hang_da_co_hoa_don(hd.thang, hd.nam)
+                if hd.ma_hoa_don in records or hd.ma_khach_hang in da_co:
+                    raise ValueError(f"Hóa đơn {hd.ma_hoa_don} trùng mã hoặc trùng kỳ "
+                                     f"{hd.thang}/{hd.nam} của khách hàng {hd.ma_khach_hang}")
+                da_co.add(hd.ma_khach_hang)
+            self._write(self._hoa_don_cache, puts=hoa_don_list)
+    
+    def nhap_chi_so_cong_to(self, file_path, rejects_file=None, batch_size=5000, chia_theo_ngay=True):
+        """
+        Nhập chỉ số công tơ từ file CSV hoặc NDJSON và lập hóa đơn cho các dòng hợp lệ
+        
+        File được xử lý tuần tự qua các bước đọc -> chuẩn hóa -> kiểm tra -> tính tiền ->
+        ghi (xem utils.ingest), mỗi lần một dòng, nên bộ nhớ không phụ thuộc kích thước
+        file. Các hóa đơn hợp lệ được ghi theo từng lô batch_size hóa đơn, mã hóa đơn của
+        mỗi lô được cấp một lần như lap_hoa_don_hang_loat. Các dòng bị loại được ghi
+        vào rejects_file (NDJSON) kèm số dòng và lý do. Dòng được chấp nhận nhưng kỳ trước
+        của khách hàng không phải tháng liền trước được liệt kê trong khach_hang_thieu_ky.
+        
+        Args:
+            file_path (str): File chỉ số công tơ (.csv có dòng tiêu đề, còn lại là NDJSON)
+                với các cột ma_cong_to, thang, nam (hoặc ky dạng MM/YYYY), chi_so_cuoi và
+                chi_so_dau (không bắt buộc)
+            rejects_file (str, optional): File ghi các dòng bị loại
+            batch_size (int): Số hóa đơn mỗi lô ghi
+            chia_theo_ngay (bool): Tính chia theo ngày khi bảng giá thay đổi giữa kỳ
+            
+        Returns:
+            dict: Kết quả gồm số hóa đơn đã ghi, số dòng bị loại, số dòng bị loại theo lý
+                do, các khách hàng bị thiếu kỳ trước, số lô, thời gian chạy (giây) và số hóa
+                đơn mỗi giây; None nếu có lỗi.
+                Khi có lỗi giữa chừng, các lô đã ghi trước đó vẫn được giữ lại
+        """
+        try:
+            bat_dau = time.perf_counter()
+            khach_hang_theo_cong_to = self._khach_hang_theo_cong_to()
+            
+            # Dữ liệu tra cứu theo kỳ, chỉ tạo khi gặp kỳ đó lần đầu
+            da_co_theo_ky = {}
+            chi_so_truoc_theo_ky = {}
+            bang_gia_theo_ky = {}
+            
+            def da_co_hoa_don(thang, nam):
+                if (thang, nam) not in da_co_theo_ky:
+                    da_co_theo_ky[(thang, nam)] = self._ma_khach_hang_da_co_hoa_don(thang, nam)
+                return da_co_theo_ky[(thang, nam)]
+            
+            def chi_so_truoc(thang, nam):
+                if (thang, nam) not in chi_so_truoc_theo_ky:
+                    chi_so_truoc_theo_ky[(thang, nam)] = self._chi_so_cuoi_truoc_ky(thang, nam)
+                return chi_so_truoc_theo_ky[(thang, nam)]
+            
+            def bang_gia_trong_ky(thang, nam):
+                if (thang, nam) not in bang_gia_theo_ky:
+                    cac_bang_gia = self.get_bang_gia_trong_ky(thang, nam) if chia_theo_ngay else []
+                    bang_gia_theo_ky[(thang, nam)] = cac_bang_gia or [(self.get_bang_gia_theo_ky(thang, nam), 1)]
+                return bang_gia_theo_ky[(thang, nam)]
+            
+            khach_hang_thieu_ky = []
+            
+            def thieu_ky(ma_khach_hang, thang, nam, so_thang_thieu):
+                khach_hang_thieu_ky.append({
+                    "ma_khach_hang": ma_khach_hang,
+                    "thang": thang,
+                    "nam": nam,
+                    "so_thang_thieu": so_thang_thieu
+                })
+            
+            so_hoa_don = 0
+            so_lo = 0
+            with RejectLog(rejects_file) as rejects:
+                records = read_records(file_path, rejects)
+                readings = normalize_records(records, rejects)
+                hoa_don_list = validate_readings(readings, khach_hang_theo_cong_to, da_co_hoa_don,
+                                                 chi_so_truoc, rejects, thieu_ky)
+                for lo in price_batches(hoa_don_list, bang_gia_trong_ky, batch_size):
+                    for hd, ma_hoa_don in zip(lo, self.tao_ma_hang_loat('HD', len(lo))):
+                        hd.ma_hoa_don = ma_hoa_don
+                    self._them_hoa_don_hang_loat(lo)
+                    so_hoa_don += len(lo)
+                    so_lo += 1
+            
+            thoi_gian = time.perf_counter() - bat_dau
+            return {
+                "so_hoa_don": so_hoa_don,
+                "so_dong_loi": rejects.total,
+                "loi_theo_ly_do": dict(rejects.counts),
+                "so_thieu_ky": len(khach_hang_thieu_ky),
+                "khach_hang_thieu_ky": khach_hang_thieu_ky,
+                "so_lo": so_lo,
+                "thoi_gian": round(thoi_gian, 3),
+                "hoa_don_moi_giay": round(so_hoa_don / thoi_gian, 1) if thoi_gian > 0 else 0
+            }
+        except Exception as e:
+            print(f"Lỗi khi nhập chỉ số công tơ: {e}")
+            return None
+    
+    def _khach_hang_theo_cong_to(self):
+        """
+        Lấy bảng tra cứu mã công tơ -> mã khách hàng
+        
+        Returns:
+            dict: Mã công tơ -> mã khách hàng (khách hàng đứng trước được ưu tiên)
+        """
+        khach_hang_theo_cong_to = {}
+        with self._khach_hang_cache.lock:
+            for kh in self._khach_hang_cache.load().values():
+                if kh.ma_cong_to:
+                    khach_hang_theo_cong_to.setdefault(str(kh.ma_cong_to).strip(), kh.ma_khach_hang)
+        return khach_hang_theo_cong_to
     
     def add_bang_gia(self, bang_gia):
         """
@@ -361,17 +1165,14 @@ class DatabaseHandler:
             bool: True nếu thành công, False nếu thất bại
         """
         try:
-            bang_gia_list = self.get_all_bang_gia()
+            with self._bang_gia_cache.lock:
+                records = self._bang_gia_cache.load()
             
-            # Kiểm tra mã bảng giá đã tồn tại chưa
-            for bg in bang_gia_list:
-                if bg.ma_bang_gia == bang_gia.ma_bang_gia:
+                # Kiểm tra mã bảng giá đã tồn tại chưa
+                if bang_gia.ma_bang_gia in records:
                     return False
             
-            bang_gia_list.append(bang_gia)
-            
-            with open(self.bang_gia_file, 'w', encoding='utf-8') as f:
-                json.dump([bg.to_dict() for bg in bang_gia_list], f, ensure_ascii=False, indent=4)
+                self._write(self._bang_gia_cache, puts=[clone(bang_gia)])
             
             return True
         except Exception as e:
@@ -417,7 +1218,15 @@ class DatabaseHandler:
         keyword = keyword.lower()
         result = []
         
-        for hd in self.get_all_hoa_don():
+        # Chỉ đọc các hóa đơn trong kỳ cần lọc
+        if thang is not None and nam is not None:
+            hoa_don_list = self.get_hoa_don_theo_ky(thang, nam)
+        elif nam is not None:
+            hoa_don_list = self.get_hoa_don_theo_nam(nam)
+        else:
+            hoa_don_list = self.get_all_hoa_don()
+        
+        for hd in hoa_don_list:
             # Kiểm tra từ khóa
             ma_khach_hang = hd.ma_khach_hang.lower()
             ma_hoa_don = hd.ma_hoa_don.lower()
@@ -477,6 +1286,39 @@ class DatabaseHandler:
         
         return result
     
+    def get_hoa_don_theo_ky(self, thang, nam):
+        """
+        Lấy danh sách hóa đơn của một kỳ
+        
+        Args:
+            thang (int): Tháng hóa đơn
+            nam (int): Năm hóa đơn
+            
+        Returns:
+            list: Danh sách hóa đơn trong kỳ
+        """
+        try:
+            return [clone(hd) for hd in self._hoa_don_cache.lookup('ky', (nam, thang))]
+        except Exception as e:
+            print(f"Lỗi khi đọc dữ liệu hóa đơn: {e}")
+            return []
+    
+    def get_hoa_don_theo_nam(self, nam):
+        """
+        Lấy danh sách hóa đơn của một năm
+        
+        Args:
+            nam (int): Năm hóa đơn
+            
+        Returns:
+            list: Danh sách hóa đơn trong năm
+        """
+        try:
+            return [clone(hd) for hd in self._hoa_don_cache.lookup('nam', nam)]
+        except Exception as e:
+            print(f"Lỗi khi đọc dữ liệu hóa đơn: {e}")
+            return []
+    
     def get_hoa_don_by_khach_hang(self, ma_khach_hang):
         """
         Lấy danh sách hóa đơn của một khách hàng
@@ -487,7 +1329,73 @@ class DatabaseHandler:
         Returns:
             list: Danh sách hóa đơn của khách hàng
         """
-        return [hd for hd in self.get_all_hoa_don() if hd.ma_khach_hang == ma_khach_hang]
+        try:
+            return [clone(hd) for hd in self._hoa_don_cache.lookup('ma_khach_hang', ma_khach_hang)]
+        except Exception as e:
+            print(f"Lỗi khi đọc dữ liệu hóa đơn: {e}")
+            return []
+    
+    def get_chi_so_moi_nhat(self, ma_khach_hang):
+        """
+        Lấy chỉ số công tơ của hóa đơn mới nhất của một khách hàng (tra cứu chỉ mục)
+        
+        Args:
+            ma_khach_hang (str): Mã khách hàng
+            
+        Returns:
+            tuple: (năm, tháng, chỉ số cuối) hoặc None nếu khách hàng chưa có hóa đơn
+        """
+        try:
+            with self._hoa_don_cache.lock:
+                moi_nhat = self._hoa_don_cache.derived_index('chi_so_moi_nhat').get(ma_khach_hang)
+        except Exception as e:
+            print(f"Lỗi khi đọc dữ liệu hóa đơn: {e}")
+            return None
+        return moi_nhat[:3] if moi_nhat else None
+    
+    def get_chi_so_dau_ky(self, ma_khach_hang, thang, nam):
+        """
+        Lấy chỉ số đầu kỳ cho hóa đơn mới của một khách hàng
+        
+        Chỉ số đầu kỳ là chỉ số cuối của hóa đơn gần nhất trước kỳ, tra cứu trực tiếp từ
+        chỉ mục chỉ số mới nhất khi khách hàng chưa có hóa đơn từ kỳ này trở đi.
+        
+        Args:
+            ma_khach_hang (str): Mã khách hàng
+            thang (int): Tháng của kỳ hóa đơn
+            nam (int): Năm của kỳ hóa đơn
+            
+        Returns:
+            dict: chi_so_dau (0 nếu chưa có hóa đơn trước kỳ), ky_truoc ((năm, tháng) của
+                hóa đơn gần nhất trước kỳ hoặc None) và so_thang_thieu (số tháng không có hóa
+                đơn giữa kỳ trước và kỳ này)
+        """
+        truoc = self._chi_so_truoc_ky_cua_khach_hang(ma_khach_hang, thang, nam)
+        return {
+            "chi_so_dau": truoc[2] if truoc else 0,
+            "ky_truoc": truoc[:2] if truoc else None,
+            "so_thang_thieu": missing_months(truoc, thang, nam)
+        }
+    
+    def _chi_so_truoc_ky_cua_khach_hang(self, ma_khach_hang, thang, nam):
+        """
+        Lấy chỉ số của hóa đơn gần nhất trước một kỳ của một khách hàng
+        
+        Returns:
+            tuple: (năm, tháng, chỉ số cuối) hoặc None
+        """
+        try:
+            with self._hoa_don_cache.lock:
+                moi_nhat = self._hoa_don_cache.derived_index('chi_so_moi_nhat').get(ma_khach_hang)
+                if moi_nhat is None or moi_nhat[:2] < (nam, thang):
+                    return moi_nhat[:3] if moi_nhat else None
+                
+                # Khách hàng đã có hóa đơn từ kỳ này trở đi
+                return _hoa_don_gan_nhat_truoc_ky(
+                    self._hoa_don_cache.lookup('ma_khach_hang', ma_khach_hang), thang, nam)
+        except Exception as e:
+            print(f"Lỗi khi đọc dữ liệu hóa đơn: {e}")
+            return None
     
     def search_hoa_don_by_ma(self, ma_hoa_don):
         """
@@ -519,7 +1427,7 @@ class DatabaseHandler:
                 if len(parts) == 2:
                     month = int(parts[0])
                     year = int(parts[1])
-                    return [hd for hd in self.get_all_hoa_don() if hd.thang == month and hd.nam == year]
+                    return self.get_hoa_don_theo_ky(month, year)
             
             # Nếu không đúng định dạng, trả về kết quả theo cách cũ
             return [hd for hd in self.get_all_hoa_don() if hd.thang == thang]
@@ -547,6 +1455,55 @@ class DatabaseHandler:
         return self.get_bang_gia_hien_hanh()
 
     # Phần 4: Thống kê và báo cáo
+    def aggregate(self, group_by=(), metrics=None, where=None, hoa_don_list=None, keys=(), rollup=False):
+        """
+        Gom nhóm và tính các chỉ số của hóa đơn trong một lần duyệt
+        
+        Ví dụ:
+            db.aggregate(group_by=['nam', 'thang'], metrics={
+                "doanh_thu": (SUM, 'tong_tien'),
+                "so_hoa_don": (COUNT,),
+                "chua_thanh_toan": (COUNT, lambda hd: not hd.da_thanh_toan),
+            })
+        
+        Args:
+            group_by (list): Các tên thuộc tính hoặc hàm dùng làm khóa nhóm
+            metrics (dict): Tên chỉ số -> (hàm đo, trường, điều kiện), xem utils.aggregate
+            where (callable, optional): Điều kiện lọc hóa đơn
+            hoa_don_list (list, optional): Danh sách hóa đơn cần thống kê, mặc định là tất cả
+            keys (iterable): Các khóa nhóm luôn có trong kết quả
+            rollup (bool): Tính thêm tổng của toàn bộ dữ liệu với khóa ()
+            
+        Returns:
+            dict: Khóa nhóm -> {tên chỉ số: giá trị}
+        """
+        if hoa_don_list is None:
+            hoa_don_list = self.get_all_hoa_don()
+        return aggregate(hoa_don_list, group_by, metrics, where, keys, rollup)
+    
+    def get_analytics_frame(self):
+        """
+        Lấy khung dữ liệu phân tích của hóa đơn, tạo lại khi dữ liệu thay đổi
+        
+        Returns:
+            AnalyticsFrame: Khung dữ liệu hoặc None nếu không bật chế độ phân tích,
+                chưa cài đặt pandas hoặc không tạo được khung dữ liệu
+        """
+        if not (self.analytics and HAS_PANDAS):
+            return None
+        
+        try:
+            with self._hoa_don_cache.lock:
+                records = self._hoa_don_cache.load()
+                generation = self._hoa_don_cache.generation
+                frame = self._analytics_frame
+                if frame is None or frame.generation != generation:
+                    frame = self._analytics_frame = AnalyticsFrame(records.values(), generation)
+            return frame
+        except Exception as e:
+            print(f"Lỗi khi tạo khung dữ liệu phân tích: {e}")
+            return None
+    
     def thong_ke_doanh_thu_theo_thang(self, thang=None, nam=None):
         """
         Thống kê doanh thu theo tháng
@@ -563,24 +1520,26 @@ class DatabaseHandler:
         if nam is None:
             nam = datetime.datetime.now().year
             
-        hoa_don_list = [hd for hd in self.get_all_hoa_don() if hd.thang == thang and hd.nam == nam]
-        
-        tong_doanh_thu = sum(hd.tong_tien for hd in hoa_don_list)
-        so_hoa_don = len(hoa_don_list)
-        da_thanh_toan = sum(1 for hd in hoa_don_list if hd.da_thanh_toan)
-        chua_thanh_toan = so_hoa_don - da_thanh_toan
-        tong_tien_da_thanh_toan = sum(hd.tong_tien for hd in hoa_don_list if hd.da_thanh_toan)
-        tong_tien_chua_thanh_toan = tong_doanh_thu - tong_tien_da_thanh_toan
+        frame = self.get_analytics_frame()
+        if frame is not None:
+            return frame.doanh_thu_theo_thang(thang, nam)
+            
+        ket_qua = self.aggregate(metrics={
+            "tong_doanh_thu": (SUM, 'tong_tien'),
+            "so_hoa_don": (COUNT,),
+            "da_thanh_toan": (COUNT, 'da_thanh_toan'),
+            "tong_tien_da_thanh_toan": (SUM, 'tong_tien', 'da_thanh_toan')
+        }, hoa_don_list=self.get_hoa_don_theo_ky(thang, nam))[()]
         
         return {
             "thang": thang,
             "nam": nam,
-            "tong_doanh_thu": tong_doanh_thu,
-            "so_hoa_don": so_hoa_don,
-            "da_thanh_toan": da_thanh_toan,
-            "chua_thanh_toan": chua_thanh_toan,
-            "tong_tien_da_thanh_toan": tong_tien_da_thanh_toan,
-            "tong_tien_chua_thanh_toan": tong_tien_chua_thanh_toan
+            "tong_doanh_thu": ket_qua["tong_doanh_thu"],
+            "so_hoa_don": ket_qua["so_hoa_don"],
+            "da_thanh_toan": ket_qua["da_thanh_toan"],
+            "chua_thanh_toan": ket_qua["so_hoa_don"] - ket_qua["da_thanh_toan"],
+            "tong_tien_da_thanh_toan": ket_qua["tong_tien_da_thanh_toan"],
+            "tong_tien_chua_thanh_toan": ket_qua["tong_doanh_thu"] - ket_qua["tong_tien_da_thanh_toan"]
         }
     
     def thong_ke_doanh_thu_theo_nam(self, nam=None):
@@ -596,33 +1555,27 @@ class DatabaseHandler:
         if nam is None:
             nam = datetime.datetime.now().year
             
-        # Lấy tất cả hóa đơn trong năm
-        hoa_don_list = [hd for hd in self.get_all_hoa_don() if hd.nam == nam]
-        
-        # Thống kê tổng năm
-        tong_doanh_thu = sum(hd.tong_tien for hd in hoa_don_list)
-        so_hoa_don = len(hoa_don_list)
-        da_thanh_toan = sum(1 for hd in hoa_don_list if hd.da_thanh_toan)
-        chua_thanh_toan = so_hoa_don - da_thanh_toan
+        frame = self.get_analytics_frame()
+        if frame is not None:
+            return frame.doanh_thu_theo_nam(nam)
+            
+        # Thống kê theo tháng và tổng năm trong một lần duyệt các hóa đơn trong năm
+        ket_qua = self.aggregate(group_by=['thang'], metrics={
+            "doanh_thu": (SUM, 'tong_tien'),
+            "so_hoa_don": (COUNT,),
+            "da_thanh_toan": (COUNT, 'da_thanh_toan'),
+            "chua_thanh_toan": (COUNT, lambda hd: not hd.da_thanh_toan)
+        }, hoa_don_list=self.get_hoa_don_theo_nam(nam), keys=range(1, 13), rollup=True)
         
-        # Thống kê theo tháng
-        thong_ke_thang = {}
-        for thang in range(1, 13):
-            hoa_don_thang = [hd for hd in hoa_don_list if hd.thang == thang]
-            doanh_thu_thang = sum(hd.tong_tien for hd in hoa_don_thang)
-            thong_ke_thang[thang] = {
-                "doanh_thu": doanh_thu_thang,
-                "so_hoa_don": len(hoa_don_thang),
-                "da_thanh_toan": sum(1 for hd in hoa_don_thang if hd.da_thanh_toan),
-                "chua_thanh_toan": sum(1 for hd in hoa_don_thang if not hd.da_thanh_toan)
-            }
+        tong_nam = ket_qua[()]
+        thong_ke_thang = {thang: ket_qua[thang] for thang in range(1, 13)}
         
         return {
             "nam": nam,
-            "tong_doanh_thu": tong_doanh_thu,
-            "so_hoa_don": so_hoa_don,
-            "da_thanh_toan": da_thanh_toan,
-            "chua_thanh_toan": chua_thanh_toan,
+            "tong_doanh_thu": tong_nam["doanh_thu"],
+            "so_hoa_don": tong_nam["so_hoa_don"],
+            "da_thanh_toan": tong_nam["da_thanh_toan"],
+            "chua_thanh_toan": tong_nam["so_hoa_don"] - tong_nam["da_thanh_toan"],
             "theo_thang": thong_ke_thang
         }
     
@@ -642,18 +1595,25 @@ class DatabaseHandler:
         if nam is None:
             nam = datetime.datetime.now().year
             
-        hoa_don_list = [hd for hd in self.get_all_hoa_don() if hd.thang == thang and hd.nam == nam]
-        
-        tong_tieu_thu = sum(hd.dien_tieu_thu for hd in hoa_don_list)
-        so_khach_hang = len(set(hd.ma_khach_hang for hd in hoa_don_list))
-        
-        # Phân loại theo bậc tiêu thụ
-        bac_1 = sum(1 for hd in hoa_don_list if hd.dien_tieu_thu <= 50)
-        bac_2 = sum(1 for hd in hoa_don_list if 50 < hd.dien_tieu_thu <= 100)
-        bac_3 = sum(1 for hd in hoa_don_list if 100 < hd.dien_tieu_thu <= 200)
-        bac_4 = sum(1 for hd in hoa_don_list if 200 < hd.dien_tieu_thu <= 300)
-        bac_5 = sum(1 for hd in hoa_don_list if 300 < hd.dien_tieu_thu <= 400)
-        bac_6 = sum(1 for hd in hoa_don_list if hd.dien_tieu_thu > 400)
+        # Phân loại theo các bậc của bảng giá có hiệu lực trong kỳ
+        can_bac = _can_bac_gia(self.get_bang_gia_theo_ky(thang, nam))
+        bac_keys = [f"bac_{bac}" for bac in range(1, len(can_bac) + 2)]
+        
+        frame = self.get_analytics_frame()
+        if frame is not None:
+            return frame.tieu_thu_theo_thang(thang, nam, can_bac, bac_keys)
+        
+        # Phân loại theo bậc tiêu thụ và tính tổng trong một lần duyệt
+        ket_qua = self.aggregate(group_by=[
+            lambda hd: bac_keys[bisect.bisect_left(can_bac, hd.dien_tieu_thu)]
+        ], metrics={
+            "so_hoa_don": (COUNT,),
+            "tieu_thu": (SUM, 'dien_tieu_thu'),
+            "so_khach_hang": (COUNT_DISTINCT, 'ma_khach_hang')
+        }, hoa_don_list=self.get_hoa_don_theo_ky(thang, nam), keys=bac_keys, rollup=True)
+        
+        tong_tieu_thu = ket_qua[()]["tieu_thu"]
+        so_khach_hang = ket_qua[()]["so_khach_hang"]
         
         return {
             "thang": thang,
@@ -661,14 +1621,7 @@ class DatabaseHandler:
             "tong_tieu_thu": tong_tieu_thu,
             "so_khach_hang": so_khach_hang,
             "trung_binh_tieu_thu": tong_tieu_thu / so_khach_hang if so_khach_hang > 0 else 0,
-            "phan_loai_tieu_thu": {
-                "bac_1": bac_1,
-                "bac_2": bac_2,
-                "bac_3": bac_3,
-                "bac_4": bac_4,
-                "bac_5": bac_5,
-                "bac_6": bac_6
-            }
+            "phan_loai_tieu_thu": {bac: ket_qua[bac]["so_hoa_don"] for bac in bac_keys}
         }
     
     def thong_ke_tieu_thu_theo_nam(self, nam=None):
@@ -684,19 +1637,21 @@ class DatabaseHandler:
         if nam is None:
             nam = datetime.datetime.now().year
             
-        # Lấy tất cả hóa đơn trong năm
-        hoa_don_list = [hd for hd in self.get_all_hoa_don() if hd.nam == nam]
-        
-        # Thống kê tổng năm
-        tong_tieu_thu = sum(hd.dien_tieu_thu for hd in hoa_don_list)
-        so_hoa_don = len(hoa_don_list)
+        frame = self.get_analytics_frame()
+        if frame is not None:
+            return frame.tieu_thu_theo_nam(nam)
+            
+        # Thống kê theo tháng và tổng năm trong một lần duyệt các hóa đơn trong năm
+        ket_qua = self.aggregate(group_by=['thang'], metrics={
+            "tieu_thu": (SUM, 'dien_tieu_thu'),
+            "so_hoa_don": (COUNT,),
+            "so_khach_hang": (COUNT_DISTINCT, 'ma_khach_hang')
+        }, hoa_don_list=self.get_hoa_don_theo_nam(nam), keys=range(1, 13), rollup=True)
         
-        # Thống kê theo tháng
         thong_ke_thang = {}
         for thang in range(1, 13):
-            hoa_don_thang = [hd for hd in hoa_don_list if hd.thang == thang]
-            tieu_thu_thang = sum(hd.dien_tieu_thu for hd in hoa_don_thang)
-            so_khach_hang = len(set(hd.ma_khach_hang for hd in hoa_don_thang))
+            tieu_thu_thang = ket_qua[thang]["tieu_thu"]
+            so_khach_hang = ket_qua[thang]["so_khach_hang"]
             thong_ke_thang[thang] = {
                 "tieu_thu": tieu_thu_thang,
                 "so_khach_hang": so_khach_hang,
@@ -705,11 +1660,84 @@ class DatabaseHandler:
         
         return {
             "nam": nam,
-            "tong_tieu_thu": tong_tieu_thu,
-            "so_hoa_don": so_hoa_don,
+            "tong_tieu_thu": ket_qua[()]["tieu_thu"],
+            "so_hoa_don": ket_qua[()]["so_hoa_don"],
             "theo_thang": thong_ke_thang
         }
     
+    def thong_ke_bac_gia(self, thang=None, nam=None):
+        """
+        Thống kê số hóa đơn, lượng tiêu thụ và doanh thu theo từng bậc giá
+        
+        Mỗi hóa đơn được xếp vào bậc của bảng giá có hiệu lực trong kỳ của nó (xem
+        get_bang_gia_theo_ky) bằng tìm kiếm nhị phân trên cận trên của các bậc, nên báo
+        cáo luôn khớp với bậc thang đang áp dụng kể cả khi bảng giá thay đổi cấu trúc bậc.
+        
+        Args:
+            thang (int, optional): Tháng cần thống kê, bỏ trống để thống kê cả năm
+            nam (int, optional): Năm cần thống kê, mặc định là năm hiện tại
+            
+        Returns:
+            dict: Tổng số hóa đơn, tiêu thụ, doanh thu, mã các bảng giá đã dùng và
+                thống kê theo bậc (1, 2, ...)
+        """
+        if nam is None:
+            nam = datetime.datetime.now().year
+        
+        # Bảng giá và cận các bậc của từng kỳ, chỉ tra cứu một lần cho mỗi kỳ
+        bac_gia_theo_ky = {}
+        
+        def can_bac_cua_ky(thang_hd, nam_hd):
+            ky = (nam_hd, thang_hd)
+            if ky not in bac_gia_theo_ky:
+                bang_gia = self.get_bang_gia_theo_ky(thang_hd, nam_hd)
+                bac_gia_theo_ky[ky] = (bang_gia.ma_bang_gia, _can_bac_gia(bang_gia))
+            return bac_gia_theo_ky[ky][1]
+        
+        if thang is not None:
+            # Luôn có bậc thang của kỳ trong kết quả kể cả khi kỳ chưa có hóa đơn
+            can_bac_cua_ky(thang, nam)
+        
+        frame = self.get_analytics_frame()
+        if frame is not None:
+            theo_bac = frame.bac_gia(thang, nam, can_bac_cua_ky)
+        else:
+            if thang is not None:
+                hoa_don_list = self.get_hoa_don_theo_ky(thang, nam)
+            else:
+                hoa_don_list = self.get_hoa_don_theo_nam(nam)
+            
+            ket_qua = self.aggregate(group_by=[
+                lambda hd: bisect.bisect_left(can_bac_cua_ky(hd.thang, hd.nam), hd.dien_tieu_thu) + 1
+            ], metrics={
+                "so_hoa_don": (COUNT,),
+                "tieu_thu": (SUM, 'dien_tieu_thu'),
+                "doanh_thu": (SUM, lambda hd: hd.so_tien if hd.so_tien else 0)
+            }, hoa_don_list=hoa_don_list)
+            theo_bac = {bac: (gia_tri["so_hoa_don"], gia_tri["tieu_thu"], gia_tri["doanh_thu"])
+                        for bac, gia_tri in ket_qua.items()}
+        
+        so_bac = max((len(can_bac) + 1 for _, can_bac in bac_gia_theo_ky.values()), default=0)
+        thong_ke_bac = {}
+        for bac in range(1, so_bac + 1):
+            so_hoa_don, tieu_thu, doanh_thu = theo_bac.get(bac, (0, 0, 0))
+            thong_ke_bac[bac] = {
+                "so_hoa_don": so_hoa_don,
+                "tieu_thu": tieu_thu,
+                "doanh_thu": doanh_thu
+            }
+        
+        return {
+            "thang": thang,
+            "nam": nam,
+            "so_hoa_don": sum(gia_tri["so_hoa_don"] for gia_tri in thong_ke_bac.values()),
+            "tong_tieu_thu": sum(gia_tri["tieu_thu"] for gia_tri in thong_ke_bac.values()),
+            "tong_doanh_thu": sum(gia_tri["doanh_thu"] for gia_tri in thong_ke_bac.values()),
+            "bang_gia": sorted({ma_bang_gia for ma_bang_gia, _ in bac_gia_theo_ky.values()
+                                if ma_bang_gia is not None}),
+            "theo_bac": thong_ke_bac
+        }
+    
     def thong_ke_khach_hang(self):
         """
         Thống kê thông tin khách hàng
@@ -721,17 +1749,11 @@ class DatabaseHandler:
         so_khach_hang = len(khach_hang_list)
         
         # Thống kê theo địa chỉ
-        dia_chi_dict = {}
-        for kh in khach_hang_list:
-            dia_chi = kh.dia_chi
-            if dia_chi in dia_chi_dict:
-                dia_chi_dict[dia_chi] += 1
-            else:
-                dia_chi_dict[dia_chi] = 1
+        theo_dia_chi = aggregate(khach_hang_list, group_by=['dia_chi'], metrics={"so_luong": (COUNT,)})
         
         # Sắp xếp theo số lượng giảm dần
         dia_chi_thong_ke = sorted(
-            [{"dia_chi": k, "so_luong": v} for k, v in dia_chi_dict.items()],
+            [{"dia_chi": k, "so_luong": v["so_luong"]} for k, v in theo_dia_chi.items()],
             key=lambda x: x["so_luong"],
             reverse=True
         )
@@ -751,75 +1773,248 @@ class DatabaseHandler:
         Returns:
             dict: Thông tin thống kê nợ đọng
         """
+        frame = self.get_analytics_frame()
+        if frame is not None:
+            ket_qua = frame.no_dong(so_ngay, KHOANG_QUA_HAN, KHOANG_QUA_HAN_KEYS)
+            ket_qua["top_khach_hang_no"] = [
+                self._them_ten_khach_hang(thong_ke) for thong_ke in ket_qua["top_khach_hang_no"]
+            ]
+            return ket_qua
+        
         # Lấy danh sách hóa đơn quá hạn
         hoa_don_qua_han = self.get_hoa_don_qua_han(so_ngay)
         
-        # Tổng tiền nợ
-        tong_tien_no = sum(hd.tong_tien for hd in hoa_don_qua_han)
-        
-        # Thống kê theo thời gian nợ
-        no_duoi_30_ngay = []
-        no_30_60_ngay = []
-        no_60_90_ngay = []
-        no_tren_90_ngay = []
-        
-        for hd in hoa_don_qua_han:
-            if hd.ngay_qua_han <= 30:
-                no_duoi_30_ngay.append(hd)
-            elif 30 < hd.ngay_qua_han <= 60:
-                no_30_60_ngay.append(hd)
-            elif 60 < hd.ngay_qua_han <= 90:
-                no_60_90_ngay.append(hd)
-            else:
-                no_tren_90_ngay.append(hd)
+        # Thống kê theo thời gian nợ và tổng tiền nợ trong một lần duyệt
+        theo_thoi_gian = self.aggregate(group_by=[_khoang_qua_han], metrics={
+            "so_hoa_don": (COUNT,),
+            "tong_tien": (SUM, 'tong_tien')
+        }, hoa_don_list=hoa_don_qua_han, keys=KHOANG_QUA_HAN_KEYS, rollup=True)
         
         # Thống kê khách hàng nợ nhiều nhất
-        khach_hang_no = {}
-        for hd in hoa_don_qua_han:
-            ma_khach_hang = hd.ma_khach_hang
-            if ma_khach_hang in khach_hang_no:
-                khach_hang_no[ma_khach_hang]["so_hoa_don"] += 1
-                khach_hang_no[ma_khach_hang]["tong_tien"] += hd.tong_tien
-            else:
-                khach_hang = self.get_khach_hang(ma_khach_hang)
-                khach_hang_no[ma_khach_hang] = {
-                    "ma_khach_hang": ma_khach_hang,
-                    "ten_khach_hang": khach_hang.ho_ten if khach_hang else "Không xác định",
-                    "so_hoa_don": 1,
-                    "tong_tien": hd.tong_tien
-                }
+        theo_khach_hang = self.aggregate(group_by=['ma_khach_hang'], metrics={
+            "so_hoa_don": (COUNT,),
+            "tong_tien": (SUM, 'tong_tien')
+        }, hoa_don_list=hoa_don_qua_han)
+        
+        khach_hang_no = [
+            self._them_ten_khach_hang({"ma_khach_hang": ma_khach_hang, **thong_ke})
+            for ma_khach_hang, thong_ke in theo_khach_hang.items()
+        ]
         
         # Sắp xếp theo tổng tiền giảm dần
         top_khach_hang_no = sorted(
-            list(khach_hang_no.values()),
+            khach_hang_no,
             key=lambda x: x["tong_tien"],
             reverse=True
         )[:10]  # Lấy top 10
         
         return {
             "tong_hoa_don_no": len(hoa_don_qua_han),
-            "tong_tien_no": tong_tien_no,
-            "theo_thoi_gian": {
-                "duoi_30_ngay": {
-                    "so_hoa_don": len(no_duoi_30_ngay),
-                    "tong_tien": sum(hd.tong_tien for hd in no_duoi_30_ngay)
-                },
-                "tu_30_60_ngay": {
-                    "so_hoa_don": len(no_30_60_ngay),
-                    "tong_tien": sum(hd.tong_tien for hd in no_30_60_ngay)
-                },
-                "tu_60_90_ngay": {
-                    "so_hoa_don": len(no_60_90_ngay),
-                    "tong_tien": sum(hd.tong_tien for hd in no_60_90_ngay)
-                },
-                "tren_90_ngay": {
-                    "so_hoa_don": len(no_tren_90_ngay),
-                    "tong_tien": sum(hd.tong_tien for hd in no_tren_90_ngay)
-                }
-            },
+            "tong_tien_no": theo_thoi_gian[()]["tong_tien"],
+            "theo_thoi_gian": {khoang: theo_thoi_gian[khoang] for khoang in KHOANG_QUA_HAN_KEYS},
             "top_khach_hang_no": top_khach_hang_no
         }
     
+    def thong_ke_top_khach_hang(self, so_luong=10, thang=None, nam=None):
+        """
+        Thống kê khách hàng tiêu thụ nhiều điện nhất
+        
+        Args:
+            so_luong (int): Số khách hàng cần lấy, None để lấy tất cả
+            thang (int, optional): Chỉ tính hóa đơn của tháng này (cùng với nam)
+            nam (int, optional): Chỉ tính hóa đơn của năm này
+            
+        Returns:
+            list: Thống kê từng khách hàng (mã, tên, tổng tiêu thụ, số hóa đơn, tổng tiền)
+                sắp xếp theo tổng tiêu thụ giảm dần
+        """
+        frame = self.get_analytics_frame()
+        if frame is not None:
+            top_khach_hang = frame.top_khach_hang(so_luong, thang, nam)
+        else:
+            if thang is not None and nam is not None:
+                hoa_don_list = self.get_hoa_don_theo_ky(thang, nam)
+            elif nam is not None:
+                hoa_don_list = self.get_hoa_don_theo_nam(nam)
+            else:
+                hoa_don_list = None
+            
+            theo_khach_hang = self.aggregate(group_by=['ma_khach_hang'], metrics={
+                "tong_tieu_thu": (SUM, 'tieu_thu'),
+                "so_hoa_don": (COUNT,),
+                "tong_tien": (SUM, lambda hd: hd.so_tien if hd.so_tien else 0)
+            }, hoa_don_list=hoa_don_list)
+            
+            top_khach_hang = sorted(
+                [{"ma_khach_hang": ma, **thong_ke} for ma, thong_ke in theo_khach_hang.items()],
+                key=lambda x: x["tong_tieu_thu"],
+                reverse=True
+            )[:so_luong]
+        
+        return [self._them_ten_khach_hang(thong_ke) for thong_ke in top_khach_hang]
+    
+    def mo_phong_bang_gia(self, cac_bang_gia, thang=None, nam=None, so_khach_hang=10):
+        """
+        Mô phỏng doanh thu khi áp dụng các bảng giá dự kiến cho lịch sử tiêu thụ
+        
+        Lượng tiêu thụ của mỗi hóa đơn được tính tiền theo từng bảng giá dự kiến và so với
+        số tiền tính theo bảng giá có hiệu lực trong kỳ của hóa đơn (số tiền của bảng giá,
+        chưa làm tròn như hóa đơn). Ở chế độ phân tích, toàn bộ lượng tiêu thụ được tính
+        bằng BangGia.tinh_tien_batch và gom nhóm bằng pandas.
+        
+        Args:
+            cac_bang_gia (list): Các bảng giá dự kiến (BangGia)
+            thang (int, optional): Chỉ mô phỏng hóa đơn của tháng này (cùng với nam)
+            nam (int, optional): Chỉ mô phỏng hóa đơn của năm này, bỏ trống để mô phỏng
+                toàn bộ lịch sử
+            so_khach_hang (int): Số khách hàng tăng tiền, giảm tiền nhiều nhất cần lấy
+            
+        Returns:
+            dict: Tổng số hóa đơn, tiêu thụ, tiền hiện tại và kết quả của từng bảng giá dự
+                kiến (phuong_an): tổng tiền, chênh lệch, chênh lệch theo kỳ, theo bậc của bảng
+                giá dự kiến và các khách hàng tăng tiền, giảm tiền nhiều nhất
+        """
+        cac_bang_gia = list(cac_bang_gia)
+        cac_phuong_an = [(bang_gia, _can_bac_gia(bang_gia)) for bang_gia in cac_bang_gia]
+        
+        # Bảng giá của từng kỳ, chỉ tra cứu một lần cho mỗi kỳ
+        bang_gia_theo_ky = {}
+        
+        def bang_gia_cua_ky(thang_hd, nam_hd):
+            ky = (nam_hd, thang_hd)
+            if ky not in bang_gia_theo_ky:
+                bang_gia_theo_ky[ky] = self.get_bang_gia_theo_ky(thang_hd, nam_hd)
+            return bang_gia_theo_ky[ky]
+        
+        frame = self.get_analytics_frame()
+        if frame is not None:
+            ket_qua = frame.mo_phong_bang_gia(cac_phuong_an, thang, nam, bang_gia_cua_ky, so_khach_hang)
+        else:
+            if thang is not None and nam is not None:
+                hoa_don_list = self.get_hoa_don_theo_ky(thang, nam)
+            elif nam is not None:
+                hoa_don_list = self.get_hoa_don_theo_nam(nam)
+            else:
+                hoa_don_list = self.get_all_hoa_don()
+            
+            tieu_thu = [hd.tieu_thu for hd in hoa_don_list]
+            tien_hien_tai = [bang_gia_cua_ky(hd.thang, hd.nam).tinh_tien(kwh)
+                             for hd, kwh in zip(hoa_don_list, tieu_thu)]
+            
+            ket_qua = []
+            for bang_gia, can_bac in cac_phuong_an:
+                tien_moi = bang_gia.tinh_tien_batch(tieu_thu)
+                if not isinstance(tien_moi, list):
+                    tien_moi = tien_moi.tolist()
+                
+                # Mỗi dòng: (hóa đơn, tiêu thụ, tiền hiện tại, tiền mới)
+                rows = list(zip(hoa_don_list, tieu_thu, tien_hien_tai, tien_moi))
+                tong = {
+                    "so_hoa_don": (COUNT,),
+                    "tieu_thu": (SUM, operator.itemgetter(1)),
+                    "hien_tai": (SUM, operator.itemgetter(2)),
+                    "moi": (SUM, operator.itemgetter(3))
+                }
+                cot = ("so_hoa_don", "tieu_thu", "hien_tai", "moi")
+                
+                theo_ky = aggregate(rows, group_by=[lambda row: (row[0].nam, row[0].thang)], metrics=tong)
+                theo_bac = aggregate(rows, group_by=[
+                    lambda row: bisect.bisect_left(can_bac, row[1]) + 1
+                ], metrics=tong)
+                theo_khach_hang = aggregate(rows, group_by=[lambda row: row[0].ma_khach_hang], metrics={
+                    "hien_tai": (SUM, operator.itemgetter(2)),
+                    "moi": (SUM, operator.itemgetter(3))
+                })
+                
+                # Theo chênh lệch đã làm tròn, bằng nhau thì theo mã khách hàng
+                khach_hang = [(ma, gia_tri["hien_tai"], gia_tri["moi"], round(gia_tri["moi"] - gia_tri["hien_tai"], 2))
+                              for ma, gia_tri in theo_khach_hang.items()]
+                tang_tien = sorted((kh for kh in khach_hang if kh[3] > 0), key=lambda kh: (-kh[3], str(kh[0])))
+                giam_tien = sorted((kh for kh in khach_hang if kh[3] < 0), key=lambda kh: (kh[3], str(kh[0])))
+                
+                ket_qua.append((
+                    {ky: tuple(gia_tri[c] for c in cot) for ky, gia_tri in theo_ky.items()},
+                    {bac: tuple(gia_tri[c] for c in cot) for bac, gia_tri in theo_bac.items()},
+                    [kh[:3] for kh in tang_tien[:so_khach_hang]],
+                    [kh[:3] for kh in giam_tien[:so_khach_hang]]
+                ))
+        
+        phuong_an = []
+        tong_quan = (0, 0, 0)
+        for (bang_gia, can_bac), (theo_ky, theo_bac, tang_tien, giam_tien) in zip(cac_phuong_an, ket_qua):
+            tong_quan = tuple(sum(gia_tri[i] for gia_tri in theo_ky.values()) for i in range(3))
+            tong_tien_moi = sum(gia_tri[3] for gia_tri in theo_ky.values())
+            chenh_lech = tong_tien_moi - tong_quan[2]
+            
+            thong_ke_ky = [
+                {
+                    "nam": nam_hd,
+                    "thang": thang_hd,
+                    "so_hoa_don": so_hoa_don,
+                    "tien_hien_tai": round(hien_tai, 2),
+                    "tien_moi": round(moi, 2),
+                    "chenh_lech": round(moi - hien_tai, 2)
+                }
+                for (nam_hd, thang_hd), (so_hoa_don, _, hien_tai, moi) in sorted(theo_ky.items())
+            ]
+            
+            thong_ke_bac = {}
+            for bac in range(1, len(can_bac) + 2):
+                so_hoa_don, tieu_thu_bac, hien_tai, moi = theo_bac.get(bac, (0, 0, 0, 0))
+                thong_ke_bac[bac] = {
+                    "so_hoa_don": so_hoa_don,
+                    "tieu_thu": tieu_thu_bac,
+                    "tien_hien_tai": round(hien_tai, 2),
+                    "tien_moi": round(moi, 2),
+                    "chenh_lech": round(moi - hien_tai, 2)
+                }
+            
+            def thong_ke_khach_hang(ma, hien_tai, moi):
+                return self._them_ten_khach_hang({
+                    "ma_khach_hang": ma,
+                    "tien_hien_tai": round(hien_tai, 2),
+                    "tien_moi": round(moi, 2),
+                    "chenh_lech": round(moi - hien_tai, 2)
+                })
+            
+            phuong_an.append({
+                "ma_bang_gia": bang_gia.ma_bang_gia,
+                "tong_tien_moi": round(tong_tien_moi, 2),
+                "chenh_lech": round(chenh_lech, 2),
+                "ty_le_chenh_lech": round(chenh_lech / tong_quan[2] * 100, 2) if tong_quan[2] else 0,
+                "theo_ky": thong_ke_ky,
+                "theo_bac": thong_ke_bac,
+                "khach_hang_tang_tien": [thong_ke_khach_hang(*kh) for kh in tang_tien],
+                "khach_hang_giam_tien": [thong_ke_khach_hang(*kh) for kh in giam_tien]
+            })
+        
+        return {
+            "thang": thang,
+            "nam": nam,
+            "so_hoa_don": tong_quan[0],
+            "tong_tieu_thu": tong_quan[1],
+            "tong_tien_hien_tai": round(tong_quan[2], 2),
+            "phuong_an": phuong_an
+        }
+    
+    def _them_ten_khach_hang(self, thong_ke):
+        """
+        Thêm tên khách hàng vào sau mã khách hàng trong một dòng thống kê
+        
+        Args:
+            thong_ke (dict): Dòng thống kê có khóa ma_khach_hang
+            
+        Returns:
+            dict: Dòng thống kê có thêm ten_khach_hang
+        """
+        khach_hang = self.get_khach_hang(thong_ke["ma_khach_hang"])
+        ket_qua = {
+            "ma_khach_hang": thong_ke["ma_khach_hang"],
+            "ten_khach_hang": khach_hang.ho_ten if khach_hang else "Không xác định"
+        }
+        ket_qua.update(thong_ke)
+        return ket_qua
+    
     def xuat_bao_cao_json(self, bao_cao_data, file_path):
         """
         Xuất báo cáo ra file JSON
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import threading
+from utils.checkpoint import Checkpoint
+
+# Bộ cấp mã dùng chung cho toàn tiến trình, khóa theo đường dẫn tuyệt đối của file
+_ALLOCATORS = {}
+_REGISTRY_LOCK = threading.Lock()
+
+
+class IdAllocator:
+    """
+    Cấp mã tăng dần, không trùng lặp cho từng tiền tố (KH, HD, BG)
+    
+    Mã có dạng tiền tố + số thứ tự (ít nhất 10 chữ số, ví dụ HD0000000001). Ở lần cấp
+    đầu tiên của mỗi tiền tố trong tiến trình, số thứ tự được nối tiếp số lớn nhất trong
+    các mã đang có (hàm seed), nên mã mới luôn đứng sau các mã cũ, kể cả mã cũ tạo theo
+    thời gian (HD20250101120000 -> HD20250101120001). Mỗi lần cấp, dù một mã hay cả khối
+    cho ghi hàng loạt, chỉ ghi file một lần với số thứ tự lớn nhất đã cấp, nên không có
+    số thứ tự nào bị bỏ phí và ghi hàng loạt không ghi file theo từng mã. Bộ cấp mã chỉ
+    an toàn trong một tiến trình (dùng get_id_allocator).
+    """
+    
+    def __init__(self, path):
+        """
+        Khởi tạo bộ cấp mã
+        
+        Args:
+            path (str): File lưu số thứ tự lớn nhất đã cấp của từng tiền tố
+        """
+        self.checkpoint = Checkpoint(path)
+        self.lock = threading.Lock()
+        # Tiền tố -> số thứ tự lớn nhất đã cấp, None khi chưa đọc file
+        self._state = None
+        # Các tiền tố đã được nối tiếp mã hiện có trong tiến trình này
+        self._seeded = set()
+    
+    @staticmethod
+    def format(prefix, so_thu_tu):
+        """Tạo mã từ tiền tố và số thứ tự"""
+        return f"{prefix}{so_thu_tu:010d}"
+    
+    def allocate(self, prefix, count=1, seed=None):
+        """
+        Cấp count mã liên tiếp
+        
+        Args:
+            prefix (str): Tiền tố của mã
+            count (int): Số mã cần cấp
+            seed (callable, optional): Hàm nhận tiền tố, trả về số thứ tự lớn nhất trong
+                các mã đang có; chỉ được gọi ở lần cấp đầu tiên của tiền tố
+        
+        Returns:
+            list: Các mã mới theo thứ tự tăng dần
+        """
+        with self.lock:
+            if self._state is None:
+                self._state = self.checkpoint.load() or {}
+            so_cuoi = self._state.get(prefix, 0)
+            if seed is not None and prefix not in self._seeded:
+                so_cuoi = max(so_cuoi, seed(prefix))
+                self._seeded.add(prefix)
+            
+            so_thu_tu = so_cuoi + 1
+            self._state[prefix] = so_cuoi + count
+            self.checkpoint.save(self._state)
+        return [self.format(prefix, i) for i in range(so_thu_tu, so_thu_tu + count)]
+    
+    def next_id(self, prefix, seed=None):
+        """
+        Cấp một mã mới
+        
+        Args:
+            prefix (str): Tiền tố của mã
+            seed (callable, optional): Như trong allocate
+        
+        Returns:
+            str: Mã mới
+        """
+        return self.allocate(prefix, seed=seed)[0]
+
+
+def get_id_allocator(path):
+    """
+    Lấy bộ cấp mã dùng chung cho một file
+    
+    Args:
+        path (str): File lưu số thứ tự lớn nhất đã cấp
+    
+    Returns:
+        IdAllocator: Bộ cấp mã của file
+    """
+    key = os.path.abspath(path)
+    with _REGISTRY_LOCK:
+        allocator = _ALLOCATORS.get(key)
+        if allocator is None:
+            allocator = IdAllocator(path)
+            _ALLOCATORS[key] = allocator
+        return allocator
@@ -0,0 +1,252 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import csv
+import json
+from models.hoa_don import HoaDon
+from utils.reading_index import missing_months
+
+# Lý do loại bỏ một dòng chỉ số công tơ
+LOI_DINH_DANG = 'dinh_dang_khong_hop_le'
+LOI_DU_LIEU = 'du_lieu_khong_hop_le'
+LOI_CONG_TO = 'cong_to_khong_ton_tai'
+LOI_TIEU_THU_AM = 'tieu_thu_am'
+LOI_TRUNG_KY = 'trung_ky'
+
+
+class RejectLog:
+    """
+    Ghi các dòng bị loại bỏ ra file NDJSON đi kèm và đếm theo lý do
+    
+    Mỗi dòng của file gồm số dòng trong file nguồn, lý do và dữ liệu gốc.
+    """
+    
+    def __init__(self, path=None):
+        """
+        Khởi tạo nhật ký loại bỏ
+        
+        Args:
+            path (str, optional): File ghi các dòng bị loại bỏ, None để chỉ đếm
+        """
+        self.path = path
+        self.counts = {}
+        self._file = open(path, 'w', encoding='utf-8') if path else None
+    
+    def add(self, so_dong, ly_do, du_lieu):
+        """
+        Ghi lại một dòng bị loại bỏ
+        
+        Args:
+            so_dong (int): Số dòng trong file nguồn
+            ly_do (str): Lý do loại bỏ
+            du_lieu: Dữ liệu gốc của dòng
+        """
+        self.counts[ly_do] = self.counts.get(ly_do, 0) + 1
+        if self._file is not None:
+            self._file.write(json.dumps({"dong": so_dong, "ly_do": ly_do, "du_lieu": du_lieu},
+                                        ensure_ascii=False) + '\n')
+    
+    @property
+    def total(self):
+        """Tổng số dòng bị loại bỏ"""
+        return sum(self.counts.values())
+    
+    def close(self):
+        """Đóng file ghi các dòng bị loại bỏ"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def read_records(path, rejects, file_format=None):
+    """
+    Đọc lần lượt các dòng của file chỉ số công tơ CSV (có dòng tiêu đề) hoặc NDJSON
+    
+    Args:
+        path (str): Đường dẫn file
+        rejects (RejectLog): Nơi ghi các dòng không đọc được
+        file_format (str, optional): 'csv' hoặc 'ndjson', mặc định theo phần mở rộng
+    
+    Yields:
+        tuple: (số dòng, dictionary dữ liệu gốc)
+    """
+    if file_format is None:
+        file_format = 'csv' if os.path.splitext(path)[1].lower() == '.csv' else 'ndjson'
+    
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        if file_format == 'csv':
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row
+            return
+        
+        for so_dong, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                rejects.add(so_dong, LOI_DINH_DANG, line.rstrip('\n'))
+                continue
+            if not isinstance(row, dict):
+                rejects.add(so_dong, LOI_DINH_DANG, row)
+                continue
+            yield so_dong, row
+
+
+def _so_nguyen(value):
+    """Chuyển chỉ số (số hoặc chuỗi) thành số nguyên, None nếu để trống"""
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return None
+    if isinstance(value, str):
+        value = float(value.strip()) if '.' in value else int(value.strip())
+    if isinstance(value, bool) or int(value) != value:
+        raise ValueError(f"Không phải số nguyên: {value}")
+    return int(value)
+
+
+def normalize_records(records, rejects):
+    """
+    Chuẩn hóa các dòng dữ liệu gốc thành chỉ số công tơ
+    
+    Mỗi dòng cần ma_cong_to, chi_so_cuoi và kỳ (thang, nam hoặc ky dạng MM/YYYY);
+    chi_so_dau không bắt buộc.
+    
+    Args:
+        records (iterable): Các cặp (số dòng, dữ liệu gốc)
+        rejects (RejectLog): Nơi ghi các dòng không hợp lệ
+    
+    Yields:
+        tuple: (số dòng, dữ liệu gốc, dictionary gồm ma_cong_to, thang, nam, chi_so_dau,
+            chi_so_cuoi)
+    """
+    for so_dong, row in records:
+        try:
+            if row.get('ky'):
+                thang, nam = [int(x) for x in str(row['ky']).split('/')]
+            else:
+                thang, nam = _so_nguyen(row.get('thang')), _so_nguyen(row.get('nam'))
+            chi_so = {
+                "ma_cong_to": str(row.get('ma_cong_to') or '').strip(),
+                "thang": thang,
+                "nam": nam,
+                "chi_so_dau": _so_nguyen(row.get('chi_so_dau')),
+                "chi_so_cuoi": _so_nguyen(row.get('chi_so_cuoi'))
+            }
+        except (TypeError, ValueError):
+            rejects.add(so_dong, LOI_DU_LIEU, row)
+            continue
+        
+        if (not chi_so["ma_cong_to"] or chi_so["chi_so_cuoi"] is None or nam is None
+                or not 1 <= (thang or 0) <= 12 or chi_so["chi_so_cuoi"] < 0
+                or (chi_so["chi_so_dau"] or 0) < 0):
+            rejects.add(so_dong, LOI_DU_LIEU, row)
+            continue
+        yield so_dong, row, chi_so
+
+
+def validate_readings(readings, khach_hang_theo_cong_to, da_co_hoa_don, chi_so_truoc, rejects,
+                      thieu_ky=None):
+    """
+    Kiểm tra các chỉ số công tơ và xác định khách hàng, chỉ số đầu kỳ
+    
+    Dòng bị loại khi mã công tơ không thuộc khách hàng nào, chỉ số cuối nhỏ hơn chỉ số
+    đầu (tiêu thụ âm) hoặc khách hàng đã có hóa đơn trong kỳ (trong dữ liệu hoặc ở một
+    dòng trước đó của file). Chỉ số đầu kỳ để trống được lấy từ chỉ số cuối gần nhất
+    trước kỳ, lấy kỳ muộn hơn giữa dữ liệu và các dòng trước đó của file.
+    
+    Args:
+        readings (iterable): Kết quả của normalize_records
+        khach_hang_theo_cong_to (dict): Mã công tơ -> mã khách hàng
+        da_co_hoa_don (callable): Hàm (thang, nam) trả về tập mã khách hàng đã có hóa đơn
+            trong kỳ; tập này được bổ sung các khách hàng được chấp nhận
+        chi_so_truoc (callable): Hàm (thang, nam) trả về dictionary mã khách hàng -> (năm,
+            tháng, chỉ số cuối) của hóa đơn gần nhất trước kỳ
+        rejects (RejectLog): Nơi ghi các dòng không hợp lệ
+        thieu_ky (callable, optional): Hàm (mã khách hàng, thang, nam, số tháng thiếu) được
+            gọi cho dòng được chấp nhận khi kỳ trước không phải tháng liền trước
+    
+    Yields:
+        HoaDon: Hóa đơn chưa tính tiền (ma_hoa_don để trống)
+    """
+    # Chỉ số cuối của dòng được chấp nhận gần nhất theo từng khách hàng: (năm, tháng, chỉ số)
+    cuoi_ky_trong_file = {}
+    for so_dong, row, chi_so in readings:
+        ma_khach_hang = khach_hang_theo_cong_to.get(chi_so["ma_cong_to"])
+        if ma_khach_hang is None:
+            rejects.add(so_dong, LOI_CONG_TO, row)
+            continue
+        
+        thang, nam = chi_so["thang"], chi_so["nam"]
+        da_co = da_co_hoa_don(thang, nam)
+        if ma_khach_hang in da_co:
+            rejects.add(so_dong, LOI_TRUNG_KY, row)
+            continue
+        
+        truoc = chi_so_truoc(thang, nam).get(ma_khach_hang)
+        trong_file = cuoi_ky_trong_file.get(ma_khach_hang)
+        if trong_file is not None and trong_file[:2] < (nam, thang) and (
+                truoc is None or trong_file[:2] >= truoc[:2]):
+            truoc = trong_file
+        
+        chi_so_dau = chi_so["chi_so_dau"]
+        if chi_so_dau is None:
+            chi_so_dau = truoc[2] if truoc else 0
+        
+        if chi_so["chi_so_cuoi"] < chi_so_dau:
+            rejects.add(so_dong, LOI_TIEU_THU_AM, row)
+            continue
+        
+        da_co.add(ma_khach_hang)
+        so_thang_thieu = missing_months(truoc, thang, nam)
+        if so_thang_thieu and thieu_ky is not None:
+            thieu_ky(ma_khach_hang, thang, nam, so_thang_thieu)
+        if trong_file is None or trong_file[:2] <= (nam, thang):
+            cuoi_ky_trong_file[ma_khach_hang] = (nam, thang, chi_so["chi_so_cuoi"])
+        yield HoaDon(None, ma_khach_hang, thang, nam, chi_so_dau, chi_so["chi_so_cuoi"])
+
+
+def price_batches(hoa_don_list, bang_gia_trong_ky, batch_size):
+    """
+    Gom hóa đơn thành từng lô và tính tiền theo bảng giá của kỳ
+    
+    Hóa đơn trong một lô được gom theo kỳ để tính bằng HoaDon.tinh_tien_hang_loat; kỳ có
+    nhiều bảng giá được tính chia theo ngày.
+    
+    Args:
+        hoa_don_list (iterable): Các hóa đơn chưa tính tiền
+        bang_gia_trong_ky (callable): Hàm (thang, nam) trả về các cặp (bảng giá, số ngày
+            áp dụng) của kỳ
+        batch_size (int): Số hóa đơn mỗi lô
+    
+    Yields:
+        list: Các hóa đơn đã tính tiền của một lô
+    """
+    def tinh_tien(lo):
+        theo_ky = {}
+        for hd in lo:
+            theo_ky.setdefault((hd.thang, hd.nam), []).append(hd)
+        for (thang, nam), cung_ky in theo_ky.items():
+            cac_bang_gia = bang_gia_trong_ky(thang, nam)
+            if len(cac_bang_gia) > 1:
+                for hd in cung_ky:
+                    hd.tinh_tien_chia_theo_ngay(cac_bang_gia)
+            else:
+                HoaDon.tinh_tien_hang_loat(cung_ky, cac_bang_gia[0][0])
+        return lo
+    
+    lo = []
+    for hd in hoa_don_list:
+        lo.append(hd)
+        if len(lo) >= batch_size:
+            yield tinh_tien(lo)
+            lo = []
+    if lo:
+        yield tinh_tien(lo)
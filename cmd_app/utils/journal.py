@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import shutil
+import threading
+from utils.cache import TableCache
+
+# Ngưỡng mặc định để gộp nhật ký vào file dữ liệu chính
+JOURNAL_MAX_RECORDS = 1000
+JOURNAL_MAX_BYTES = 4 * 1024 * 1024
+
+
+class JournaledTableCache(TableCache):
+    """
+    Bộ nhớ đệm của một file dữ liệu JSON có kèm nhật ký ghi trước (write-ahead journal)
+    
+    Mỗi thay đổi được ghi thêm thành một dòng NDJSON vào file .journal thay vì ghi lại
+    toàn bộ file JSON. Khi đọc, nhật ký đang gộp (.journal.compacting) rồi nhật ký hiện
+    tại (.journal) được áp dụng lần lượt lên file JSON (bản chụp). Các bản ghi nhật ký
+    đều là thao tác đặt/xóa theo khóa chính nên có thể áp dụng lại nhiều lần mà không
+    làm sai dữ liệu. Dòng cuối bị ghi dở (do tiến trình dừng đột ngột) được bỏ qua; dòng
+    hỏng ở giữa file làm việc đọc báo lỗi thay vì bỏ các thay đổi phía sau.
+    
+    Khi nhật ký vượt quá ngưỡng số bản ghi hoặc kích thước, một luồng nền sẽ gộp nhật ký
+    vào bản chụp mới (ghi file tạm rồi đổi tên) và xóa nhật ký đã gộp.
+    """
+    
+    def __init__(self, path, model, key_attr):
+        """
+        Khởi tạo bộ nhớ đệm có nhật ký
+        
+        Args:
+            path (str): Đường dẫn file JSON
+            model (type): Lớp mô hình có phương thức from_dict
+            key_attr (str): Tên thuộc tính khóa chính
+        """
+        super().__init__(path, model, key_attr)
+        self.journal_path = os.path.splitext(path)[0] + '.journal'
+        self.compacting_path = self.journal_path + '.compacting'
+        self.max_records = JOURNAL_MAX_RECORDS
+        self.max_bytes = JOURNAL_MAX_BYTES
+        # Số bản ghi nhật ký chưa được gộp vào bản chụp
+        self.journal_records = 0
+        # Tăng mỗi khi bản chụp được ghi lại toàn bộ, dùng để hủy lần gộp đang chạy
+        self.epoch = 0
+        # Chỉ cho phép một lần gộp chạy tại một thời điểm
+        self._compact_lock = threading.Lock()
+        self._compactor = None
+    
+    def _signature(self):
+        """
+        Lấy chữ ký hiện tại của bản chụp và các file nhật ký
+        
+        Returns:
+            tuple: Chữ ký của từng file
+        """
+        return (self._file_signature(self.path),
+                self._file_signature(self.compacting_path),
+                self._file_signature(self.journal_path))
+    
+    def _replay(self, path, records):
+        """
+        Áp dụng một file nhật ký lên dữ liệu
+        
+        Dòng cuối chưa có ký tự xuống dòng (ghi dở) bị bỏ qua và cắt khỏi file để các
+        bản ghi được ghi thêm sau đó không bị dính vào dòng hỏng. Một dòng đã ghi xong mà
+        không đọc được là bản ghi đã cam kết bị hỏng: khi đó không cắt file mà báo lỗi, để
+        các bản ghi phía sau không bị mất.
+        
+        Args:
+            path (str): Đường dẫn file nhật ký
+            records (dict): Các đối tượng theo khóa chính, được cập nhật trực tiếp
+        
+        Returns:
+            int: Số bản ghi đã áp dụng
+        
+        Raises:
+            ValueError: Nếu một dòng đã ghi xong không đọc hoặc áp dụng được
+        """
+        if not os.path.exists(path):
+            return 0
+        
+        count = 0
+        offset = 0
+        with open(path, 'rb') as f:
+            for so_dong, line in enumerate(f, 1):
+                if not line.endswith(b'\n'):
+                    # Chỉ dòng cuối có thể thiếu ký tự xuống dòng: dòng ghi dở
+                    break
+                try:
+                    entry = json.loads(line)
+                    if entry["op"] == "put":
+                        obj = self.model.from_dict(entry["data"])
+                        records[getattr(obj, self.key_attr)] = obj
+                    elif entry["op"] == "delete":
+                        records.pop(entry["key"], None)
+                except (ValueError, KeyError, TypeError) as e:
+                    raise ValueError(f"Nhật ký {path} bị hỏng ở dòng {so_dong}: {e}") from e
+                offset += len(line)
+                count += 1
+        
+        if offset < os.path.getsize(path):
+            # Cắt dòng ghi dở ở cuối file
+            with open(path, 'r+b') as f:
+                f.truncate(offset)
+        return count
+    
+    def _read(self):
+        """
+        Đọc bản chụp và áp dụng các file nhật ký
+        
+        Returns:
+            dict: Các đối tượng theo khóa chính
+        """
+        records = super()._read()
+        count = self._replay(self.compacting_path, records)
+        count += self._replay(self.journal_path, records)
+        self.journal_records = count
+        return records
+    
+    def append(self, puts=(), deletes=()):
+        """
+        Ghi thêm các thay đổi vào nhật ký rồi cập nhật bộ nhớ đệm
+        
+        Args:
+            puts (iterable): Các đối tượng cần thêm hoặc thay thế
+            deletes (iterable): Các khóa chính cần xóa
+        """
+        puts = list(puts)
+        deletes = list(deletes)
+        lines = [json.dumps({"op": "delete", "key": key}, ensure_ascii=False) for key in deletes]
+        lines += [json.dumps({"op": "put", "data": obj.to_dict()}, ensure_ascii=False) for obj in puts]
+        if not lines:
+            return
+        
+        with self.lock:
+            self.load()
+            with open(self.journal_path, 'a', encoding='utf-8') as f:
+                f.write('\n'.join(lines) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            
+            self.apply(puts, deletes)
+            self.journal_records += len(lines)
+            self.mark_written()
+            
+            if self.needs_compaction():
+                self.compact_async()
+    
+    def needs_compaction(self):
+        """
+        Kiểm tra nhật ký đã vượt quá ngưỡng gộp chưa
+        
+        Returns:
+            bool: True nếu cần gộp nhật ký
+        """
+        journal_signature = self.signature[2] if self.signature else None
+        journal_size = journal_signature[2] if journal_signature else 0
+        return self.journal_records >= self.max_records or journal_size >= self.max_bytes
+    
+    def save(self, objects):
+        """
+        Ghi toàn bộ dữ liệu xuống file một cách nguyên tử
+        
+        Bản chụp mới đã chứa mọi thay đổi nên các file nhật ký được xóa.
+        
+        Args:
+            objects (iterable): Các đối tượng mô hình cần lưu
+        """
+        with self.lock:
+            super().save(objects)
+            for path in (self.compacting_path, self.journal_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            self.journal_records = 0
+            self.epoch += 1
+    
+    def compact(self):
+        """
+        Gộp nhật ký vào bản chụp mới
+        
+        Nhật ký hiện tại được đổi tên thành .journal.compacting để các thao tác ghi
+        tiếp tục ghi vào nhật ký mới. Bản chụp được ghi ra file tạm bên ngoài khóa rồi
+        đổi tên, sau đó nhật ký đã gộp mới bị xóa.
+        """
+        with self._compact_lock:
+            self._compact()
+    
+    def _compact(self):
+        """Thực hiện gộp nhật ký, phải được gọi khi đang giữ _compact_lock"""
+        with self.lock:
+            self.load()
+            if os.path.exists(self.journal_path):
+                if os.path.exists(self.compacting_path):
+                    # Lần gộp trước bị gián đoạn: nối nhật ký hiện tại vào sau
+                    with open(self.journal_path, 'rb') as src, open(self.compacting_path, 'ab') as dst:
+                        shutil.copyfileobj(src, dst)
+                        dst.flush()
+                        os.fsync(dst.fileno())
+                    os.remove(self.journal_path)
+                else:
+                    os.replace(self.journal_path, self.compacting_path)
+            elif not os.path.exists(self.compacting_path):
+                return
+            
+            objects = list(self.records.values())
+            epoch = self.epoch
+            self.journal_records = 0
+            self.mark_written()
+        
+        tmp_path = self.path + '.compact.tmp'
+        self._dump(objects, tmp_path)
+        
+        with self.lock:
+            if self.epoch != epoch:
+                # Bản chụp đã được ghi lại toàn bộ trong lúc gộp
+                os.remove(tmp_path)
+                return
+            os.replace(tmp_path, self.path)
+            os.remove(self.compacting_path)
+            self.mark_written()
+    
+    def _compact_safely(self):
+        """Gộp nhật ký trong luồng nền, chỉ in lỗi nếu thất bại"""
+        try:
+            self.compact()
+        except Exception as e:
+            print(f"Lỗi khi gộp nhật ký {self.journal_path}: {e}")
+    
+    def compact_async(self):
+        """Gộp nhật ký trong một luồng nền nếu chưa có lần gộp nào đang chạy"""
+        with self.lock:
+            if self._compactor is not None and self._compactor.is_alive():
+                return
+            self._compactor = threading.Thread(target=self._compact_safely, daemon=True)
+            self._compactor.start()
@@ -0,0 +1,635 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import sqlite3
+import datetime
+import contextlib
+from models.khach_hang import KhachHang
+from models.hoa_don import HoaDon
+from models.bang_gia import BangGia
+from utils.db_handler import DatabaseHandler
+from utils.journal import JournaledTableCache
+from utils.analytics import AnalyticsFrame, HAS_PANDAS
+from utils.id_allocator import get_id_allocator
+
+# Tên file cơ sở dữ liệu SQLite mặc định trong thư mục dữ liệu
+DB_FILE = "vtn_vip.db"
+
+# Biến môi trường chọn cách lưu trữ của ứng dụng: "sqlite" (mặc định) hoặc "json"
+BACKEND_ENV = "VTN_DB_BACKEND"
+
+# Lược đồ cơ sở dữ liệu SQLite
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS khach_hang (
+    ma_khach_hang TEXT PRIMARY KEY,
+    ho_ten TEXT,
+    dia_chi TEXT,
+    so_dien_thoai TEXT,
+    ma_cong_to TEXT
+);
+
+CREATE TABLE IF NOT EXISTS hoa_don (
+    ma_hoa_don TEXT PRIMARY KEY,
+    ma_khach_hang TEXT NOT NULL,
+    thang INTEGER,
+    nam INTEGER,
+    chi_so_dau INTEGER,
+    chi_so_cuoi INTEGER,
+    da_thanh_toan INTEGER NOT NULL DEFAULT 0,
+    ngay_thanh_toan TEXT,
+    -- Không khai báo kiểu để giữ nguyên số nguyên/số thực như trong JSON
+    so_tien
+);
+
+CREATE INDEX IF NOT EXISTS idx_hoa_don_ky ON hoa_don (nam, thang);
+CREATE INDEX IF NOT EXISTS idx_hoa_don_thanh_toan ON hoa_don (da_thanh_toan);
+
+CREATE TABLE IF NOT EXISTS bang_gia (
+    ma_bang_gia TEXT PRIMARY KEY,
+    ngay_ap_dung TEXT,
+    bac_thang TEXT NOT NULL,
+    vat REAL,
+    trang_thai INTEGER NOT NULL DEFAULT 0
+);
+'''
+
+# Mỗi khách hàng chỉ có một hóa đơn trong một kỳ
+UNIQUE_KY_INDEX = ("CREATE UNIQUE INDEX IF NOT EXISTS idx_hoa_don_khach_hang_ky "
+                   "ON hoa_don (ma_khach_hang, nam, thang)")
+
+HOA_DON_COLUMNS = ("ma_hoa_don, ma_khach_hang, thang, nam, chi_so_dau, chi_so_cuoi, "
+                   "da_thanh_toan, ngay_thanh_toan, so_tien")
+
+
+class SQLiteDatabaseHandler(DatabaseHandler):
+    """
+    Lớp lưu trữ dữ liệu bằng SQLite, thay thế trực tiếp cho DatabaseHandler
+    
+    Giữ nguyên chữ ký của các phương thức công khai, nhưng mỗi thao tác thêm/sửa/xóa
+    chỉ ghi đúng một bản ghi thay vì ghi lại toàn bộ file JSON. Các truy vấn theo
+    khách hàng, theo kỳ và theo trạng thái thanh toán dùng chỉ mục phụ.
+    """
+    
+    def __init__(self, data_dir="../data", db_file=DB_FILE, analytics=False):
+        """
+        Khởi tạo SQLiteDatabaseHandler
+        
+        Args:
+            data_dir (str): Thư mục lưu trữ dữ liệu
+            db_file (str): Tên file cơ sở dữ liệu SQLite trong thư mục dữ liệu
+            analytics (bool): Tính các thống kê bằng pandas/numpy (nếu đã cài đặt)
+        """
+        self.data_dir = data_dir
+        self.analytics = analytics
+        self._analytics_frame = None
+        self._tariff_index = None
+        self.db_path = os.path.join(data_dir, db_file)
+        
+        # Đảm bảo thư mục dữ liệu tồn tại
+        self._ensure_data_dir()
+        
+        self.conn = sqlite3.connect(self.db_path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self._tao_chi_muc_ky()
+        # True khi đang trong một giao dịch mở bằng transaction()
+        self._in_transaction = False
+        
+        # Khởi tạo bảng giá mặc định nếu chưa có
+        self._init_bang_gia()
+        
+        # Bộ cấp mã KH/HD/BG, số thứ tự đã cấp được lưu trong ma_so.json
+        self._id_allocator = get_id_allocator(os.path.join(data_dir, "ma_so.json"))
+    
+    def _tao_chi_muc_ky(self):
+        """Tạo chỉ mục duy nhất (mã khách hàng, năm, tháng) cho bảng hóa đơn"""
+        try:
+            self.conn.execute(UNIQUE_KY_INDEX)
+        except sqlite3.IntegrityError:
+            # Dữ liệu cũ đã có hóa đơn trùng kỳ: dùng chỉ mục thường, việc kiểm tra trùng kỳ
+            # khi thêm/sửa vẫn được thực hiện bằng truy vấn (_hoa_don_trung_ky)
+            print("Cảnh báo: Có khách hàng nhiều hóa đơn trong một kỳ, chưa thể tạo chỉ mục duy nhất")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_hoa_don_khach_hang_ky_trung "
+                              "ON hoa_don (ma_khach_hang, nam, thang)")
+    
+    def _init_bang_gia(self):
+        """Thêm bảng giá mặc định nếu bảng bang_gia còn trống"""
+        if self.conn.execute("SELECT 1 FROM bang_gia LIMIT 1").fetchone() is None:
+            self.add_bang_gia(BangGia(
+                ma_bang_gia="BG001",
+                ngay_ap_dung=datetime.datetime.now()
+            ))
+    
+    def close(self):
+        """Đóng kết nối cơ sở dữ liệu"""
+        self.conn.close()
+    
+    @contextlib.contextmanager
+    def _atomic(self):
+        """Chạy các câu lệnh trong một giao dịch, trừ khi đã nằm trong transaction()"""
+        if self._in_transaction:
+            yield
+        else:
+            with self.conn:
+                yield
+    
+    @contextlib.contextmanager
+    def transaction(self):
+        """
+        Gom các thao tác thêm, sửa, xóa thành một giao dịch SQLite
+        
+        Yields:
+            SQLiteDatabaseHandler: Chính đối tượng này
+        """
+        if self._in_transaction:
+            yield self
+            return
+        
+        self._in_transaction = True
+        try:
+            with self.conn:
+                yield self
+        finally:
+            self._in_transaction = False
+    
+    # Chuyển đổi giữa dòng dữ liệu và đối tượng
+    @staticmethod
+    def _row_to_khach_hang(row):
+        """Tạo đối tượng KhachHang từ một dòng dữ liệu"""
+        return KhachHang.from_dict(dict(row))
+    
+    @staticmethod
+    def _row_to_hoa_don(row):
+        """Tạo đối tượng HoaDon từ một dòng dữ liệu"""
+        data = dict(row)
+        data['da_thanh_toan'] = bool(data['da_thanh_toan'])
+        return HoaDon.from_dict(data)
+    
+    @staticmethod
+    def _row_to_bang_gia(row):
+        """Tạo đối tượng BangGia từ một dòng dữ liệu"""
+        data = dict(row)
+        data['bac_thang'] = json.loads(data['bac_thang'])
+        data['trang_thai'] = bool(data['trang_thai'])
+        return BangGia.from_dict(data)
+    
+    @staticmethod
+    def _hoa_don_params(hoa_don):
+        """Chuyển hóa đơn thành bộ tham số theo thứ tự HOA_DON_COLUMNS"""
+        data = hoa_don.to_dict()
+        return (data['ma_hoa_don'], data['ma_khach_hang'], data['thang'], data['nam'],
+                data['chi_so_dau'], data['chi_so_cuoi'], int(bool(data['da_thanh_toan'])),
+                data['ngay_thanh_toan'], data['so_tien'])
+    
+    def _query_hoa_don(self, where="", params=()):
+        """
+        Truy vấn danh sách hóa đơn theo điều kiện, giữ nguyên thứ tự thêm vào
+        
+        Args:
+            where (str): Mệnh đề WHERE (không bao gồm từ khóa WHERE)
+            params (tuple): Tham số của truy vấn
+        
+        Returns:
+            list: Danh sách các đối tượng HoaDon
+        """
+        sql = f"SELECT {HOA_DON_COLUMNS} FROM hoa_don"
+        if where:
+            sql += f" WHERE {where}"
+        sql += " ORDER BY rowid"
+        try:
+            return [self._row_to_hoa_don(row) for row in self.conn.execute(sql, params)]
+        except sqlite3.Error as e:
+            print(f"Lỗi khi đọc dữ liệu hóa đơn: {e}")
+            return []
+    
+    # Các phương thức quản lý khách hàng
+    def get_all_khach_hang(self):
+        """Lấy tất cả khách hàng"""
+        try:
+            rows = self.conn.execute("SELECT * FROM khach_hang ORDER BY rowid")
+            return [self._row_to_khach_hang(row) for row in rows]
+        except sqlite3.Error as e:
+            print(f"Lỗi khi đọc dữ liệu khách hàng: {e}")
+            return []
+    
+    def get_khach_hang(self, ma_khach_hang):
+        """Lấy thông tin một khách hàng theo mã (dùng khóa chính)"""
+        row = self.conn.execute(
+            "SELECT * FROM khach_hang WHERE ma_khach_hang = ?", (ma_khach_hang,)
+        ).fetchone()
+        return self._row_to_khach_hang(row) if row else None
+    
+    def add_khach_hang(self, khach_hang):
+        """Thêm khách hàng mới, trả về False nếu mã đã tồn tại"""
+        try:
+            with self._atomic():
+                self.conn.execute(
+                    "INSERT INTO khach_hang (ma_khach_hang, ho_ten, dia_chi, so_dien_thoai, ma_cong_to) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (khach_hang.ma_khach_hang, khach_hang.ho_ten, khach_hang.dia_chi,
+                     khach_hang.so_dien_thoai, khach_hang.ma_cong_to)
+                )
+            return True
+        except sqlite3.IntegrityError:
+            # Mã khách hàng đã tồn tại
+            return False
+        except sqlite3.Error as e:
+            print(f"Lỗi khi thêm khách hàng: {e}")
+            return False
+    
+    def update_khach_hang(self, khach_hang):
+        """Cập nhật thông tin khách hàng"""
+        try:
+            with self._atomic():
+                cursor = self.conn.execute(
+                    "UPDATE khach_hang SET ho_ten = ?, dia_chi = ?, so_dien_thoai = ?, ma_cong_to = ? "
+                    "WHERE ma_khach_hang = ?",
+                    (khach_hang.ho_ten, khach_hang.dia_chi, khach_hang.so_dien_thoai,
+                     khach_hang.ma_cong_to, khach_hang.ma_khach_hang)
+                )
+            return cursor.rowcount > 0
+        except sqlite3.Error as e:
+            print(f"Lỗi khi cập nhật khách hàng: {e}")
+            return False
+    
+    def delete_khach_hang(self, ma_khach_hang):
+        """Xóa khách hàng theo mã"""
+        try:
+            with self._atomic():
+                cursor = self.conn.execute(
+                    "DELETE FROM khach_hang WHERE ma_khach_hang = ?", (ma_khach_hang,)
+                )
+            return cursor.rowcount > 0
+        except sqlite3.Error as e:
+            print(f"Lỗi khi xóa khách hàng: {e}")
+            return False
+    
+    # Các phương thức quản lý hóa đơn
+    def get_all_hoa_don(self):
+        """Lấy tất cả hóa đơn"""
+        return self._query_hoa_don()
+    
+    def get_hoa_don(self, ma_hoa_don):
+        """Lấy thông tin một hóa đơn theo mã (dùng khóa chính)"""
+        result = self._query_hoa_don("ma_hoa_don = ?", (ma_hoa_don,))
+        return result[0] if result else None
+    
+    def add_hoa_don(self, hoa_don):
+        """Thêm hóa đơn mới, trả về False nếu mã đã tồn tại hoặc khách hàng đã có hóa đơn trong kỳ"""
+        try:
+            if self._hoa_don_trung_ky(hoa_don) is not None:
+                return False
+            with self._atomic():
+                self.conn.execute(
+                    f"INSERT INTO hoa_don ({HOA_DON_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    self._hoa_don_params(hoa_don)
+                )
+            return True
+        except sqlite3.IntegrityError:
+            # Mã hóa đơn đã tồn tại hoặc trùng kỳ
+            return False
+        except sqlite3.Error as e:
+            print(f"Lỗi khi thêm hóa đơn: {e}")
+            return False
+    
+    def update_hoa_don(self, hoa_don):
+        """Cập nhật thông tin hóa đơn, trả về False nếu khách hàng đã có hóa đơn khác trong kỳ"""
+        try:
+            if self._hoa_don_trung_ky(hoa_don) is not None:
+                return False
+            params = self._hoa_don_params(hoa_don)
+            with self._atomic():
+                cursor = self.conn.execute(
+                    "UPDATE hoa_don SET ma_khach_hang = ?, thang = ?, nam = ?, chi_so_dau = ?, "
+                    "chi_so_cuoi = ?, da_thanh_toan = ?, ngay_thanh_toan = ?, so_tien = ? "
+                    "WHERE ma_hoa_don = ?",
+                    params[1:] + params[:1]
+                )
+            return cursor.rowcount > 0
+        except sqlite3.Error as e:
+            print(f"Lỗi khi cập nhật hóa đơn: {e}")
+            return False
+    
+    def _hoa_don_trung_ky(self, hoa_don):
+        """Tìm hóa đơn khác của cùng khách hàng trong cùng kỳ (dùng chỉ mục khách hàng - kỳ)"""
+        row = self.conn.execute(
+            "SELECT ma_hoa_don FROM hoa_don WHERE ma_khach_hang = ? AND nam = ? AND thang = ? "
+            "AND ma_hoa_don <> ? LIMIT 1",
+            (hoa_don.ma_khach_hang, hoa_don.nam, hoa_don.thang, hoa_don.ma_hoa_don)
+        ).fetchone()
+        return row[0] if row else None
+    
+    def _ma_hien_co(self, tien_to):
+        """Lấy các mã đang dùng của loại dữ liệu ứng với tiền tố (dùng khóa chính)"""
+        bang = {'KH': ('khach_hang', 'ma_khach_hang'), 'HD': ('hoa_don', 'ma_hoa_don'),
+                'BG': ('bang_gia', 'ma_bang_gia')}.get(tien_to)
+        if bang is None:
+            return []
+        rows = self.conn.execute(f"SELECT {bang[1]} FROM {bang[0]} WHERE {bang[1]} LIKE ?", (tien_to + '%',))
+        return [row[0] for row in rows]
+    
+    def delete_hoa_don(self, ma_hoa_don):
+        """Xóa hóa đơn theo mã"""
+        try:
+            with self._atomic():
+                cursor = self.conn.execute("DELETE FROM hoa_don WHERE ma_hoa_don = ?", (ma_hoa_don,))
+            return cursor.rowcount > 0
+        except sqlite3.Error as e:
+            print(f"Lỗi khi xóa hóa đơn: {e}")
+            return False
+    
+    def get_hoa_don_by_khach_hang(self, ma_khach_hang):
+        """Lấy danh sách hóa đơn của một khách hàng (dùng chỉ mục ma_khach_hang)"""
+        return self._query_hoa_don("ma_khach_hang = ?", (ma_khach_hang,))
+    
+    def get_hoa_don_chua_thanh_toan(self):
+        """Lấy danh sách hóa đơn chưa thanh toán (dùng chỉ mục da_thanh_toan)"""
+        return self._query_hoa_don("da_thanh_toan = 0")
+    
+    def get_hoa_don_theo_ky(self, thang, nam):
+        """Lấy danh sách hóa đơn của một kỳ (dùng chỉ mục nam, thang)"""
+        return self._query_hoa_don("nam = ? AND thang = ?", (nam, thang))
+            
+    def get_hoa_don_theo_nam(self, nam):
+        """Lấy danh sách hóa đơn của một năm (dùng chỉ mục nam, thang)"""
+        return self._query_hoa_don("nam = ?", (nam,))
+    
+    def _hoa_don_can_tinh_lai(self, thang, nam, da_thanh_toan):
+        """Lấy các hóa đơn cần tính lại tiền (dùng chỉ mục nam, thang)"""
+        dieu_kien = []
+        params = []
+        if nam is not None:
+            dieu_kien.append("nam = ?")
+            params.append(nam)
+        if thang is not None:
+            dieu_kien.append("thang = ?")
+            params.append(thang)
+        if da_thanh_toan is not None:
+            dieu_kien.append("da_thanh_toan = ?")
+            params.append(int(bool(da_thanh_toan)))
+        return self._query_hoa_don(" AND ".join(dieu_kien), tuple(params))
+    
+    def _cap_nhat_so_tien_hoa_don(self, so_tien_moi):
+        """Ghi số tiền mới của các hóa đơn (mã hóa đơn -> số tiền) trong một giao dịch"""
+        with self._atomic():
+            self.conn.executemany(
+                "UPDATE hoa_don SET so_tien = ? WHERE ma_hoa_don = ?",
+                ((so_tien, ma_hoa_don) for ma_hoa_don, so_tien in so_tien_moi.items())
+            )
+    
+    # Các phương thức quản lý bảng giá
+    def _ma_khach_hang_can_lap_hoa_don(self):
+        """Lấy mã của các khách hàng cần lập hóa đơn, theo thứ tự mã (dùng khóa chính)"""
+        rows = self.conn.execute("SELECT ma_khach_hang FROM khach_hang ORDER BY ma_khach_hang")
+        return [row[0] for row in rows]
+    
+    def _ma_khach_hang_da_co_hoa_don(self, thang, nam):
+        """Lấy mã của các khách hàng đã có hóa đơn trong một kỳ (dùng chỉ mục nam, thang)"""
+        rows = self.conn.execute(
+            "SELECT DISTINCT ma_khach_hang FROM hoa_don WHERE nam = ? AND thang = ?", (nam, thang)
+        )
+        return {row[0] for row in rows}
+    
+    def _chi_so_cuoi_truoc_ky(self, thang, nam):
+        """Lấy (năm, tháng, chỉ số cuối) của hóa đơn gần nhất trước một kỳ của từng khách hàng"""
+        # SQLite lấy các cột còn lại từ đúng dòng có giá trị MAX của nhóm
+        rows = self.conn.execute(
+            "SELECT ma_khach_hang, nam, thang, chi_so_cuoi, MAX(nam * 12 + thang) FROM hoa_don "
+            "WHERE nam * 12 + thang < ? GROUP BY ma_khach_hang",
+            (nam * 12 + thang,)
+        )
+        return {row[0]: (row[1], row[2], row[3]) for row in rows}
+    
+    def get_chi_so_moi_nhat(self, ma_khach_hang):
+        """Lấy (năm, tháng, chỉ số cuối) của hóa đơn mới nhất của một khách hàng"""
+        row = self.conn.execute(
+            "SELECT nam, thang, chi_so_cuoi FROM hoa_don "
+            "WHERE ma_khach_hang = ? AND nam IS NOT NULL AND thang IS NOT NULL "
+            "ORDER BY nam DESC, thang DESC, rowid DESC LIMIT 1",
+            (ma_khach_hang,)
+        ).fetchone()
+        return tuple(row) if row else None
+    
+    def _chi_so_truoc_ky_cua_khach_hang(self, ma_khach_hang, thang, nam):
+        """Lấy (năm, tháng, chỉ số cuối) của hóa đơn gần nhất trước một kỳ của một khách hàng"""
+        row = self.conn.execute(
+            "SELECT nam, thang, chi_so_cuoi FROM hoa_don "
+            "WHERE ma_khach_hang = ? AND nam * 12 + thang < ? "
+            "ORDER BY nam DESC, thang DESC, rowid DESC LIMIT 1",
+            (ma_khach_hang, nam * 12 + thang)
+        ).fetchone()
+        return tuple(row) if row else None
+    
+    def _khach_hang_theo_cong_to(self):
+        """Lấy bảng tra cứu mã công tơ -> mã khách hàng"""
+        khach_hang_theo_cong_to = {}
+        rows = self.conn.execute(
+            "SELECT ma_cong_to, ma_khach_hang FROM khach_hang WHERE ma_cong_to IS NOT NULL ORDER BY rowid"
+        )
+        for ma_cong_to, ma_khach_hang in rows:
+            if str(ma_cong_to).strip():
+                khach_hang_theo_cong_to.setdefault(str(ma_cong_to).strip(), ma_khach_hang)
+        return khach_hang_theo_cong_to
+    
+    def _them_hoa_don_hang_loat(self, hoa_don_list):
+        """Ghi một lô hóa đơn mới trong một giao dịch (lỗi nếu trùng mã hoặc trùng kỳ)"""
+        with self._atomic():
+            self.conn.executemany(
+                f"INSERT INTO hoa_don ({HOA_DON_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (self._hoa_don_params(hd) for hd in hoa_don_list)
+            )
+    
+    def get_analytics_frame(self):
+        """Lấy khung dữ liệu phân tích, tạo lại khi cơ sở dữ liệu thay đổi"""
+        if not (self.analytics and HAS_PANDAS):
+            return None
+        
+        try:
+            # data_version đổi khi kết nối khác ghi, total_changes đổi khi chính kết nối này ghi
+            generation = (self.conn.execute("PRAGMA data_version").fetchone()[0], self.conn.total_changes)
+            frame = self._analytics_frame
+            if frame is None or frame.generation != generation:
+                frame = self._analytics_frame = AnalyticsFrame(self.get_all_hoa_don(), generation)
+            return frame
+        except Exception as e:
+            print(f"Lỗi khi tạo khung dữ liệu phân tích: {e}")
+            return None
+    
+    def _bang_gia_generation(self):
+        """Phiên bản dữ liệu, thay đổi khi chính kết nối này hoặc kết nối khác ghi"""
+        return (self.conn.execute("PRAGMA data_version").fetchone()[0], self.conn.total_changes)
+    
+    def compact_journal(self):
+        """SQLite tự quản lý nhật ký ghi (WAL), không cần gộp"""
+        return True
+    
+    def get_all_bang_gia(self):
+        """Lấy tất cả bảng giá"""
+        try:
+            rows = self.conn.execute("SELECT * FROM bang_gia ORDER BY rowid")
+            return [self._row_to_bang_gia(row) for row in rows]
+        except sqlite3.Error as e:
+            print(f"Lỗi khi đọc dữ liệu bảng giá: {e}")
+            return []
+    
+    def get_bang_gia(self, ma_bang_gia):
+        """Lấy thông tin một bảng giá theo mã (dùng khóa chính)"""
+        row = self.conn.execute(
+            "SELECT * FROM bang_gia WHERE ma_bang_gia = ?", (ma_bang_gia,)
+        ).fetchone()
+        return self._row_to_bang_gia(row) if row else None
+    
+    def add_bang_gia(self, bang_gia):
+        """Thêm bảng giá mới, trả về False nếu mã đã tồn tại"""
+        try:
+            data = bang_gia.to_dict()
+            with self._atomic():
+                self.conn.execute(
+                    "INSERT INTO bang_gia (ma_bang_gia, ngay_ap_dung, bac_thang, vat, trang_thai) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (data['ma_bang_gia'], data['ngay_ap_dung'], json.dumps(data['bac_thang']),
+                     data['vat'], int(bool(data['trang_thai'])))
+                )
+            return True
+        except sqlite3.IntegrityError:
+            # Mã bảng giá đã tồn tại
+            return False
+        except sqlite3.Error as e:
+            print(f"Lỗi khi thêm bảng giá: {e}")
+            return False
+
+
+def migrate_json_to_sqlite(data_dir="../data", db_file=DB_FILE):
+    """
+    Chuyển toàn bộ dữ liệu từ các file JSON sang cơ sở dữ liệu SQLite
+    
+    Các bản ghi đã tồn tại trong SQLite sẽ được ghi đè, vì vậy có thể chạy lại an toàn.
+    Nếu dữ liệu JSON có khách hàng nhiều hóa đơn trong một kỳ, việc chuyển bị dừng để
+    xử lý các hóa đơn trùng trước.
+    
+    Args:
+        data_dir (str): Thư mục chứa khach_hang.json, hoa_don.json, bang_gia.json
+        db_file (str): Tên file cơ sở dữ liệu SQLite trong thư mục dữ liệu
+    
+    Returns:
+        dict: Số bản ghi đã chuyển của từng bảng
+    
+    Raises:
+        ValueError: Nếu có hóa đơn trùng kỳ của cùng một khách hàng
+    """
+    def doc_json(ten_file):
+        path = os.path.join(data_dir, ten_file)
+        if not os.path.exists(path):
+            return []
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    
+    khach_hang_list = [KhachHang.from_dict(item) for item in doc_json("khach_hang.json")]
+    
+    # Hóa đơn được đọc kèm nhật ký hoa_don.journal nếu có
+    hoa_don_file = os.path.join(data_dir, "hoa_don.json")
+    hoa_don_list = []
+    if os.path.exists(hoa_don_file):
+        hoa_don_list = list(JournaledTableCache(hoa_don_file, HoaDon, 'ma_hoa_don').load().values())
+    bang_gia_list = [BangGia.from_dict(item) for item in doc_json("bang_gia.json")]
+    
+    # Chỉ mục duy nhất theo kỳ sẽ thay thế (xóa) hóa đơn trùng kỳ khi INSERT OR REPLACE
+    theo_ky = {}
+    for hd in hoa_don_list:
+        khoa = (hd.ma_khach_hang, hd.nam, hd.thang)
+        if khoa in theo_ky:
+            raise ValueError(f"Hóa đơn {theo_ky[khoa]} và {hd.ma_hoa_don} trùng kỳ "
+                             f"{hd.thang}/{hd.nam} của khách hàng {hd.ma_khach_hang}")
+        theo_ky[khoa] = hd.ma_hoa_don
+    
+    db = SQLiteDatabaseHandler(data_dir, db_file)
+    try:
+        with db.conn:
+            db.conn.executemany(
+                "INSERT OR REPLACE INTO khach_hang (ma_khach_hang, ho_ten, dia_chi, so_dien_thoai, ma_cong_to) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(kh.ma_khach_hang, kh.ho_ten, kh.dia_chi, kh.so_dien_thoai, kh.ma_cong_to)
+                 for kh in khach_hang_list]
+            )
+            db.conn.executemany(
+                f"INSERT OR REPLACE INTO hoa_don ({HOA_DON_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [db._hoa_don_params(hd) for hd in hoa_don_list]
+            )
+            if bang_gia_list:
+                # Bảng giá trong JSON thay thế bảng giá mặc định vừa được khởi tạo
+                db.conn.execute("DELETE FROM bang_gia")
+                db.conn.executemany(
+                    "INSERT OR REPLACE INTO bang_gia (ma_bang_gia, ngay_ap_dung, bac_thang, vat, trang_thai) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    [(d['ma_bang_gia'], d['ngay_ap_dung'], json.dumps(d['bac_thang']),
+                      d['vat'], int(bool(d['trang_thai'])))
+                     for d in (bg.to_dict() for bg in bang_gia_list)]
+                )
+    finally:
+        db.close()
+    
+    return {
+        "khach_hang": len(khach_hang_list),
+        "hoa_don": len(hoa_don_list),
+        "bang_gia": len(bang_gia_list)
+    }
+
+
+def open_database(data_dir="../data", backend=None, db_file=DB_FILE, analytics=False):
+    """
+    Mở cơ sở dữ liệu của ứng dụng theo cách lưu trữ đã chọn
+    
+    Mặc định dùng SQLite. Lần mở đầu tiên (chưa có file cơ sở dữ liệu), dữ liệu trong các
+    file JSON được chuyển sang bằng migrate_json_to_sqlite; việc chuyển được ghi vào file
+    tạm rồi đổi tên nên bị gián đoạn thì lần mở sau sẽ chuyển lại từ đầu. Sau khi chuyển,
+    các file JSON không còn được cập nhật. Nếu không chuyển được (ví dụ dữ liệu có hóa đơn
+    trùng kỳ), ứng dụng tiếp tục dùng các file JSON.
+    
+    Args:
+        data_dir (str): Thư mục lưu trữ dữ liệu
+        backend (str, optional): "sqlite" hoặc "json", mặc định lấy từ biến môi trường
+            VTN_DB_BACKEND, không có thì dùng "sqlite"
+        db_file (str): Tên file cơ sở dữ liệu SQLite trong thư mục dữ liệu
+        analytics (bool): Tính các thống kê bằng pandas/numpy (nếu đã cài đặt)
+    
+    Returns:
+        DatabaseHandler: SQLiteDatabaseHandler hoặc DatabaseHandler (JSON)
+    
+    Raises:
+        ValueError: Nếu backend không hợp lệ
+    """
+    backend = (backend or os.environ.get(BACKEND_ENV) or "sqlite").lower()
+    if backend == "json":
+        return DatabaseHandler(data_dir, analytics=analytics)
+    if backend != "sqlite":
+        raise ValueError(f"Cách lưu trữ không hợp lệ: {backend} (chỉ hỗ trợ sqlite hoặc json)")
+    
+    db_path = os.path.join(data_dir, db_file)
+    if not os.path.exists(db_path):
+        tmp_file = db_file + ".tmp"
+        tmp_path = os.path.join(data_dir, tmp_file)
+        try:
+            # Xóa file tạm của lần chuyển dữ liệu bị gián đoạn trước đó
+            for path in (tmp_path, tmp_path + "-wal", tmp_path + "-shm"):
+                if os.path.exists(path):
+                    os.remove(path)
+            ket_qua = migrate_json_to_sqlite(data_dir, tmp_file)
+            os.replace(tmp_path, db_path)
+            print(f"Đã chuyển {ket_qua['khach_hang']} khách hàng, {ket_qua['hoa_don']} hóa đơn, "
+                  f"{ket_qua['bang_gia']} bảng giá từ JSON sang SQLite ({db_path})")
+        except Exception as e:
+            print(f"Không thể chuyển dữ liệu sang SQLite, tiếp tục dùng JSON: {e}")
+            return DatabaseHandler(data_dir, analytics=analytics)
+    
+    return SQLiteDatabaseHandler(data_dir, db_file, analytics=analytics)
+
+
+if __name__ == "__main__":
+    # Chạy từ thư mục ứng dụng: python -m utils.sqlite_handler
+    ket_qua = migrate_json_to_sqlite()
+    print(f"Đã chuyển {ket_qua['khach_hang']} khách hàng, {ket_qua['hoa_don']} hóa đơn, "
+          f"{ket_qua['bang_gia']} bảng giá sang SQLite")
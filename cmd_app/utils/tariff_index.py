@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import bisect
+import datetime
+
+
+def _to_datetime(value):
+    """Chuyển ngày (date) thành thời điểm 0 giờ của ngày đó, giữ nguyên nếu đã là datetime"""
+    if isinstance(value, datetime.datetime):
+        return value
+    return datetime.datetime.combine(value, datetime.time.min)
+
+
+class TariffIndex:
+    """
+    Chỉ mục khoảng hiệu lực của các bảng giá theo ngày áp dụng
+    
+    Các bảng giá được sắp xếp một lần theo ngày áp dụng. Mỗi bảng giá có hiệu lực từ
+    ngày áp dụng của nó đến ngày áp dụng của bảng giá kế tiếp, nên tra cứu bảng giá tại
+    một thời điểm chỉ cần một lần tìm kiếm nhị phân. Khi nhiều bảng giá cùng ngày áp
+    dụng, bảng giá đứng trước trong dữ liệu được dùng (giống get_bang_gia_hien_hanh).
+    Bảng giá không có ngày áp dụng bị bỏ qua.
+    """
+    
+    def __init__(self, bang_gia_list, generation=None):
+        """
+        Tạo chỉ mục
+        
+        Args:
+            bang_gia_list (iterable): Các bảng giá theo thứ tự trong dữ liệu
+            generation: Phiên bản dữ liệu nguồn, dùng để biết khi nào cần tạo lại
+        """
+        self.generation = generation
+        self.ngay_ap_dung = []
+        self.bang_gia = []
+        
+        co_ngay = [bg for bg in bang_gia_list if bg.ngay_ap_dung]
+        for bg in sorted(co_ngay, key=lambda bg: bg.ngay_ap_dung):
+            if self.ngay_ap_dung and self.ngay_ap_dung[-1] == bg.ngay_ap_dung:
+                continue
+            self.ngay_ap_dung.append(bg.ngay_ap_dung)
+            self.bang_gia.append(bg)
+    
+    def __len__(self):
+        return len(self.bang_gia)
+    
+    def tariff_at(self, date):
+        """
+        Lấy bảng giá có hiệu lực tại một thời điểm
+        
+        Args:
+            date (date | datetime): Thời điểm cần tra cứu, ngày được tính từ 0 giờ
+        
+        Returns:
+            BangGia: Bảng giá có ngày áp dụng gần nhất không sau thời điểm đó, hoặc None
+                nếu thời điểm trước mọi bảng giá
+        """
+        vi_tri = bisect.bisect_right(self.ngay_ap_dung, _to_datetime(date)) - 1
+        return self.bang_gia[vi_tri] if vi_tri >= 0 else None
+    
+    def earliest(self):
+        """Lấy bảng giá có ngày áp dụng sớm nhất hoặc None nếu chưa có bảng giá"""
+        return self.bang_gia[0] if self.bang_gia else None
+    
+    def latest(self):
+        """Lấy bảng giá có ngày áp dụng muộn nhất hoặc None nếu chưa có bảng giá"""
+        return self.bang_gia[-1] if self.bang_gia else None
+    
+    def segments(self, start, end):
+        """
+        Chia khoảng thời gian [start, end) theo các lần thay đổi bảng giá
+        
+        Phần trước ngày áp dụng của bảng giá sớm nhất dùng bảng giá sớm nhất.
+        
+        Args:
+            start (date | datetime): Thời điểm bắt đầu
+            end (date | datetime): Thời điểm kết thúc (không bao gồm)
+        
+        Returns:
+            list: Các cặp (bảng giá, thời lượng áp dụng dạng timedelta) theo thứ tự thời
+                gian, rỗng nếu chưa có bảng giá hoặc khoảng thời gian rỗng
+        """
+        start = _to_datetime(start)
+        end = _to_datetime(end)
+        if not self.bang_gia or end <= start:
+            return []
+        
+        vi_tri = max(bisect.bisect_right(self.ngay_ap_dung, start) - 1, 0)
+        cac_doan = []
+        hien_tai = start
+        while hien_tai < end:
+            if vi_tri + 1 < len(self.bang_gia):
+                ket_thuc = min(end, self.ngay_ap_dung[vi_tri + 1])
+            else:
+                ket_thuc = end
+            cac_doan.append((self.bang_gia[vi_tri], ket_thuc - hien_tai))
+            hien_tai = ket_thuc
+            vi_tri += 1
+        return cac_doan
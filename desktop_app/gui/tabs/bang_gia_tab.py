@@ -346,8 +346,8 @@ class BangGiaDialog(QDialog):
         if self.bang_gia:
             ma_bang_gia = self.bang_gia.ma_bang_gia
         else:
-            # Tạo mã bảng giá mới
-            ma_bang_gia = f"BG{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}"
+            # Mã bảng giá mới được cấp khi lưu (DatabaseHandler.tao_ma)
+            ma_bang_gia = None
         
         # Lấy ngày áp dụng
         selected_date = self.ngay_ap_dung_date.date()
@@ -359,7 +359,7 @@ class BangGiaDialog(QDialog):
         
         # Lấy thông tin các bậc thang
         bac_thang = []
-        for kwh_max_spin, don_gia_spin, _ in self.bac_thang_inputs:
+        for _, kwh_max_spin, don_gia_spin, _ in self.bac_thang_inputs:
             kwh_max = kwh_max_spin.value()
             
             # Kiểm tra nếu là bậc cuối cùng và đã bị vô hiệu hóa
@@ -435,7 +435,14 @@ class BangGiaTab(QWidget):
         self.refresh_button = QPushButton("Làm mới")
         self.refresh_button.setIcon(QIcon("../assets/icons/refresh.svg"))
         
-        for btn in [self.add_button, self.history_button, self.refresh_button]:
+        self.reprice_button = QPushButton("Tính lại hóa đơn")
+        self.reprice_button.setIcon(QIcon("../assets/icons/refresh.svg"))
+        
+        self.simulate_button = QPushButton("Mô phỏng bảng giá")
+        self.simulate_button.setIcon(QIcon("../assets/icons/history.svg"))
+        
+        for btn in [self.add_button, self.history_button, self.refresh_button, self.reprice_button,
+                    self.simulate_button]:
             btn.setStyleSheet(f"""
                 QPushButton {{
                     background-color: {VTN_YELLOW};
@@ -458,6 +465,8 @@ class BangGiaTab(QWidget):
         tools_layout.addWidget(self.add_button)
         tools_layout.addWidget(self.history_button)
         tools_layout.addWidget(self.refresh_button)
+        tools_layout.addWidget(self.reprice_button)
+        tools_layout.addWidget(self.simulate_button)
         
         layout.addWidget(tools_frame)
         
@@ -568,6 +577,8 @@ class BangGiaTab(QWidget):
         self.add_button.clicked.connect(self.add_bang_gia)
         self.history_button.clicked.connect(self.toggle_history_view)
         self.refresh_button.clicked.connect(self.load_data)
+        self.reprice_button.clicked.connect(self.tinh_lai_hoa_don)
+        self.simulate_button.clicked.connect(self.mo_phong_bang_gia)
     
     def load_data(self):
         """Tải dữ liệu bảng giá hiện hành"""
@@ -641,9 +652,9 @@ class BangGiaTab(QWidget):
             # Lấy dữ liệu từ dialog
             bang_gia_data = dialog.get_bang_gia_data()
             
-            # Tạo đối tượng bảng giá
+            # Tạo đối tượng bảng giá với mã mới
             bang_gia = BangGia(
-                bang_gia_data['ma_bang_gia'],
+                self.db.tao_ma('BG'),
                 bang_gia_data['ngay_ap_dung'],
                 bang_gia_data['bac_thang']
             )
@@ -656,6 +667,9 @@ class BangGiaTab(QWidget):
                     "Thông báo", 
                     f"Đã thêm bảng giá mới với ngày áp dụng: {bang_gia_data['ngay_ap_dung'].strftime('%d/%m/%Y')}"
                 )
+                
+                # Đề nghị tính lại các hóa đơn chưa thanh toán theo bảng giá mới
+                self.tinh_lai_hoa_don()
             else:
                 QMessageBox.warning(self, "Lỗi", "Không thể thêm bảng giá mới!")
             
@@ -664,6 +678,95 @@ class BangGiaTab(QWidget):
             if self.history_table.isVisible():
                 self.load_bang_gia_history()
     
+    def tinh_lai_hoa_don(self):
+        """Tính lại tiền các hóa đơn chưa thanh toán theo các bảng giá hiện có"""
+        # Tính thử trước để hiển thị chênh lệch cho người dùng xác nhận
+        ket_qua = self.db.tinh_lai_tien_hoa_don(dry_run=True)
+        if ket_qua is None:
+            QMessageBox.warning(self, "Lỗi", "Không thể tính lại tiền hóa đơn!")
+            return
+        
+        if not ket_qua['so_thay_doi']:
+            QMessageBox.information(
+                self,
+                "Thông báo",
+                f"Đã kiểm tra {ket_qua['so_hoa_don']} hóa đơn chưa thanh toán, không có hóa đơn nào thay đổi số tiền."
+            )
+            return
+        
+        reply = QMessageBox.question(
+            self,
+            "Xác nhận tính lại",
+            f"{ket_qua['so_thay_doi']}/{ket_qua['so_hoa_don']} hóa đơn chưa thanh toán sẽ thay đổi số tiền.\n"
+            f"Tổng tiền: {ket_qua['tong_tien_cu']:,.0f} VNĐ → {ket_qua['tong_tien_moi']:,.0f} VNĐ "
+            f"(chênh lệch {ket_qua['chenh_lech']:+,.0f} VNĐ).\n\n"
+            f"Bạn có muốn cập nhật các hóa đơn này?",
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
+            QMessageBox.StandardButton.No
+        )
+        
+        if reply == QMessageBox.StandardButton.Yes:
+            ket_qua = self.db.tinh_lai_tien_hoa_don(dry_run=False)
+            if ket_qua is not None:
+                QMessageBox.information(
+                    self,
+                    "Thông báo",
+                    f"Đã cập nhật số tiền của {ket_qua['so_thay_doi']} hóa đơn."
+                )
+            else:
+                QMessageBox.warning(self, "Lỗi", "Không thể tính lại tiền hóa đơn!")
+    
+    def mo_phong_bang_gia(self):
+        """Mô phỏng doanh thu của hóa đơn hiện có nếu áp dụng một bảng giá dự kiến"""
+        # Lấy bảng giá hiện hành làm điểm xuất phát để người dùng chỉnh sửa
+        dialog = BangGiaDialog(self, self.db.get_bang_gia_hien_hanh())
+        dialog.setWindowTitle("Mô Phỏng Bảng Giá Dự Kiến")
+        
+        if dialog.exec() != QDialog.DialogCode.Accepted:
+            return
+        
+        bang_gia_data = dialog.get_bang_gia_data()
+        bang_gia = BangGia("Dự kiến", bang_gia_data['ngay_ap_dung'], bang_gia_data['bac_thang'])
+        bang_gia.vat = bang_gia_data['vat']
+        
+        ket_qua = self.db.mo_phong_bang_gia([bang_gia])
+        if ket_qua is None:
+            QMessageBox.warning(self, "Lỗi", "Không thể mô phỏng bảng giá!")
+            return
+        if not ket_qua['so_hoa_don']:
+            QMessageBox.information(self, "Thông báo", "Chưa có hóa đơn nào để mô phỏng.")
+            return
+        
+        phuong_an = ket_qua['phuong_an'][0]
+        
+        # Chênh lệch theo bậc tiêu thụ và các khách hàng bị ảnh hưởng nhiều nhất
+        chi_tiet = ["Chênh lệch theo bậc tiêu thụ:"]
+        for bac, tong in phuong_an['theo_bac'].items():
+            chi_tiet.append(
+                f"  Bậc {bac}: {tong['so_hoa_don']} hóa đơn, {tong['tieu_thu']:,} kWh, "
+                f"{tong['chenh_lech']:+,.0f} VNĐ"
+            )
+        for tieu_de, khoa in [("Khách hàng tăng tiền nhiều nhất:", 'khach_hang_tang_tien'),
+                              ("Khách hàng giảm tiền nhiều nhất:", 'khach_hang_giam_tien')]:
+            chi_tiet.append("")
+            chi_tiet.append(tieu_de)
+            for kh in phuong_an[khoa]:
+                chi_tiet.append(
+                    f"  {kh['ma_khach_hang']} - {kh['ten_khach_hang']}: {kh['chenh_lech']:+,.0f} VNĐ"
+                )
+        
+        message_box = QMessageBox(self)
+        message_box.setWindowTitle("Kết quả mô phỏng")
+        message_box.setIcon(QMessageBox.Icon.Information)
+        message_box.setText(
+            f"Mô phỏng trên {ket_qua['so_hoa_don']} hóa đơn ({ket_qua['tong_tieu_thu']:,} kWh).\n"
+            f"Doanh thu hiện tại: {ket_qua['tong_tien_hien_tai']:,.0f} VNĐ\n"
+            f"Doanh thu dự kiến: {phuong_an['tong_tien_moi']:,.0f} VNĐ\n"
+            f"Chênh lệch: {phuong_an['chenh_lech']:+,.0f} VNĐ ({phuong_an['ty_le_chenh_lech']:+.2f}%)"
+        )
+        message_box.setDetailedText("\n".join(chi_tiet))
+        message_box.exec()
+    
     def toggle_history_view(self):
         """Bật/tắt hiển thị lịch sử bảng giá"""
         # Thay đổi hiển thị của bảng lịch sử
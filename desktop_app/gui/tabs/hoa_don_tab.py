@@ -6,7 +6,8 @@ from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton,
                            QLabel, QTableWidget, QTableWidgetItem, QLineEdit,
                            QFormLayout, QDialog, QMessageBox, QHeaderView,
                            QComboBox, QDateEdit, QSpinBox, QCheckBox, QFrame,
-                           QGroupBox, QSizePolicy)
+                           QGroupBox, QSizePolicy, QFileDialog, QProgressDialog,
+                           QApplication)
 from PyQt6.QtCore import Qt, QDate
 from PyQt6.QtGui import QIcon, QFont, QColor
 
@@ -172,11 +173,22 @@ class HoaDonDialog(QDialog):
         reading_form.addRow("Chỉ số đầu:", self.chi_so_dau_spin)
         reading_form.addRow("Chỉ số cuối:", self.chi_so_cuoi_spin)
         
+        # Cảnh báo khi thiếu hóa đơn giữa kỳ trước và kỳ này
+        self.thieu_ky_label = QLabel("")
+        self.thieu_ky_label.setStyleSheet(f"color: {VTN_RED}; padding: 5px; font-weight: bold;")
+        self.thieu_ky_label.setVisible(False)
+        reading_form.addRow("", self.thieu_ky_label)
+        
         # Thông tin tiêu thụ
         self.tieu_thu_label = QLabel("Lượng điện tiêu thụ: 0 kWh")
         self.tieu_thu_label.setStyleSheet(f"color: {VTN_ORANGE}; font-size: 14px; padding: 5px; font-weight: bold;")
         reading_form.addRow("", self.tieu_thu_label)
         
+        # Số tiền tạm tính theo bảng giá của kỳ
+        self.so_tien_label = QLabel("Số tiền tạm tính: 0 VNĐ")
+        self.so_tien_label.setStyleSheet(f"color: {VTN_ORANGE}; font-size: 14px; padding: 5px; font-weight: bold;")
+        reading_form.addRow("", self.so_tien_label)
+        
         form_layout.addWidget(reading_group)
         
         # Thông tin thanh toán
@@ -214,6 +226,8 @@ class HoaDonDialog(QDialog):
         # Kết nối sự kiện khi thay đổi chỉ số để cập nhật lượng tiêu thụ
         self.chi_so_dau_spin.valueChanged.connect(self.update_tieu_thu)
         self.chi_so_cuoi_spin.valueChanged.connect(self.update_tieu_thu)
+        self.thang_spin.valueChanged.connect(self.update_tieu_thu)
+        self.nam_spin.valueChanged.connect(self.update_tieu_thu)
         
         # Thêm form vào layout chính
         layout.addWidget(form_frame)
@@ -238,6 +252,12 @@ class HoaDonDialog(QDialog):
                 self.ngay_thanh_toan_date.setDate(qdate)
             
             self.update_tieu_thu()
+        else:
+            # Hóa đơn mới: chỉ số đầu lấy theo chỉ số cuối của kỳ trước
+            self.khach_hang_combo.currentIndexChanged.connect(self.update_chi_so_dau)
+            self.thang_spin.valueChanged.connect(self.update_chi_so_dau)
+            self.nam_spin.valueChanged.connect(self.update_chi_so_dau)
+            self.update_chi_so_dau()
         
         # Các nút
         button_layout = QHBoxLayout()
@@ -276,13 +296,36 @@ class HoaDonDialog(QDialog):
         """
         self.ngay_thanh_toan_date.setEnabled(state == Qt.CheckState.Checked.value)
     
+    def update_chi_so_dau(self):
+        """Điền chỉ số đầu từ hóa đơn gần nhất trước kỳ của khách hàng đang chọn"""
+        ma_khach_hang = self.khach_hang_combo.currentData()
+        if ma_khach_hang is None:
+            return
+        
+        chi_so_dau_ky = self.db.get_chi_so_dau_ky(ma_khach_hang, self.thang_spin.value(),
+                                                  self.nam_spin.value())
+        self.chi_so_dau_spin.setValue(chi_so_dau_ky["chi_so_dau"])
+        
+        so_thang_thieu = chi_so_dau_ky["so_thang_thieu"]
+        if so_thang_thieu:
+            nam_truoc, thang_truoc = chi_so_dau_ky["ky_truoc"]
+            self.thieu_ky_label.setText(f"Thiếu hóa đơn {so_thang_thieu} tháng giữa kỳ "
+                                        f"{thang_truoc:02d}/{nam_truoc} và kỳ này")
+        self.thieu_ky_label.setVisible(bool(so_thang_thieu))
+    
     def update_tieu_thu(self):
-        """Cập nhật hiển thị lượng điện tiêu thụ"""
+        """Cập nhật hiển thị lượng điện tiêu thụ và số tiền tạm tính"""
         chi_so_dau = self.chi_so_dau_spin.value()
         chi_so_cuoi = self.chi_so_cuoi_spin.value()
         
         tieu_thu = max(0, chi_so_cuoi - chi_so_dau)
         self.tieu_thu_label.setText(f"Lượng điện tiêu thụ: {tieu_thu} kWh")
+        
+        # Tính như khi lưu hóa đơn, số tiền được lấy từ bảng tra cứu của bảng giá
+        hoa_don = HoaDon("", "", self.thang_spin.value(), self.nam_spin.value(),
+                         chi_so_dau, max(chi_so_dau, chi_so_cuoi))
+        so_tien = self.db.tinh_tien_hoa_don(hoa_don, chia_theo_ngay=True)
+        self.so_tien_label.setText(f"Số tiền tạm tính: {int(so_tien):,} VNĐ")
     
     def get_hoa_don_data(self):
         """
@@ -294,8 +337,8 @@ class HoaDonDialog(QDialog):
         if self.hoa_don:
             ma_hoa_don = self.hoa_don.ma_hoa_don
         else:
-            # Tạo mã hóa đơn mới
-            ma_hoa_don = f"HD{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}"
+            # Cấp mã hóa đơn mới
+            ma_hoa_don = self.db.tao_ma('HD')
         
         ngay_thanh_toan = None
         if self.da_thanh_toan_check.isChecked():
@@ -471,10 +514,20 @@ class HoaDonTab(QWidget):
         self.print_button = QPushButton("In hóa đơn")
         self.print_button.setIcon(QIcon("../assets/icons/print.svg"))
         
+        self.print_all_button = QPushButton("In hàng loạt")
+        self.print_all_button.setIcon(QIcon("../assets/icons/print.svg"))
+        
+        self.print_merged_button = QPushButton("In gộp")
+        self.print_merged_button.setIcon(QIcon("../assets/icons/print.svg"))
+        
         self.refresh_button = QPushButton("Làm mới")
         self.refresh_button.setIcon(QIcon("../assets/icons/refresh.svg"))
         
-        for btn in [self.add_button, self.edit_button, self.print_button, self.refresh_button]:
+        self.import_button = QPushButton("Nhập chỉ số")
+        self.import_button.setIcon(QIcon("../assets/icons/add.svg"))
+        
+        for btn in [self.add_button, self.edit_button, self.print_button, self.print_all_button,
+                    self.print_merged_button, self.refresh_button, self.import_button]:
             btn.setStyleSheet(f"""
                 QPushButton {{
                     background-color: {VTN_YELLOW};
@@ -514,7 +567,10 @@ class HoaDonTab(QWidget):
         tools_layout.addWidget(self.edit_button)
         tools_layout.addWidget(self.delete_button)
         tools_layout.addWidget(self.print_button)
+        tools_layout.addWidget(self.print_all_button)
+        tools_layout.addWidget(self.print_merged_button)
         tools_layout.addWidget(self.refresh_button)
+        tools_layout.addWidget(self.import_button)
         
         layout.addWidget(tools_frame)
         
@@ -578,6 +634,9 @@ class HoaDonTab(QWidget):
         self.filter_button.clicked.connect(self.apply_filter)
         self.search_input.returnPressed.connect(self.search_button.click)
         self.print_button.clicked.connect(self.print_hoa_don)
+        self.print_all_button.clicked.connect(self.print_hoa_don_hang_loat)
+        self.print_merged_button.clicked.connect(self.print_hoa_don_gop)
+        self.import_button.clicked.connect(self.nhap_chi_so_cong_to)
     
     def load_data(self):
         """Tải dữ liệu hóa đơn vào bảng"""
@@ -661,10 +720,8 @@ class HoaDonTab(QWidget):
                 None
             )
             
-            # Tính tiền
-            bang_gia = self.db.get_bang_gia_hien_hanh()
-            if bang_gia:
-                hoa_don.tinh_tien(bang_gia)
+            # Tính tiền theo bảng giá của kỳ hóa đơn, chia theo số ngày nếu bảng giá đổi giữa kỳ
+            self.db.tinh_tien_hoa_don(hoa_don, chia_theo_ngay=True)
             
             # Thêm vào database
             if self.db.add_hoa_don(hoa_don):
@@ -717,9 +774,7 @@ class HoaDonTab(QWidget):
             
             # Tính tiền nếu cần
             if hoa_don_data['chi_so_dau'] != self.table.item(row, 3).text() or hoa_don_data['chi_so_cuoi'] != self.table.item(row, 4).text():
-                bang_gia = self.db.get_bang_gia_hien_hanh()
-                if bang_gia:
-                    hoa_don.tinh_tien(bang_gia)
+                self.db.tinh_tien_hoa_don(hoa_don, chia_theo_ngay=True)
             
             # Cập nhật vào database
             if self.db.update_hoa_don(hoa_don):
@@ -895,6 +950,148 @@ class HoaDonTab(QWidget):
             # Căn giữa: Trạng thái
             self.table.item(row, 7).setTextAlignment(Qt.AlignmentFlag.AlignCenter)
     
+    def nhap_chi_so_cong_to(self):
+        """Nhập chỉ số công tơ từ file CSV/NDJSON và lập hóa đơn cho các dòng hợp lệ"""
+        file_path, _ = QFileDialog.getOpenFileName(
+            self,
+            "Chọn File Chỉ Số Công Tơ",
+            "",
+            "Chỉ số công tơ (*.csv *.ndjson *.jsonl)"
+        )
+        if not file_path:
+            return
+        
+        # Các dòng bị loại được ghi cạnh file nguồn
+        rejects_file = os.path.splitext(file_path)[0] + "_loi.ndjson"
+        ket_qua = self.db.nhap_chi_so_cong_to(file_path, rejects_file=rejects_file)
+        if ket_qua is None:
+            QMessageBox.warning(self, "Lỗi", "Không thể nhập chỉ số công tơ!")
+            return
+        
+        thong_bao = f"Đã lập {ket_qua['so_hoa_don']} hóa đơn trong {ket_qua['thoi_gian']:.2f} giây."
+        if ket_qua['so_dong_loi']:
+            thong_bao += (f"\n{ket_qua['so_dong_loi']} dòng bị loại, chi tiết tại:\n{rejects_file}")
+        QMessageBox.information(self, "Thông báo", thong_bao)
+        
+        self.load_data()
+    
+    def print_hoa_don_hang_loat(self):
+        """In tất cả hóa đơn đang hiển thị trong bảng ra các file PDF, tạo song song trên nhiều tiến trình"""
+        ma_hoa_don_list = [self.table.item(row, 0).text() for row in range(self.table.rowCount())
+                           if self.table.item(row, 0) is not None]
+        if not ma_hoa_don_list:
+            QMessageBox.warning(self, "Cảnh báo", "Không có hóa đơn nào để in.")
+            return
+        
+        reply = QMessageBox.question(
+            self, "Xác nhận", f"Xuất {len(ma_hoa_don_list)} hóa đơn đang hiển thị ra file PDF?",
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
+        )
+        if reply != QMessageBox.StandardButton.Yes:
+            return
+        
+        # Chuẩn bị khách hàng và bảng giá của từng kỳ cho các tiến trình tạo PDF
+        hoa_don_list = [hd for hd in (self.db.get_hoa_don(ma) for ma in ma_hoa_don_list) if hd]
+        khach_hang_theo_ma = {kh.ma_khach_hang: kh for kh in self.db.get_all_khach_hang()}
+        bang_gia_theo_ky = {}
+        for hd in hoa_don_list:
+            if (hd.thang, hd.nam) not in bang_gia_theo_ky:
+                bang_gia_theo_ky[(hd.thang, hd.nam)] = self.db.get_bang_gia_theo_ky(hd.thang, hd.nam)
+        
+        progress = QProgressDialog("Đang xuất hóa đơn PDF...", None, 0, len(hoa_don_list), self)
+        progress.setWindowTitle("In hàng loạt")
+        progress.setWindowModality(Qt.WindowModality.WindowModal)
+        progress.setMinimumDuration(0)
+        
+        def tien_do(ket_qua):
+            progress.setValue(ket_qua['da_xu_ly'])
+            progress.setLabelText(f"Đã xuất {ket_qua['da_xu_ly']}/{ket_qua['so_hoa_don']} hóa đơn "
+                                  f"({ket_qua['hoa_don_moi_giay']:,.0f} hóa đơn/giây)")
+            QApplication.processEvents()
+        
+        try:
+            from models.hoa_don_pdf import tao_hoa_don_pdf_batch
+            ket_qua = tao_hoa_don_pdf_batch(hoa_don_list, khach_hang_theo_ma, bang_gia_theo_ky,
+                                            tien_do=tien_do, buoc_tien_do=10)
+        except Exception as e:
+            QMessageBox.critical(self, "Lỗi", f"Lỗi khi xuất hóa đơn PDF: {str(e)}")
+            return
+        finally:
+            progress.close()
+        
+        thong_bao = (f"Đã xuất {ket_qua['so_thanh_cong']}/{ket_qua['so_hoa_don']} hóa đơn trong "
+                     f"{ket_qua['thoi_gian']:.2f} giây ({ket_qua['hoa_don_moi_giay']:,.0f} hóa đơn/giây).")
+        if ket_qua['files']:
+            thong_bao += f"\nThư mục: {os.path.dirname(ket_qua['files'][0])}"
+        if ket_qua['loi']:
+            thong_bao += f"\n{len(ket_qua['loi'])} hóa đơn bị lỗi."
+        message_box = QMessageBox(self)
+        message_box.setWindowTitle("Thông báo")
+        message_box.setText(thong_bao)
+        if ket_qua['loi']:
+            message_box.setDetailedText("\n".join(f"{ma}: {loi}" for ma, loi in ket_qua['loi']))
+        message_box.exec()
+    
+    def print_hoa_don_gop(self):
+        """In tất cả hóa đơn đang hiển thị trong bảng vào một file PDF, sắp theo địa chỉ khách hàng"""
+        ma_hoa_don_list = [self.table.item(row, 0).text() for row in range(self.table.rowCount())
+                           if self.table.item(row, 0) is not None]
+        if not ma_hoa_don_list:
+            QMessageBox.warning(self, "Cảnh báo", "Không có hóa đơn nào để in.")
+            return
+        
+        file_path, _ = QFileDialog.getSaveFileName(
+            self, "Lưu file hóa đơn gộp",
+            f"hoa_don_gop_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf", "PDF (*.pdf)"
+        )
+        if not file_path:
+            return
+        
+        # Sắp hóa đơn theo địa chỉ để in theo tuyến phát hóa đơn
+        khach_hang_theo_ma = {kh.ma_khach_hang: kh for kh in self.db.get_all_khach_hang()}
+        hoa_don_list = [hd for hd in (self.db.get_hoa_don(ma) for ma in ma_hoa_don_list) if hd]
+        hoa_don_list.sort(key=lambda hd: (
+            getattr(khach_hang_theo_ma.get(hd.ma_khach_hang), 'dia_chi', ''), hd.ma_khach_hang, hd.nam, hd.thang
+        ))
+        bang_gia_theo_ky = {}
+        for hd in hoa_don_list:
+            if (hd.thang, hd.nam) not in bang_gia_theo_ky:
+                bang_gia_theo_ky[(hd.thang, hd.nam)] = self.db.get_bang_gia_theo_ky(hd.thang, hd.nam)
+        
+        progress = QProgressDialog("Đang tạo file hóa đơn gộp...", None, 0, len(hoa_don_list), self)
+        progress.setWindowTitle("In gộp")
+        progress.setWindowModality(Qt.WindowModality.WindowModal)
+        progress.setMinimumDuration(0)
+        
+        def tien_do(ket_qua):
+            progress.setValue(ket_qua['da_xu_ly'])
+            progress.setLabelText(f"Đã thêm {ket_qua['so_thanh_cong']}/{len(hoa_don_list)} hóa đơn "
+                                  f"({ket_qua['hoa_don_moi_giay']:,.0f} hóa đơn/giây)")
+            QApplication.processEvents()
+        
+        try:
+            from models.hoa_don_pdf import tao_hoa_don_pdf_gop
+            ket_qua = tao_hoa_don_pdf_gop(hoa_don_list, khach_hang_theo_ma, bang_gia_theo_ky, file_path,
+                                          tien_do=tien_do, buoc_tien_do=10)
+        except Exception as e:
+            QMessageBox.critical(self, "Lỗi", f"Lỗi khi tạo file hóa đơn gộp: {str(e)}")
+            return
+        finally:
+            progress.close()
+        
+        thong_bao = (f"Đã đưa {ket_qua['so_thanh_cong']}/{len(hoa_don_list)} hóa đơn vào "
+                     f"{ket_qua['so_trang']} trang trong {ket_qua['thoi_gian']:.2f} giây.")
+        if ket_qua['file']:
+            thong_bao += f"\nFile: {ket_qua['file']}"
+        if ket_qua['loi']:
+            thong_bao += f"\n{len(ket_qua['loi'])} hóa đơn bị lỗi."
+        message_box = QMessageBox(self)
+        message_box.setWindowTitle("Thông báo")
+        message_box.setText(thong_bao)
+        if ket_qua['loi']:
+            message_box.setDetailedText("\n".join(f"{ma}: {loi}" for ma, loi in ket_qua['loi']))
+        message_box.exec()
+    
     def print_hoa_don(self):
         """In hóa đơn được chọn dưới dạng PDF"""
         # Kiểm tra xem có dòng nào được chọn không
@@ -921,8 +1118,8 @@ class HoaDonTab(QWidget):
             QMessageBox.warning(self, "Lỗi", f"Không tìm thấy thông tin khách hàng của hóa đơn {ma_hoa_don}.")
             return
         
-        # Lấy thông tin bảng giá
-        bang_gia = self.db.get_bang_gia_hien_hanh()
+        # Lấy thông tin bảng giá của kỳ hóa đơn
+        bang_gia = self.db.get_bang_gia_theo_ky(hoa_don.thang, hoa_don.nam)
         if not bang_gia:
             QMessageBox.warning(self, "Lỗi", f"Không tìm thấy thông tin bảng giá cho hóa đơn {ma_hoa_don}.")
             return
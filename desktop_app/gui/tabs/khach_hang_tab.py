@@ -8,7 +8,6 @@ from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton,
 from PyQt6.QtCore import Qt
 from PyQt6.QtGui import QIcon, QFont, QColor
 
-import datetime
 from models.khach_hang import KhachHang
 
 # Định nghĩa các màu chủ đạo theo logo VTN
@@ -177,8 +176,8 @@ class KhachHangDialog(QDialog):
         if self.khach_hang:
             ma_khach_hang = self.khach_hang.ma_khach_hang
         else:
-            # Tạo mã khách hàng mới
-            ma_khach_hang = f"KH{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}"
+            # Mã khách hàng mới được cấp khi lưu (DatabaseHandler.tao_ma)
+            ma_khach_hang = None
         
         return {
             'ma_khach_hang': ma_khach_hang,
@@ -430,9 +429,9 @@ class KhachHangTab(QWidget):
             # Lấy dữ liệu từ dialog
             khach_hang_data = dialog.get_khach_hang_data()
             
-            # Tạo đối tượng khách hàng
+            # Tạo đối tượng khách hàng với mã mới
             khach_hang = KhachHang(
-                khach_hang_data['ma_khach_hang'],
+                self.db.tao_ma('KH'),
                 khach_hang_data['ho_ten'],
                 khach_hang_data['dia_chi'],
                 khach_hang_data['so_dien_thoai'],
@@ -811,63 +811,24 @@ class ThongKeTab(QWidget):
         ])
         
         try:
-            # Lấy danh sách tất cả các hóa đơn
-            hoa_don_list = self.db.get_all_hoa_don()
+            # Thống kê 10 khách hàng tiêu thụ nhiều nhất, đã sắp xếp theo tiêu thụ giảm dần
+            top_customers = self.db.thong_ke_top_khach_hang(10)
             
-            if not hoa_don_list:
+            if not top_customers:
                 # Hiển thị thông báo nếu không có dữ liệu
                 self.report_table.setRowCount(1)
                 self.report_table.setSpan(0, 0, 1, 5)
                 self.report_table.setItem(0, 0, QTableWidgetItem("Không có dữ liệu hóa đơn để tạo báo cáo"))
                 return
             
-            # Tạo dict để tính tổng tiêu thụ và tổng tiền cho mỗi khách hàng
-            khach_hang_stats = {}
-            
-            for hd in hoa_don_list:
-                ma_khach_hang = hd.ma_khach_hang
-                # Sử dụng thuộc tính tieu_thu hoặc dien_tieu_thu để lấy giá trị chính xác
-                tieu_thu = hd.tieu_thu
-                tong_tien = hd.so_tien if hd.so_tien else 0
-                
-                if ma_khach_hang in khach_hang_stats:
-                    khach_hang_stats[ma_khach_hang]["tieu_thu"] += tieu_thu
-                    khach_hang_stats[ma_khach_hang]["tong_tien"] += tong_tien
-                else:
-                    khach_hang = self.db.get_khach_hang(ma_khach_hang)
-                    ten_khach_hang = khach_hang.ho_ten if khach_hang else "Không xác định"
-                    khach_hang_stats[ma_khach_hang] = {
-                        "ma_khach_hang": ma_khach_hang,
-                        "ten_khach_hang": ten_khach_hang,
-                        "tieu_thu": tieu_thu,
-                        "tong_tien": tong_tien
-                    }
-            
-            if not khach_hang_stats:
-                self.report_table.setRowCount(1)
-                self.report_table.setSpan(0, 0, 1, 5)
-                self.report_table.setItem(0, 0, QTableWidgetItem("Không có dữ liệu để hiển thị"))
-                return
-            
-            # Chuyển thành list và sắp xếp theo tiêu thụ giảm dần
-            top_customers = sorted(
-                khach_hang_stats.values(),
-                key=lambda x: x["tieu_thu"],
-                reverse=True
-            )
-            
             # Thêm dữ liệu vào bảng
             for row, kh in enumerate(top_customers):
                 self.report_table.insertRow(row)
                 self.report_table.setItem(row, 0, QTableWidgetItem(str(row + 1)))
                 self.report_table.setItem(row, 1, QTableWidgetItem(kh["ma_khach_hang"]))
                 self.report_table.setItem(row, 2, QTableWidgetItem(kh["ten_khach_hang"]))
-                self.report_table.setItem(row, 3, QTableWidgetItem(f"{kh['tieu_thu']:,}"))
+                self.report_table.setItem(row, 3, QTableWidgetItem(f"{kh['tong_tieu_thu']:,}"))
                 self.report_table.setItem(row, 4, QTableWidgetItem(f"{int(kh['tong_tien']):,}"))
-                
-                # Giới hạn chỉ hiển thị 10 người dùng
-                if row >= 9:
-                    break
                     
         except Exception as e:
             print(f"Lỗi khi tạo báo cáo khách hàng: {e}")
@@ -1107,13 +1068,12 @@ class ThongKeTab(QWidget):
             # Sử dụng ReportLab để tạo PDF giống như hoa_don_pdf.py
             from reportlab.lib.pagesizes import A4
             from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
-            from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+            from reportlab.lib.styles import ParagraphStyle
             from reportlab.lib import colors
-            from reportlab.pdfbase import pdfmetrics
-            from reportlab.pdfbase.ttfonts import TTFont
             from reportlab.lib.units import mm
             from reportlab.platypus.doctemplate import PageTemplate, BaseDocTemplate
             from reportlab.platypus.frames import Frame
+            from models.pdf_registry import font_names, get_style_set, draw_page_form
             import os
             import datetime
             
@@ -1132,40 +1092,100 @@ class ThongKeTab(QWidget):
                     self.addPageTemplates([template])
                 
                 def add_page_background(self, canvas, doc):
+                    # Nền được vẽ một lần thành form XObject rồi dùng lại cho mọi trang
+                    draw_page_form(canvas, 'bao_cao_nen', self.ve_nen_trang, doc.pagesize[0], doc.pagesize[1])
+                
+                @staticmethod
+                def ve_nen_trang(canvas, width, height):
                     # Đặt màu nền xám cho toàn bộ trang
                     canvas.saveState()
                     canvas.setFillColor(VTN_GRAY)
-                    canvas.rect(0, 0, doc.pagesize[0], doc.pagesize[1], fill=1, stroke=0)
+                    canvas.rect(0, 0, width, height, fill=1, stroke=0)
                     canvas.restoreState()
             
-            # Đăng ký font Roboto
+            # Font và style được đăng ký, tạo một lần cho cả tiến trình
             base_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+            main_font, bold_font = font_names()
+            
+            def tao_styles():
+                styles = {}
             
-            # Đăng ký font Regular
-            font_regular_path = os.path.join(base_dir, 'font', 'Roboto-Regular.ttf')
-            if not os.path.exists(font_regular_path):
-                font_regular_path = os.path.join(base_dir, '..', 'font', 'Roboto-Regular.ttf')
-                if not os.path.exists(font_regular_path):
-                    font_regular_path = os.path.join(base_dir, '..', 'font', 'static', 'Roboto-Regular.ttf')
-                    if not os.path.exists(font_regular_path):
-                        print(f"Không tìm thấy font Roboto-Regular.ttf")
+                # Style cho tiêu đề - màu vàng VTN
+                styles['title_style'] = ParagraphStyle(
+                    name='Title_Style',
+                    fontName=bold_font,
+                    fontSize=14,
+                    alignment=1,
+                    spaceAfter=10,
+                    textColor=VTN_YELLOW
+                )
             
-            # Đăng ký font Bold
-            font_bold_path = os.path.join(base_dir, 'font', 'Roboto-Bold.ttf')
-            if not os.path.exists(font_bold_path):
-                font_bold_path = os.path.join(base_dir, '..', 'font', 'Roboto-Bold.ttf')
-                if not os.path.exists(font_bold_path):
-                    font_bold_path = os.path.join(base_dir, '..', 'font', 'static', 'Roboto-Bold.ttf')
-                    if not os.path.exists(font_bold_path):
-                        print(f"Không tìm thấy font Roboto-Bold.ttf")
-                        font_bold_path = font_regular_path
+                # Style cho subtitle - màu vàng VTN và căn giữa
+                styles['subtitle_style'] = ParagraphStyle(
+                    name='Subtitle_Style',
+                    fontName=main_font,
+                    fontSize=10,
+                    alignment=1,
+                    spaceAfter=10,
+                    textColor=VTN_YELLOW
+                )
             
-            # Đăng ký các font nếu tìm thấy
-            if os.path.exists(font_regular_path):
-                pdfmetrics.registerFont(TTFont('Roboto', font_regular_path))
+                # Style cho heading
+                styles['heading_style'] = ParagraphStyle(
+                    name='Heading_Style',
+                    fontName=bold_font,
+                    fontSize=11,
+                    leading=14,
+                    textColor=colors.black
+                )
+                
+                # Style cho company text đậm - màu vàng VTN
+                styles['company_style'] = ParagraphStyle(
+                    name='Company_Style',
+                    fontName=bold_font,
+                    fontSize=10,
+                    leading=14,
+                    textColor=VTN_YELLOW
+                )
+                
+                # Style cho thông tin khách hàng - màu vàng
+                styles['customer_style'] = ParagraphStyle(
+                    name='Customer_Style',
+                    fontName=bold_font,
+                    fontSize=10,
+                    leading=14,
+                    textColor=VTN_YELLOW
+                )
+                
+                # Style cho giá trị thông tin - màu đen
+                styles['value_style'] = ParagraphStyle(
+                    name='Value_Style',
+                    fontName=main_font,
+                    fontSize=10,
+                    leading=14,
+                    textColor=colors.black
+                )
+                
+                # Style cho footer
+                styles['footer_style'] = ParagraphStyle(
+                    name='Footer_Style',
+                    fontName=main_font,
+                    fontSize=8,
+                    leading=10,
+                    alignment=1,
+                    textColor=colors.black
+                )
+                
+                return styles
             
-            if os.path.exists(font_bold_path):
-                pdfmetrics.registerFont(TTFont('Roboto-Bold', font_bold_path))
+            styles = get_style_set('bao_cao_thong_ke', tao_styles)
+            title_style = styles['title_style']
+            subtitle_style = styles['subtitle_style']
+            heading_style = styles['heading_style']
+            company_style = styles['company_style']
+            customer_style = styles['customer_style']
+            value_style = styles['value_style']
+            footer_style = styles['footer_style']
             
             # Tạo document với nền màu xám
             doc = ReportPDFTemplate(file_path, pagesize=A4,
@@ -1175,79 +1195,6 @@ class ThongKeTab(QWidget):
             # Danh sách các phần tử
             elements = []
             
-            # Tạo style cho các phần văn bản
-            styles = getSampleStyleSheet()
-            
-            # Xác định font chính
-            main_font = 'Roboto' if 'Roboto' in pdfmetrics.getRegisteredFontNames() else 'Helvetica'
-            bold_font = 'Roboto-Bold' if 'Roboto-Bold' in pdfmetrics.getRegisteredFontNames() else 'Helvetica-Bold'
-            
-            # Style cho tiêu đề - màu vàng VTN
-            title_style = ParagraphStyle(
-                name='Title_Style',
-                fontName=bold_font,
-                fontSize=14,
-                alignment=1,
-                spaceAfter=10,
-                textColor=VTN_YELLOW
-            )
-            
-            # Style cho subtitle - màu vàng VTN và căn giữa
-            subtitle_style = ParagraphStyle(
-                name='Subtitle_Style',
-                fontName=main_font,
-                fontSize=10,
-                alignment=1,
-                spaceAfter=10,
-                textColor=VTN_YELLOW
-            )
-            
-            # Style cho heading
-            heading_style = ParagraphStyle(
-                name='Heading_Style',
-                fontName=bold_font,
-                fontSize=11,
-                leading=14,
-                textColor=colors.black
-            )
-            
-            # Style cho company text đậm - màu vàng VTN
-            company_style = ParagraphStyle(
-                name='Company_Style',
-                fontName=bold_font,
-                fontSize=10,
-                leading=14,
-                textColor=VTN_YELLOW
-            )
-            
-            # Style cho thông tin khách hàng - màu vàng
-            customer_style = ParagraphStyle(
-                name='Customer_Style',
-                fontName=bold_font,
-                fontSize=10,
-                leading=14,
-                textColor=VTN_YELLOW
-            )
-            
-            # Style cho giá trị thông tin - màu đen
-            value_style = ParagraphStyle(
-                name='Value_Style',
-                fontName=main_font,
-                fontSize=10,
-                leading=14,
-                textColor=colors.black
-            )
-            
-            # Style cho footer
-            footer_style = ParagraphStyle(
-                name='Footer_Style',
-                fontName=main_font,
-                fontSize=8,
-                leading=10,
-                alignment=1,
-                textColor=colors.black
-            )
-            
             # Tiêu đề báo cáo
             report_title = ""
             if self.khach_hang_tieu_thu_radio.isChecked():
@@ -6,7 +6,7 @@ import os
 from PyQt6.QtWidgets import QApplication
 from PyQt6.QtGui import QIcon
 from gui.main_window import MainWindow
-from utils.db_handler import DatabaseHandler
+from utils.sqlite_handler import open_database
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from login_form import LoginWindow
 
@@ -45,8 +45,8 @@ def main():
     # Kiểm tra trạng thái đăng nhập
     if login_handler.login_successful:
         print("Đăng nhập thành công, mở ứng dụng chính...")
-        # Khởi tạo DatabaseHandler
-        db = DatabaseHandler()
+        # Mở cơ sở dữ liệu (SQLite, tự chuyển từ JSON ở lần chạy đầu tiên)
+        db = open_database(analytics=True)
         
         # Làm tròn số tiền trong hóa đơn (loại bỏ số thập phân thừa)
         db.lam_tron_so_tien_hoa_don()
@@ -1,7 +1,52 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import array
+import bisect
+import collections
 import datetime
+import threading
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+# Giới hạn để các phép tính trên số thực 64 bit vẫn chính xác như trên số nguyên Python
+_SO_NGUYEN_CHINH_XAC = 2 ** 53
+# Giới hạn để làm tròn 2 chữ số bằng numpy cho kết quả giống round() của Python
+_GIOI_HAN_LAM_TRON = 2 ** 46
+
+# Bảng tra cứu số tiền theo số kWh nguyên: mỗi bảng có số tiền tại 0..KWH_TRA_CUU_TOI_DA
+# kWh, giữ tối đa SO_BANG_TRA_CUU_TOI_DA bảng theo mã bảng giá (dùng gần nhất được giữ lại)
+KWH_TRA_CUU_TOI_DA = 2000
+SO_BANG_TRA_CUU_TOI_DA = 16
+_BANG_TRA_CUU = collections.OrderedDict()
+_BANG_TRA_CUU_LOCK = threading.Lock()
+
+
+def cau_hinh_bang_tra_cuu(kwh_toi_da=None, so_bang_toi_da=None):
+    """
+    Cấu hình giới hạn bộ nhớ của bảng tra cứu số tiền
+    
+    Mỗi bảng tra cứu dùng 8 byte cho mỗi kWh, nên bộ nhớ tối đa khoảng
+    8 * (kwh_toi_da + 1) * so_bang_toi_da byte. Đặt một trong hai giá trị bằng 0 để tắt
+    bảng tra cứu với các bảng giá tính tiền lần đầu sau đó. Các bảng đã lập bị xóa khỏi
+    bộ nhớ đệm.
+    
+    Args:
+        kwh_toi_da (int, optional): Số kWh lớn nhất có trong bảng tra cứu
+        so_bang_toi_da (int, optional): Số bảng giá được giữ bảng tra cứu
+    """
+    global KWH_TRA_CUU_TOI_DA, SO_BANG_TRA_CUU_TOI_DA
+    with _BANG_TRA_CUU_LOCK:
+        if kwh_toi_da is not None:
+            KWH_TRA_CUU_TOI_DA = max(0, int(kwh_toi_da))
+        if so_bang_toi_da is not None:
+            SO_BANG_TRA_CUU_TOI_DA = max(0, int(so_bang_toi_da))
+        _BANG_TRA_CUU.clear()
+
 
 class BangGia:
     """
@@ -42,6 +87,13 @@ class BangGia:
         self.max_values = self._calculate_max_values()
         self.gia_values = self._calculate_gia_values()
         
+        # Cận tích lũy và tiền tích lũy của các bậc, dùng để tính tiền bằng tìm kiếm nhị phân
+        self._bac_thang_bien_dich = None
+        self._bien_dich_bac_thang()
+        
+        # Bảng tra cứu số tiền theo số kWh, lập khi tính tiền lần đầu
+        self._bang_tra_cuu = None
+        
         # Thuế VAT, mặc định 10%
         self.vat = 0.1
         
@@ -83,16 +135,237 @@ class BangGia:
         """
         return [gia for _, gia in self.bac_thang]
     
+    def _bien_dich_bac_thang(self):
+        """
+        Tính trước cận trên và tiền tích lũy (chưa VAT) tại cận của mỗi bậc thang
+        
+        Chỉ giữ các bậc mà vòng lặp trong _tinh_tien_dien_theo_bac thực sự tính tới: dừng
+        ở bậc đầu tiên có độ rộng không dương. Tiền tích lũy được cộng theo đúng thứ tự của
+        vòng lặp nên kết quả giống hệt. Không biên dịch được nếu có cận không phải số
+        nguyên (trừ vô cùng) hoặc đơn giá không phải số, khi đó luôn tính bằng vòng lặp.
+        """
+        can_tren = []
+        don_gia_bac = []
+        tien_tich_luy = [0]
+        kwh_bac_truoc = 0
+        
+        for kWh_max, don_gia in self.bac_thang:
+            if kWh_max is None:
+                kWh_max = float('inf')
+            if (not isinstance(kWh_max, int) and kWh_max != float('inf')) or not isinstance(don_gia, (int, float)):
+                self._bac_thang_bien_dich = (self.bac_thang, None)
+                return
+            
+            do_rong = kWh_max - kwh_bac_truoc
+            if do_rong <= 0:
+                break
+            
+            can_tren.append(kWh_max)
+            don_gia_bac.append(don_gia)
+            tien_tich_luy.append(tien_tich_luy[-1] + do_rong * don_gia)
+            kwh_bac_truoc = kWh_max
+        
+        self._bac_thang_bien_dich = (self.bac_thang, (can_tren, don_gia_bac, tien_tich_luy))
+    
+    def _lay_bac_thang_bien_dich(self):
+        """
+        Lấy các bậc đã biên dịch, biên dịch lại nếu bậc thang bị gán lại sau khi khởi tạo
+        
+        Returns:
+            tuple: (cận trên, đơn giá, tiền tích lũy) hoặc None nếu không biên dịch được
+        """
+        bien_dich = getattr(self, '_bac_thang_bien_dich', None)
+        if bien_dich is None or bien_dich[0] is not self.bac_thang:
+            self._bien_dich_bac_thang()
+            bien_dich = self._bac_thang_bien_dich
+        return bien_dich[1]
+    
+    def _lay_bang_tra_cuu(self):
+        """
+        Lấy bảng tra cứu số tiền (đã VAT) theo số kWh nguyên
+        
+        Bảng được lập bằng chính công thức tính tiền nên cho kết quả giống hệt, và được dùng
+        chung giữa các đối tượng cùng mã bảng giá qua bộ nhớ đệm LRU, nên mỗi nội dung bảng
+        giá chỉ phải lập một lần. Lập lại khi bậc thang hoặc VAT thay đổi.
+        
+        Returns:
+            array.array: Số tiền tại 0, 1, ..., KWH_TRA_CUU_TOI_DA kWh hoặc None nếu bảng tra
+                cứu bị tắt hoặc không dùng được cho bảng giá này
+        """
+        bang_tra_cuu = getattr(self, '_bang_tra_cuu', None)
+        if bang_tra_cuu is not None and bang_tra_cuu[0] is self.bac_thang and bang_tra_cuu[1] == self.vat:
+            return bang_tra_cuu[2]
+        
+        # Chỉ lập khi số tiền luôn là số thực (VAT số thực) để kết quả giống hệt cả kiểu dữ liệu
+        kwh_toi_da = KWH_TRA_CUU_TOI_DA
+        if kwh_toi_da <= 0 or SO_BANG_TRA_CUU_TOI_DA <= 0 or not isinstance(self.vat, float) \
+                or self._lay_bac_thang_bien_dich() is None:
+            self._bang_tra_cuu = (self.bac_thang, self.vat, None)
+            return None
+        
+        noi_dung = (tuple(tuple(bac) for bac in self.bac_thang), self.vat)
+        tra_cuu = None
+        with _BANG_TRA_CUU_LOCK:
+            muc = _BANG_TRA_CUU.get(self.ma_bang_gia)
+            if muc is not None and muc[0] == noi_dung:
+                _BANG_TRA_CUU.move_to_end(self.ma_bang_gia)
+                tra_cuu = muc[1]
+        
+        if tra_cuu is None:
+            if HAS_NUMPY:
+                so_tien = self._tinh_tien_batch_cong_thuc(np.arange(kwh_toi_da + 1)).tolist()
+            else:
+                so_tien = [self._tinh_tien_cong_thuc(so_kwh) for so_kwh in range(kwh_toi_da + 1)]
+            tra_cuu = array.array('d', so_tien)
+            
+            with _BANG_TRA_CUU_LOCK:
+                _BANG_TRA_CUU[self.ma_bang_gia] = (noi_dung, tra_cuu)
+                _BANG_TRA_CUU.move_to_end(self.ma_bang_gia)
+                while len(_BANG_TRA_CUU) > SO_BANG_TRA_CUU_TOI_DA:
+                    _BANG_TRA_CUU.popitem(last=False)
+        
+        self._bang_tra_cuu = (self.bac_thang, self.vat, tra_cuu)
+        return tra_cuu
+    
     def tinh_tien(self, so_kwh):
         """
         Tính tiền điện dựa trên số kWh tiêu thụ
         
+        Số kWh nguyên không vượt quá KWH_TRA_CUU_TOI_DA được lấy thẳng từ bảng tra cứu,
+        các giá trị khác được tính bằng công thức.
+        
         Args:
             so_kwh (int): Số kWh tiêu thụ
             
         Returns:
             float: Số tiền phải thanh toán (đã bao gồm VAT)
         """
+        if isinstance(so_kwh, int) and 0 <= so_kwh <= KWH_TRA_CUU_TOI_DA:
+            bang_tra_cuu = self._lay_bang_tra_cuu()
+            if bang_tra_cuu is not None and so_kwh < len(bang_tra_cuu):
+                return bang_tra_cuu[so_kwh]
+        return self._tinh_tien_cong_thuc(so_kwh)
+    
+    def _tinh_tien_cong_thuc(self, so_kwh):
+        """
+        Tính tiền điện bằng công thức, không dùng bảng tra cứu
+        
+        Số kWh nguyên được tính bằng tìm kiếm nhị phân trên các bậc đã biên dịch và một
+        phép nhân cộng, cho kết quả giống hệt vòng lặp qua từng bậc.
+        
+        Args:
+            so_kwh (int): Số kWh tiêu thụ
+            
+        Returns:
+            float: Số tiền phải thanh toán (đã bao gồm VAT)
+        """
+        bac_thang = self._lay_bac_thang_bien_dich()
+        if bac_thang is not None and isinstance(so_kwh, int):
+            can_tren, don_gia_bac, tien_tich_luy = bac_thang
+            if so_kwh <= 0:
+                tien_dien = 0
+            else:
+                bac = bisect.bisect_left(can_tren, so_kwh)
+                if bac == len(can_tren):
+                    # Vượt quá bậc cuối có giới hạn: phần vượt không được tính tiền
+                    tien_dien = tien_tich_luy[bac]
+                else:
+                    can_duoi = can_tren[bac - 1] if bac > 0 else 0
+                    tien_dien = tien_tich_luy[bac] + (so_kwh - can_duoi) * don_gia_bac[bac]
+        else:
+            tien_dien = self._tinh_tien_dien_theo_bac(so_kwh)
+        
+        # Tính tổng tiền sau khi thêm VAT
+        tong_tien = tien_dien * (1 + self.vat)
+        return round(tong_tien, 2)
+    
+    def tinh_tien_batch(self, kwh_array):
+        """
+        Tính tiền điện cho nhiều lượng tiêu thụ trong một lần gọi
+        
+        Dùng numpy.searchsorted trên các bậc đã biên dịch và mảng tiền tích lũy. Kết quả
+        giống hệt từng lần gọi tinh_tien sau khi làm tròn: các giá trị mà phép tính trên
+        số thực 64 bit có thể lệch (quá lớn hoặc sát điểm làm tròn) được tính lại bằng
+        Python. Khi không có numpy, bậc thang không biên dịch được hoặc số kWh không phải
+        số nguyên thì tính lần lượt bằng tinh_tien.
+        
+        Args:
+            kwh_array (iterable): Các lượng tiêu thụ (kWh)
+            
+        Returns:
+            numpy.ndarray: Số tiền phải thanh toán (đã bao gồm VAT) theo thứ tự đầu vào,
+                là list khi không có numpy
+        """
+        if not HAS_NUMPY:
+            return [self.tinh_tien(so_kwh) for so_kwh in kwh_array]
+        
+        # Mọi lượng tiêu thụ đều nằm trong bảng tra cứu: chỉ cần lấy theo chỉ số
+        so_kwh = np.asarray(kwh_array)
+        if so_kwh.ndim and so_kwh.size and so_kwh.dtype.kind in 'iu' and so_kwh.min() >= 0 \
+                and so_kwh.max() <= KWH_TRA_CUU_TOI_DA:
+            bang_tra_cuu = self._lay_bang_tra_cuu()
+            if bang_tra_cuu is not None and so_kwh.max() < len(bang_tra_cuu):
+                return np.frombuffer(bang_tra_cuu, dtype=np.float64)[so_kwh]
+        return self._tinh_tien_batch_cong_thuc(so_kwh)
+    
+    def _tinh_tien_batch_cong_thuc(self, so_kwh):
+        """
+        Tính tiền điện cho một mảng lượng tiêu thụ bằng công thức, không dùng bảng tra cứu
+        
+        Args:
+            so_kwh (numpy.ndarray): Các lượng tiêu thụ (kWh)
+            
+        Returns:
+            numpy.ndarray: Số tiền phải thanh toán (đã bao gồm VAT)
+        """
+        bac_thang = self._lay_bac_thang_bien_dich()
+        if bac_thang is None or so_kwh.dtype.kind not in 'iu':
+            return np.array([self._tinh_tien_cong_thuc(kwh) for kwh in so_kwh.tolist()], dtype=np.float64)
+        
+        can_tren, don_gia_bac, tien_tich_luy = bac_thang
+        tich_luy = np.array(tien_tich_luy, dtype=np.float64)
+        if np.any(np.abs(tich_luy[np.isfinite(tich_luy)]) >= _SO_NGUYEN_CHINH_XAC):
+            return np.array([self._tinh_tien_cong_thuc(kwh) for kwh in so_kwh.tolist()], dtype=np.float64)
+        
+        # Phần tử thứ i là cận dưới và đơn giá của bậc i; vượt quá bậc cuối có giới hạn
+        # thì phần vượt có đơn giá 0 (không được tính tiền)
+        can_duoi = np.array([0] + can_tren, dtype=np.float64)
+        don_gia = np.array(don_gia_bac + [0], dtype=np.float64)
+        
+        kwh = so_kwh.astype(np.float64)
+        bac = np.searchsorted(np.array(can_tren, dtype=np.float64), kwh, side='left')
+        tien_bac = (kwh - can_duoi[bac]) * don_gia[bac]
+        tien_dien = np.where(kwh > 0, tich_luy[bac] + tien_bac, 0.0)
+        tong_tien = tien_dien * (1 + self.vat)
+        
+        with np.errstate(invalid='ignore'):
+            ket_qua = np.rint(tong_tien * 100) / 100
+            phan_le = tong_tien * 100 - np.floor(tong_tien * 100)
+            sat_diem_lam_tron = np.abs(phan_le - 0.5) <= 4 * np.spacing(tong_tien * 100)
+        
+        # Các giá trị số thực 64 bit không biểu diễn chính xác: tính lại từ đầu
+        tinh_lai = (np.abs(so_kwh) >= _SO_NGUYEN_CHINH_XAC) | ~np.isfinite(tien_dien) \
+            | (np.abs(tien_bac) >= _SO_NGUYEN_CHINH_XAC) | (np.abs(tien_dien) >= _SO_NGUYEN_CHINH_XAC)
+        for i in np.flatnonzero(tinh_lai).tolist():
+            ket_qua[i] = self._tinh_tien_cong_thuc(so_kwh[i].item())
+        
+        # Sát điểm làm tròn hoặc quá lớn: làm tròn bằng round() như tinh_tien
+        lam_tron_lai = ~tinh_lai & (sat_diem_lam_tron | ~(np.abs(tong_tien) < _GIOI_HAN_LAM_TRON))
+        for i in np.flatnonzero(lam_tron_lai).tolist():
+            ket_qua[i] = round(tong_tien[i].item(), 2)
+        
+        return ket_qua
+    
+    def _tinh_tien_dien_theo_bac(self, so_kwh):
+        """
+        Tính tiền điện chưa VAT bằng cách duyệt lần lượt từng bậc thang
+        
+        Args:
+            so_kwh (int): Số kWh tiêu thụ
+            
+        Returns:
+            float: Số tiền chưa bao gồm VAT
+        """
         tien_dien = 0
         kwh_con_lai = so_kwh
         bac_hien_tai = 0
@@ -123,9 +396,7 @@ class BangGia:
             if kwh_con_lai <= 0:
                 break
         
-        # Tính tổng tiền sau khi thêm VAT
-        tong_tien = tien_dien * (1 + self.vat)
-        return round(tong_tien, 2)
+        return tien_dien
     
     def to_dict(self):
         """
@@ -85,6 +85,69 @@ class HoaDon:
         
         return self.so_tien
     
+    def tinh_tien_chia_theo_ngay(self, cac_bang_gia):
+        """
+        Tính tiền điện khi bảng giá thay đổi trong kỳ, chia theo số ngày áp dụng
+        
+        Lượng tiêu thụ và định mức các bậc được chia cho từng bảng giá theo tỷ lệ số ngày
+        áp dụng trong kỳ. Khi cùng nhân lượng tiêu thụ và định mức với một hệ số thì tiền
+        điện theo bậc cũng nhân với hệ số đó, nên tiền của mỗi phần bằng tiền cả kỳ theo
+        bảng giá đó nhân với tỷ lệ số ngày.
+        
+        Args:
+            cac_bang_gia (list): Các cặp (bảng giá, số ngày áp dụng trong kỳ)
+            
+        Returns:
+            float: Số tiền phải thanh toán
+        """
+        if len(cac_bang_gia) == 1:
+            return self.tinh_tien(cac_bang_gia[0][0])
+        
+        tong_so_ngay = sum(so_ngay for _, so_ngay in cac_bang_gia)
+        tien_tam_tinh = sum(bang_gia.tinh_tien(self.tieu_thu) * so_ngay
+                            for bang_gia, so_ngay in cac_bang_gia) / tong_so_ngay
+        
+        self.so_tien = round(tien_tam_tinh)
+        return self.so_tien
+    
+    @staticmethod
+    def tinh_tien_hang_loat(hoa_don_list, bang_gia):
+        """
+        Tính tiền cho nhiều hóa đơn theo cùng một bảng giá bằng BangGia.tinh_tien_batch
+        
+        Kết quả giống hệt gọi tinh_tien cho từng hóa đơn.
+        
+        Args:
+            hoa_don_list (list): Các hóa đơn cần tính tiền, so_tien được cập nhật trực tiếp
+            bang_gia (BangGia): Đối tượng bảng giá điện
+            
+        Returns:
+            list: Số tiền phải thanh toán của từng hóa đơn
+        """
+        hoa_don_list = list(hoa_don_list)
+        so_tien_list = HoaDon.so_tien_hang_loat(hoa_don_list, bang_gia)
+        
+        for hoa_don, so_tien in zip(hoa_don_list, so_tien_list):
+            hoa_don.so_tien = so_tien
+        return so_tien_list
+    
+    @staticmethod
+    def so_tien_hang_loat(hoa_don_list, bang_gia):
+        """
+        Tính số tiền của nhiều hóa đơn theo cùng một bảng giá mà không thay đổi hóa đơn
+        
+        Args:
+            hoa_don_list (iterable): Các hóa đơn cần tính tiền
+            bang_gia (BangGia): Đối tượng bảng giá điện
+            
+        Returns:
+            list: Số tiền (đã làm tròn thành số nguyên) của từng hóa đơn
+        """
+        so_tien_list = bang_gia.tinh_tien_batch([hd.tieu_thu for hd in hoa_don_list])
+        if not isinstance(so_tien_list, list):
+            so_tien_list = so_tien_list.tolist()
+        return [round(so_tien) for so_tien in so_tien_list]
+    
     def to_dict(self):
         """
         Chuyển đổi đối tượng thành dictionary để lưu trữ
@@ -8,22 +8,24 @@ import locale
 from num2words import num2words
 import random
 import hashlib
-import urllib.parse
-import urllib.request
+import time
 from io import BytesIO
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import groupby
 
 from reportlab.lib.pagesizes import A4
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image, Flowable
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image, Flowable, PageBreak
 from reportlab.lib import colors
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.lib.units import mm
 from reportlab.platypus.doctemplate import PageTemplate, BaseDocTemplate
 from reportlab.platypus.frames import Frame
 from reportlab.lib.enums import TA_CENTER, TA_RIGHT, TA_LEFT
 from reportlab.graphics.shapes import Drawing, Line, Rect, String
 from reportlab.graphics.barcode import qr
+from models.pdf_registry import register_fonts, get_style_set, draw_page_form
+from utils.pdf_cache import content_hash, get_pdf_cache, user_cache_dir
 
 # Đặt locale cho tiếng Việt
 try:
@@ -72,9 +74,20 @@ class PaidStamp(Flowable):
         # Phục hồi trạng thái
         self.canv.restoreState()
 
+# Lề trang hóa đơn (point)
+PAGE_MARGINS = dict(rightMargin=25, leftMargin=25, topMargin=45, bottomMargin=40)
+
+# Phiên bản bố cục hóa đơn, tăng khi đổi bố cục để PDF trong bộ nhớ đệm không còn được dùng
+PDF_LAYOUT_VERSION = "desktop_app:1"
+
+# Thư mục bộ nhớ đệm PDF hóa đơn, nằm trong thư mục cache của người dùng
+PDF_CACHE_DIR = user_cache_dir('hoa_don_pdf')
+
 # Tạo class DocTemplate tùy chỉnh để thêm màu nền và trang trí
 class HoaDonPDFTemplate(BaseDocTemplate):
-    def __init__(self, filename, **kw):
+    def __init__(self, filename, ngay_in=None, **kw):
+        # Ngày in ở góc trên phải mỗi trang, None là ngày tạo PDF
+        self.ngay_in = ngay_in
         self.allowSplitting = 0
         BaseDocTemplate.__init__(self, filename, **kw)
         template = PageTemplate('normal', [Frame(
@@ -85,226 +98,343 @@ class HoaDonPDFTemplate(BaseDocTemplate):
     def add_page_design(self, canvas, doc):
         width, height = doc.pagesize
         
-        # Đặt màu nền tối cho toàn bộ trang
-        canvas.saveState()
-        canvas.setFillColor(VTN_DARK_BG)
-        canvas.rect(0, 0, width, height, fill=1, stroke=0)
-        
-        # Tạo viền màu vàng cam ở trên với bo góc
-        canvas.setFillColor(VTN_ORANGE)
-        # Vẽ hình chữ nhật bo góc bên phải
-        radius = 15
-        canvas.roundRect(0, height-35, width, 35, radius, fill=1, stroke=0)
-        
-        # Tạo viền màu vàng ở dưới với bo góc
-        canvas.setFillColor(VTN_YELLOW)
-        canvas.roundRect(0, 0, width, 12, radius, fill=1, stroke=0)
+        # Phần trang trí tĩnh được vẽ một lần thành form XObject rồi dùng lại cho mọi trang
+        draw_page_form(canvas, 'hoa_don_nen', ve_nen_trang, width, height)
         
         # Thêm ngày tháng ở góc trên phải
+        canvas.saveState()
         canvas.setFillColor(colors.white)
         canvas.setFont("Roboto", 9)
         
         # Format ngày tháng
-        today = datetime.datetime.now().strftime("%d/%m/%Y")
+        today = (doc.ngay_in or datetime.date.today()).strftime("%d/%m/%Y")
         canvas.drawRightString(width-25, height-22, f"Ngày: {today}")
+        canvas.restoreState()
         
-        # Thêm watermark mờ
+
+@lru_cache(maxsize=None)
+def _vi_tri_watermark(width, height):
+    """Chọn vị trí và góc xoay của watermark, cố định theo khổ trang ở mọi tiến trình"""
+    rng = random.Random(f"{int(width)}x{int(height)}")
+    return [(rng.randint(50, int(width)-50), rng.randint(50, int(height)-50), rng.randint(0, 359))
+            for i in range(5)]
+
+
+def ve_nen_trang(canvas, width, height):
+    """Vẽ phần tĩnh của trang hóa đơn: nền tối, viền trên dưới, watermark và footer"""
+    # Đặt màu nền tối cho toàn bộ trang
+    canvas.saveState()
+    canvas.setFillColor(VTN_DARK_BG)
+    canvas.rect(0, 0, width, height, fill=1, stroke=0)
+    
+    # Tạo viền màu vàng cam ở trên với bo góc
+    canvas.setFillColor(VTN_ORANGE)
+    # Vẽ hình chữ nhật bo góc bên phải
+    radius = 15
+    canvas.roundRect(0, height-35, width, 35, radius, fill=1, stroke=0)
+    
+    # Tạo viền màu vàng ở dưới với bo góc
+    canvas.setFillColor(VTN_YELLOW)
+    canvas.roundRect(0, 0, width, 12, radius, fill=1, stroke=0)
+    
+    # Thêm watermark mờ
+    canvas.saveState()
+    canvas.setFont("Roboto-Bold", 50)
+    canvas.setFillColor(VTN_LIGHT_YELLOW)
+    canvas.setFillAlpha(0.03)  # Làm mờ hơn
+    
+    # Tạo watermark hình thức phức tạp hơn
+    for x_pos, y_pos, rotation in _vi_tri_watermark(width, height):
         canvas.saveState()
-        canvas.setFont("Roboto-Bold", 50)
-        canvas.setFillColor(VTN_LIGHT_YELLOW)
-        canvas.setFillAlpha(0.03)  # Làm mờ hơn
-        
-        # Tạo watermark hình thức phức tạp hơn
-        for i in range(5):
-            x_pos = random.randint(50, int(width)-50)
-            y_pos = random.randint(50, int(height)-50)
-            rotation = random.randint(0, 359)
-            
-            canvas.saveState()
-            canvas.translate(x_pos, y_pos)
-            canvas.rotate(rotation)
-            canvas.drawCentredString(0, 0, "VTN VIP")
-            canvas.restoreState()
-        
+        canvas.translate(x_pos, y_pos)
+        canvas.rotate(rotation)
+        canvas.drawCentredString(0, 0, "VTN VIP")
         canvas.restoreState()
-        
-        # Thêm footer hiện đại
+
+    canvas.restoreState()
+    
+    # Thêm footer hiện đại
+    canvas.saveState()
+    canvas.setFillColor(colors.Color(0.15, 0.15, 0.15, 1))
+    canvas.roundRect(width/2 - 220, 15, 440, 25, 10, fill=1, stroke=0)
+    
+    canvas.setFont("Roboto", 8)
+    canvas.setFillColor(colors.white)
+    canvas.drawCentredString(width/2, 27, "Cảm ơn quý khách đã sử dụng dịch vụ | Hotline: 19009000")
+    
+    canvas.restoreState()
+    canvas.restoreState()
+
+
+# ===== MÃ QR THANH TOÁN VIETQR =====
+# Tài khoản nhận thanh toán: MB Bank (BIN 970422)
+VIETQR_BANK_BIN = "970422"
+VIETQR_ACCOUNT = "9728102006"
+
+# Kích thước mã QR trên hóa đơn (point)
+VIETQR_SIZE = 150
+
+
+def _tlv(tag, value):
+    """Tạo một trường EMVCo dạng ID - độ dài - giá trị"""
+    return f"{tag}{len(value):02d}{value}"
+
+
+def crc16_ccitt(data):
+    """
+    Tính CRC16-CCITT (đa thức 0x1021, giá trị đầu 0xFFFF) theo chuẩn EMVCo
+    
+    Args:
+        data (str): Chuỗi cần tính
+    
+    Returns:
+        str: CRC dạng 4 ký tự hexa viết hoa
+    """
+    crc = 0xFFFF
+    for byte in data.encode('utf-8'):
+        crc ^= byte << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021) if crc & 0x8000 else (crc << 1)
+            crc &= 0xFFFF
+    return f"{crc:04X}"
+
+
+def tao_noi_dung_viet_qr(ma_hoa_don, amount, bank_bin=VIETQR_BANK_BIN, so_tai_khoan=VIETQR_ACCOUNT):
+    """
+    Tạo nội dung mã QR chuyển khoản theo chuẩn EMVCo/VietQR (NAPAS)
+    
+    Args:
+        ma_hoa_don (str): Mã hóa đơn, dùng làm nội dung chuyển khoản
+        amount (int): Số tiền cần thanh toán, 0 để người trả tự nhập
+        bank_bin (str): Mã BIN của ngân hàng nhận
+        so_tai_khoan (str): Số tài khoản nhận
+    
+    Returns:
+        str: Nội dung mã QR, kết thúc bằng CRC16
+    """
+    amount = int(amount or 0)
+    thong_tin_tai_khoan = (_tlv("00", "A000000727")
+                           + _tlv("01", _tlv("00", bank_bin) + _tlv("01", so_tai_khoan))
+                           + _tlv("02", "QRIBFTTA"))
+    payload = (_tlv("00", "01")
+               + _tlv("01", "12" if amount > 0 else "11")
+               + _tlv("38", thong_tin_tai_khoan)
+               + _tlv("53", "704")
+               + (_tlv("54", str(amount)) if amount > 0 else "")
+               + _tlv("58", "VN")
+               + _tlv("62", _tlv("08", f"Thanh toan hoa don {ma_hoa_don}")))
+    payload += "6304"
+    return payload + crc16_ccitt(payload)
+
+
+class VietQRCode(Flowable):
+    """Mã QR vẽ trực tiếp lên canvas, mỗi đoạn ô đen liên tiếp trên một hàng là một hình chữ nhật"""
+    
+    def __init__(self, cac_doan, so_o, size=VIETQR_SIZE, border=4):
+        """
+        Args:
+            cac_doan (tuple): Các đoạn ô đen (hàng, cột bắt đầu, số ô)
+            so_o (int): Số ô trên mỗi cạnh của mã QR
+            size (float): Kích thước mã QR (point)
+            border (int): Số ô lề trắng quanh mã QR
+        """
+        Flowable.__init__(self)
+        self.cac_doan = cac_doan
+        self.so_o = so_o
+        self.border = border
+        self.width = self.height = size
+    
+    def draw(self):
+        canvas = self.canv
         canvas.saveState()
-        canvas.setFillColor(colors.Color(0.15, 0.15, 0.15, 1))
-        canvas.roundRect(width/2 - 220, 15, 440, 25, 10, fill=1, stroke=0)
-        
-        canvas.setFont("Roboto", 8)
-        canvas.setFillColor(colors.white)
-        canvas.drawCentredString(width/2, 27, "Cảm ơn quý khách đã sử dụng dịch vụ | Hotline: 19009000")
-        
+        # Vẽ theo đơn vị ô để tọa độ là số nguyên, nội dung trang nhỏ hơn
+        scale = self.width / (self.so_o + 2 * self.border)
+        canvas.scale(scale, scale)
+        canvas.setFillColor(colors.black)
+        path = canvas.beginPath()
+        for hang, cot, so_o in self.cac_doan:
+            path.rect(cot + self.border, self.so_o + self.border - hang - 1, so_o, 1)
+        canvas.drawPath(path, fill=1, stroke=0)
         canvas.restoreState()
 
 
+@lru_cache(maxsize=256)
+def _ma_tran_viet_qr(ma_hoa_don, amount):
+    """Tính các đoạn ô đen của mã QR VietQR, kết quả được giữ lại theo (mã hóa đơn, số tiền)"""
+    widget = qr.QrCodeWidget(tao_noi_dung_viet_qr(ma_hoa_don, amount), barLevel='M')
+    widget.qr.make()
+    
+    # Gộp các ô đen liên tiếp trên từng hàng thành một đoạn
+    cac_doan = []
+    for hang, o_trong_hang in enumerate(widget.qr.modules):
+        cot = 0
+        for den, nhom in groupby(o_trong_hang, key=bool):
+            so_o = len(list(nhom))
+            if den:
+                cac_doan.append((hang, cot, so_o))
+            cot += so_o
+    return tuple(cac_doan), widget.qr.getModuleCount(), widget.barBorder
+
 
-# Thay đổi hàm tạo QR để sử dụng VietQR
 def create_viet_qr(ma_hoa_don, amount):
-    """Tạo mã QR sử dụng VietQR API"""
+    """Tạo mã QR thanh toán VietQR ngay trên máy, không cần kết nối mạng"""
     try:
-        # Định dạng thông tin thanh toán
-        addInfo = f"Thanh toan hoa don {ma_hoa_don}"
-        accountName = "Cong Ty Dien Luc VTN VIP"
-        
-        # URL encode các tham số
-        encoded_info = urllib.parse.quote(addInfo)
-        encoded_name = urllib.parse.quote(accountName)
-        
-        # Tạo URL đến VietQR API
-        url = f"https://img.vietqr.io/image/mbbank-9728102006-compact2.jpg?amount={int(amount)}&addInfo={encoded_info}&accountName={encoded_name}"
-        
-        # Tải hình ảnh từ URL
-        img_data = urllib.request.urlopen(url).read()
-        img_file = BytesIO(img_data)
-        
-        # Trả về đối tượng Image của ReportLab
-        return Image(img_file, width=150, height=150)
+        # Mỗi tài liệu cần một flowable riêng, chỉ dữ liệu mã QR được dùng lại
+        cac_doan, so_o, border = _ma_tran_viet_qr(str(ma_hoa_don), int(amount or 0))
+        return VietQRCode(cac_doan, so_o, border=border)
     except Exception as e:
         print(f"Lỗi khi tạo mã QR VietQR: {e}")
-        # Sử dụng QR thông thường nếu có lỗi xảy ra
+
+
+def _tao_styles():
+    """Tạo các style của hóa đơn - màu sáng trên nền tối"""
+    styles = {'styles': getSampleStyleSheet()}
+    
+    # Style cho tiêu đề chính - màu trắng
+    styles['title_style'] = ParagraphStyle(
+        name='Title_Style',
+        fontName='Roboto-Bold',
+        fontSize=16,
+        alignment=TA_CENTER,
+        spaceAfter=10,
+        textColor=VTN_ORANGE
+    )
+    
+    # Style cho subtitle
+    styles['subtitle_style'] = ParagraphStyle(
+        name='Subtitle_Style',
+        fontName='Roboto',
+        fontSize=10,
+        alignment=TA_CENTER,
+        spaceAfter=10,
+        textColor=colors.white
+    )
+    
+    # Style cho heading chính
+    styles['heading_style'] = ParagraphStyle(
+        name='Heading_Style',
+        fontName='Roboto-Bold',
+        fontSize=12,
+        leading=16,
+        textColor=VTN_YELLOW,
+        spaceBefore=15,
+        spaceAfter=10
+    )
+    
+    # Style cho company text
+    styles['company_style'] = ParagraphStyle(
+        name='Company_Style',
+        fontName='Roboto-Bold',
+        fontSize=11,
+        leading=16,
+        textColor=VTN_ORANGE
+    )
+    
+    # Style cho tiêu đề thông tin khách hàng 
+    styles['customer_label_style'] = ParagraphStyle(
+        name='Customer_Label_Style',
+        fontName='Roboto-Bold',
+        fontSize=10,
+        leading=14,
+        textColor=colors.white
+    )
+    
+    # Style cho giá trị thông tin
+    styles['value_style'] = ParagraphStyle(
+        name='Value_Style',
+        fontName='Roboto',
+        fontSize=10,
+        leading=14,
+        textColor=colors.white
+    )
+    
+    # Style cho tổng tiền
+    styles['summary_style'] = ParagraphStyle(
+        name='Summary_Style',
+        fontName='Roboto-Bold',
+        fontSize=14,
+        leading=16,
+        alignment=TA_RIGHT,
+        textColor=VTN_ORANGE
+    )
+    
+    # Style cho thông tin hóa đơn
+    styles['invoice_info_style'] = ParagraphStyle(
+        name='Invoice_Info',
+        fontName='Roboto',
+        fontSize=9,
+        leading=12,
+        textColor=colors.white
+    )
+    
+    # Style cho mã hóa đơn
+    styles['invoice_code_style'] = ParagraphStyle(
+        name='Invoice_Code',
+        fontName='Roboto-Bold',
+        fontSize=12,
+        leading=14,
+        textColor=VTN_YELLOW
+    )
+    
+    # Style cho nhãn và giá trị trong bảng thông tin khách hàng
+    styles['label_style'] = ParagraphStyle(
+        name='Label_Style',
+        fontName='Roboto-Bold',
+        fontSize=9,
+        leading=12,
+        textColor=VTN_YELLOW
+    )
+    
+    styles['customer_value_style'] = ParagraphStyle(
+        name='Value_Style',
+        fontName='Roboto',
+        fontSize=10,
+        leading=12,
+        textColor=colors.white
+    )
+    
+    # Style cho trạng thái thanh toán
+    styles['payment_style'] = ParagraphStyle(
+        'PaymentStyle', parent=styles['value_style'],
+        fontSize=14, alignment=TA_CENTER, fontName='Roboto-Bold'
+    )
+    
+    styles['trang_thai_style'] = ParagraphStyle(
+        name='TrangThai_Style',
+        fontName='Roboto-Bold',
+        fontSize=14,
+        leading=16,
+        textColor='red',
+        alignment=TA_CENTER,
+        spaceBefore=15
+    )
+    
+    # Style cho lưu ý cuối hóa đơn
+    styles['note_style'] = ParagraphStyle(
+        name='Note_Style',
+        fontName='Roboto',
+        fontSize=9,
+        textColor=colors.lightgrey,
+        alignment=TA_LEFT
+    )
+    
+    return styles
 
 
 class HoaDonPDF:
+    """
+    Bộ tạo PDF hóa đơn điện
+    
+    Font và style được đăng ký, tạo một lần cho cả tiến trình (models.pdf_registry) nên
+    việc tạo thêm đối tượng không tốn chi phí; dùng get_renderer để lấy bộ tạo dùng chung.
+    """
+    
     def __init__(self):
         # Đăng ký font Roboto hỗ trợ tiếng Việt
-        base_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        register_fonts()
         
-        # Tìm font Roboto trong các vị trí có thể
-        font_paths = [
-            # Tìm trong thư mục font
-            os.path.join(base_dir, 'font', 'Roboto-Regular.ttf'),
-            os.path.join(base_dir, 'font', 'static', 'Roboto-Regular.ttf'),
-            os.path.join(base_dir, 'desktop_app', 'font', 'Roboto-Regular.ttf'),
-            os.path.join(base_dir, 'desktop_app', 'font', 'static', 'Roboto-Regular.ttf'),
-            # Tìm trong thư mục assets
-            os.path.join(base_dir, 'assets', 'fonts', 'Roboto-Regular.ttf'),
-            os.path.join(base_dir, 'desktop_app', 'assets', 'fonts', 'Roboto-Regular.ttf'),
-        ]
-        
-        font_regular_path = None
-        for path in font_paths:
-            if os.path.exists(path):
-                font_regular_path = path
-                break
-                
-        if not font_regular_path:
-            print("Không tìm thấy font Roboto Regular")
-            return
-            
-        # Tìm font Roboto Bold
-        bold_font_paths = [
-            # Thay Regular bằng Bold trong đường dẫn đã tìm được
-            path.replace('Regular', 'Bold') for path in font_paths
-        ]
-        
-        font_bold_path = None
-        for path in bold_font_paths:
-            if os.path.exists(path):
-                font_bold_path = path
-                break
-                
-        if not font_bold_path:
-            print("Không tìm thấy font Roboto Bold, sử dụng Regular")
-            font_bold_path = font_regular_path
-        
-        # Đăng ký các font
-        try:
-            pdfmetrics.registerFont(TTFont('Roboto', font_regular_path))
-            pdfmetrics.registerFont(TTFont('Roboto-Bold', font_bold_path))
-        except Exception as e:
-            print(f"Lỗi khi đăng ký font: {e}")
-        
-        # Tạo style cho các phần văn bản - màu sáng trên nền tối
-        self.styles = getSampleStyleSheet()
-        
-        # Style cho tiêu đề chính - màu trắng
-        self.title_style = ParagraphStyle(
-            name='Title_Style',
-            fontName='Roboto-Bold',
-            fontSize=16,
-            alignment=TA_CENTER,
-            spaceAfter=10,
-            textColor=VTN_ORANGE
-        )
-        
-        # Style cho subtitle
-        self.subtitle_style = ParagraphStyle(
-            name='Subtitle_Style',
-            fontName='Roboto',
-            fontSize=10,
-            alignment=TA_CENTER,
-            spaceAfter=10,
-            textColor=colors.white
-        )
-        
-        # Style cho heading chính
-        self.heading_style = ParagraphStyle(
-            name='Heading_Style',
-            fontName='Roboto-Bold',
-            fontSize=12,
-            leading=16,
-            textColor=VTN_YELLOW,
-            spaceBefore=15,
-            spaceAfter=10
-        )
-        
-        # Style cho company text
-        self.company_style = ParagraphStyle(
-            name='Company_Style',
-            fontName='Roboto-Bold',
-            fontSize=11,
-            leading=16,
-            textColor=VTN_ORANGE
-        )
-        
-        # Style cho tiêu đề thông tin khách hàng 
-        self.customer_label_style = ParagraphStyle(
-            name='Customer_Label_Style',
-            fontName='Roboto-Bold',
-            fontSize=10,
-            leading=14,
-            textColor=colors.white
-        )
-        
-        # Style cho giá trị thông tin
-        self.value_style = ParagraphStyle(
-            name='Value_Style',
-            fontName='Roboto',
-            fontSize=10,
-            leading=14,
-            textColor=colors.white
-        )
-        
-        # Style cho tổng tiền
-        self.summary_style = ParagraphStyle(
-            name='Summary_Style',
-            fontName='Roboto-Bold',
-            fontSize=14,
-            leading=16,
-            alignment=TA_RIGHT,
-            textColor=VTN_ORANGE
-        )
-        
-        # Style cho thông tin hóa đơn
-        self.invoice_info_style = ParagraphStyle(
-            name='Invoice_Info',
-            fontName='Roboto',
-            fontSize=9,
-            leading=12,
-            textColor=colors.white
-        )
-        
-        # Style cho mã hóa đơn
-        self.invoice_code_style = ParagraphStyle(
-            name='Invoice_Code',
-            fontName='Roboto-Bold',
-            fontSize=12,
-            leading=14,
-            textColor=VTN_YELLOW
-        )
+        # Style dùng chung, không sửa trên từng đối tượng
+        vars(self).update(get_style_set('hoa_don', _tao_styles))
     
     def doc_so_thanh_chu(self, number):
         """Chuyển đổi số thành chữ tiếng Việt"""
@@ -331,25 +461,39 @@ class HoaDonPDF:
             except:
                 return "Không đồng"
                 
-    def tao_hoa_don(self, hoa_don, khach_hang, bang_gia, output_dir="exports"):
+    def tao_hoa_don(self, hoa_don, khach_hang, bang_gia, output_dir="exports", ngay_in=None):
         """Tạo file PDF hóa đơn điện - phiên bản chuyên nghiệp"""
         # Kiểm tra dữ liệu đầu vào
         if hoa_don is None or khach_hang is None or bang_gia is None:
             print("Dữ liệu đầu vào không hợp lệ")
             return None
             
-        # Đảm bảo các thuộc tính của hóa đơn không bị None
-        ma_hoa_don = getattr(hoa_don, 'ma_hoa_don', 'N/A')
-        thang = getattr(hoa_don, 'thang', 'N/A')
-        nam = getattr(hoa_don, 'nam', 'N/A')
-        da_thanh_toan = getattr(hoa_don, 'da_thanh_toan', False)
-        chi_so_dau = getattr(hoa_don, 'chi_so_dau', 0)
-        chi_so_cuoi = getattr(hoa_don, 'chi_so_cuoi', 0)
+        file_name = self.duong_dan_file(hoa_don, output_dir)
         
-        # Tính lượng tiêu thụ
-        tieu_thu = getattr(hoa_don, 'tieu_thu', None)
-        if tieu_thu is None:
-            tieu_thu = chi_so_cuoi - chi_so_dau
+        print(f"Đang tạo file PDF tại: {file_name}")
+        
+        # Tạo PDF (hoặc lấy từ bộ nhớ đệm) rồi ghi ra file
+        try:
+            data = self.render_bytes(hoa_don, khach_hang, bang_gia, ngay_in=ngay_in)
+            with open(file_name, 'wb') as f:
+                f.write(data)
+            return file_name
+        except Exception as e:
+            print(f"Lỗi khi tạo file PDF: {e}")
+            return None
+    
+    def duong_dan_file(self, hoa_don, output_dir="exports"):
+        """
+        Tính đường dẫn file PDF của một hóa đơn, tạo thư mục lưu nếu chưa có
+        
+        Args:
+            hoa_don (HoaDon): Hóa đơn
+            output_dir (str): Thư mục lưu, tính từ thư mục gốc của dự án
+        
+        Returns:
+            str: Đường dẫn đầy đủ của file PDF
+        """
+        ma_hoa_don = getattr(hoa_don, 'ma_hoa_don', 'N/A')
         
         # Đảm bảo thư mục lưu tồn tại
         base_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -363,13 +507,93 @@ class HoaDonPDF:
             output_dir_full = os.path.dirname(os.path.abspath(__file__))
         
         # Tạo tên file với đường dẫn đầy đủ
-        file_name = os.path.join(output_dir_full, f"hoa_don_{ma_hoa_don}.pdf")
+        return os.path.join(output_dir_full, f"hoa_don_{ma_hoa_don}.pdf")
+    
+    def cache_key(self, hoa_don, khach_hang, bang_gia, ngay_in=None):
+        """
+        Tính khóa nội dung của PDF hóa đơn
         
-        print(f"Đang tạo file PDF tại: {file_name}")
+        Khóa gồm dữ liệu hóa đơn, khách hàng, bảng giá (mã, ngày áp dụng, bậc thang, VAT)
+        và phiên bản bố cục, nên thay đổi bất kỳ phần nào cũng tạo ra khóa mới. Ngày xuất
+        chỉ nằm trong khóa khi được truyền vào; khi không truyền, in lại hóa đơn không đổi
+        trả về đúng bản PDF đã xuất lần đầu (kèm ngày xuất của lần đó).
+        
+        Args:
+            hoa_don (HoaDon): Hóa đơn
+            khach_hang (KhachHang): Khách hàng của hóa đơn
+            bang_gia (BangGia): Bảng giá của kỳ hóa đơn
+            ngay_in (datetime.date, optional): Ngày xuất in trên hóa đơn
+        
+        Returns:
+            str: Mã băm SHA-256
+        """
+        return content_hash(PDF_LAYOUT_VERSION, hoa_don.to_dict(), khach_hang.to_dict(), bang_gia.to_dict(),
+                            ngay_in.isoformat() if ngay_in else None)
+    
+    def render_bytes(self, hoa_don, khach_hang, bang_gia, use_cache=True, ngay_in=None):
+        """
+        Tạo PDF hóa đơn trong bộ nhớ, không ghi file
+        
+        Hóa đơn không thay đổi được lấy từ bộ nhớ đệm PDF (PDF_CACHE_DIR) thay vì tạo lại.
+        
+        Args:
+            hoa_don (HoaDon): Hóa đơn
+            khach_hang (KhachHang): Khách hàng của hóa đơn
+            bang_gia (BangGia): Bảng giá của kỳ hóa đơn
+            use_cache (bool): Dùng bộ nhớ đệm PDF
+            ngay_in (datetime.date, optional): Ngày xuất in trên hóa đơn, mặc định là ngày
+                tạo PDF
+        
+        Returns:
+            bytes: Nội dung file PDF
+        """
+        if hoa_don is None or khach_hang is None or bang_gia is None:
+            raise ValueError("Dữ liệu đầu vào không hợp lệ")
+        
+        if use_cache:
+            cache = get_pdf_cache(PDF_CACHE_DIR)
+            key = self.cache_key(hoa_don, khach_hang, bang_gia, ngay_in)
+            data = cache.get(key)
+            if data is not None:
+                return data
         
-        # Khởi tạo các biến và tài liệu PDF
+        buffer = BytesIO()
+        doc = HoaDonPDFTemplate(buffer, pagesize=A4, ngay_in=ngay_in, **PAGE_MARGINS)
+        doc.build(self.tao_noi_dung(hoa_don, khach_hang, bang_gia, ngay_in))
+        data = buffer.getvalue()
+        
+        if use_cache:
+            cache.put(key, data)
+        return data
+    
+    def tao_noi_dung(self, hoa_don, khach_hang, bang_gia, ngay_in=None):
+        """
+        Tạo các phần tử (flowable) của một hóa đơn, dùng chung cho file PDF riêng và file gộp
+        
+        Args:
+            hoa_don (HoaDon): Hóa đơn
+            khach_hang (KhachHang): Khách hàng của hóa đơn
+            bang_gia (BangGia): Bảng giá của kỳ hóa đơn
+            ngay_in (datetime.date, optional): Ngày xuất in trên hóa đơn, mặc định là hôm nay
+        
+        Returns:
+            list: Các phần tử của hóa đơn cho trang A4 với lề PAGE_MARGINS
+        """
+        # Đảm bảo các thuộc tính của hóa đơn không bị None
+        ma_hoa_don = getattr(hoa_don, 'ma_hoa_don', 'N/A')
+        thang = getattr(hoa_don, 'thang', 'N/A')
+        nam = getattr(hoa_don, 'nam', 'N/A')
+        da_thanh_toan = getattr(hoa_don, 'da_thanh_toan', False)
+        chi_so_dau = getattr(hoa_don, 'chi_so_dau', 0)
+        chi_so_cuoi = getattr(hoa_don, 'chi_so_cuoi', 0)
+        
+        # Tính lượng tiêu thụ
+        tieu_thu = getattr(hoa_don, 'tieu_thu', None)
+        if tieu_thu is None:
+            tieu_thu = chi_so_cuoi - chi_so_dau
+        
+        base_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
         elements = []
-        doc = HoaDonPDFTemplate(file_name, pagesize=A4, rightMargin=25, leftMargin=25, topMargin=45, bottomMargin=40)
         
         # Tìm đường dẫn logo
         logo_path = None
@@ -444,23 +668,9 @@ class HoaDonPDF:
         
         # === Thiết kế riêng phần khách hàng và QR code ===
         # Thông tin khách hàng - thiết kế đẹp mắt hơn
-        # Tạo style riêng cho nhãn và giá trị
-        label_style = ParagraphStyle(
-            name='Label_Style',
-            fontName='Roboto-Bold',
-            fontSize=9,
-            leading=12,
-            textColor=VTN_YELLOW
-        )
-
-        value_style = ParagraphStyle(
-            name='Value_Style',
-            fontName='Roboto',
-            fontSize=10,
-            leading=12,
-            textColor=colors.white
-        )
-
+        label_style = self.label_style
+        value_style = self.customer_value_style
+        
         # Tạo bảng thông tin khách hàng với thiết kế mới đẹp mắt hơn
         customer_header = Table([[Paragraph("THÔNG TIN KHÁCH HÀNG", self.heading_style)]], 
                               colWidths=[480])
@@ -474,7 +684,7 @@ class HoaDonPDF:
             ('LEFTPADDING', (0, 0), (-1, -1), 10),
             ('RIGHTPADDING', (0, 0), (-1, -1), 10),
         ]))
-
+        
         # Tạo bảng chứa nội dung thông tin khách hàng
         customer_content = [
             # Dòng 1: Tên khách hàng (trên toàn bộ chiều rộng)
@@ -495,9 +705,9 @@ class HoaDonPDF:
             [Paragraph("<b>Mã công tơ:</b>", label_style), 
              Paragraph(ma_cong_to, value_style),
              Paragraph("<b>Ngày xuất:</b>", label_style), 
-             Paragraph(datetime.datetime.now().strftime('%d/%m/%Y'), value_style)]
+             Paragraph((ngay_in or datetime.date.today()).strftime('%d/%m/%Y'), value_style)]
         ]
-
+        
         customer_info = Table(customer_content, colWidths=[100, 140, 100, 140])
         customer_info.setStyle(TableStyle([
             ('BACKGROUND', (0, 0), (-1, -1), colors.Color(0.18, 0.18, 0.18, 1)),
@@ -512,7 +722,7 @@ class HoaDonPDF:
             ('RIGHTPADDING', (0, 0), (-1, -1), 10),
             ('GRID', (0, 0), (-1, -1), 0.5, colors.Color(0.22, 0.22, 0.22, 1)),  # Thêm đường kẻ mờ giữa các ô
         ]))
-
+        
         # Kết hợp header và nội dung vào một bảng chính
         customer_table = Table([
             [customer_header],
@@ -527,7 +737,7 @@ class HoaDonPDF:
             ('RIGHTPADDING', (0, 0), (-1, -1), 0),
             ('ROUNDEDCORNERS', [8, 8, 8, 8]),
         ]))
-
+        
         elements.append(customer_table)
         elements.append(Spacer(1, 15))
         
@@ -541,7 +751,7 @@ class HoaDonPDF:
             [Paragraph("QUÉT MÃ THANH TOÁN", self.heading_style)],
             [viet_qr]
         ], colWidths=[160])
-
+        
         qr_table.setStyle(TableStyle([
             ('BACKGROUND', (0, 0), (0, 0), colors.Color(0.15, 0.15, 0.15, 1)),
             ('BACKGROUND', (0, 1), (0, 1), colors.white),  # Nền trắng cho QR
@@ -557,7 +767,7 @@ class HoaDonPDF:
             ('BOX', (0, 0), (0, -1), 1, VTN_YELLOW),
             ('ROUNDEDCORNERS', [8, 8, 8, 8]),
         ]))
-
+        
         # Thêm QR code riêng biệt sau phần thông tin chi tiết
         elements.append(Spacer(1, 5))
         elements.append(qr_table)
@@ -649,8 +859,7 @@ class HoaDonPDF:
             # Tạo bảng chứa thông tin thanh toán và dấu đã thanh toán
             payment_info = [
                 [Paragraph(f"<font color='green'>ĐÃ THANH TOÁN</font>", 
-                        ParagraphStyle('PaymentStyle', parent=self.value_style, 
-                                      fontSize=14, alignment=TA_CENTER, fontName='Roboto-Bold')),
+                        self.payment_style),
                 PaidStamp()]
             ]
             
@@ -664,51 +873,267 @@ class HoaDonPDF:
             elements.append(payment_table)
         else:
             # Hiển thị trạng thái chưa thanh toán
-            trang_thai_style = ParagraphStyle(
-                name='TrangThai_Style',
-                fontName='Roboto-Bold',
-                fontSize=14,
-                leading=16,
-                textColor='red',
-                alignment=TA_CENTER,
-                spaceBefore=15
-            )
-            
-            elements.append(Paragraph("CHƯA THANH TOÁN", trang_thai_style))
+            elements.append(Paragraph("CHƯA THANH TOÁN", self.trang_thai_style))
         
         # Thêm thông tin bổ sung và lưu ý
         elements.append(Spacer(1, 20))
         
-        note_style = ParagraphStyle(
-            name='Note_Style',
-            fontName='Roboto',
-            fontSize=9,
-            textColor=colors.lightgrey,
-            alignment=TA_LEFT
-        )
-        
         elements.append(Paragraph(
             "<i>Lưu ý: Hóa đơn này đã được số hóa và có giá trị pháp lý tương đương với hóa đơn giấy. "
             "Quý khách có thể thanh toán qua các kênh ngân hàng, ví điện tử hoặc tại các điểm thu hộ được ủy quyền.</i>", 
-            note_style
+            self.note_style
         ))
         
-        # Build the PDF
-        try:
-            doc.build(elements)
-            return file_name
-        except Exception as e:
-            print(f"Lỗi khi tạo file PDF: {e}")
-            return None
+        return elements
+
+# Bộ tạo PDF dùng chung của tiến trình
+_renderer = None
+
+
+def get_renderer():
+    """
+    Lấy bộ tạo PDF hóa đơn dùng chung của tiến trình, tạo ở lần gọi đầu tiên
+    
+    HoaDonPDF không giữ trạng thái giữa các lần tạo hóa đơn nên có thể dùng lại cho mọi
+    lần xuất.
+    
+    Returns:
+        HoaDonPDF: Bộ tạo PDF đã đăng ký font và tạo style
+    """
+    global _renderer
+    if _renderer is None:
+        _renderer = HoaDonPDF()
+    return _renderer
+
 
 # Hàm tiện ích để tạo hóa đơn trực tiếp từ mã hóa đơn
 def tao_hoa_don_pdf(hoa_don, khach_hang, bang_gia, output_dir="exports"):
     """Hàm tiện ích để tạo hóa đơn PDF"""
-    # Tạo một instance mới để tránh lỗi reference
     try:
-        # Tạo PDF generator và tạo hóa đơn
-        generator = HoaDonPDF()
+        # Lấy PDF generator dùng chung và tạo hóa đơn
+        generator = get_renderer()
         return generator.tao_hoa_don(hoa_don, khach_hang, bang_gia, output_dir)
     except Exception as e:
         print(f"Lỗi khi tạo hóa đơn PDF: {e}")
-        return None 
\ No newline at end of file
+        return None 
+
+
+# ===== XUẤT HÓA ĐƠN HÀNG LOẠT =====
+def _khoi_tao_worker():
+    """Khởi tạo tiến trình con của tao_hoa_don_pdf_batch: đăng ký font và tạo style một lần"""
+    get_renderer()
+
+
+def _tao_hoa_don_worker(args):
+    """Tạo PDF của một hóa đơn trong tiến trình con, trả về (mã hóa đơn, đường dẫn, lỗi)"""
+    hoa_don, khach_hang, bang_gia, output_dir = args
+    try:
+        # Không gọi tao_hoa_don để tránh in một dòng cho mỗi hóa đơn, tiến độ đã báo qua tien_do
+        generator = get_renderer()
+        data = generator.render_bytes(hoa_don, khach_hang, bang_gia)
+        file_name = generator.duong_dan_file(hoa_don, output_dir)
+        with open(file_name, 'wb') as f:
+            f.write(data)
+        return hoa_don.ma_hoa_don, file_name, None
+    except Exception as e:
+        return hoa_don.ma_hoa_don, None, str(e)
+
+
+def tao_hoa_don_pdf_batch(hoa_don_list, khach_hang_theo_ma, bang_gia_theo_ky, output_dir="exports",
+                          max_workers=None, chunksize=4, tien_do=None, buoc_tien_do=100):
+    """
+    Tạo PDF cho nhiều hóa đơn song song trên nhiều tiến trình (ProcessPoolExecutor)
+    
+    Mỗi tiến trình con đăng ký font và tạo style một lần khi khởi động rồi lần lượt tạo
+    các hóa đơn được giao, nên việc xuất cả tháng dùng hết các lõi CPU. Hóa đơn thiếu
+    khách hàng hoặc bảng giá được ghi vào danh sách lỗi mà không dừng cả lô.
+    
+    Args:
+        hoa_don_list (iterable): Các hóa đơn cần xuất
+        khach_hang_theo_ma (dict): Mã khách hàng -> KhachHang
+        bang_gia_theo_ky (dict): (tháng, năm) -> BangGia của kỳ hóa đơn
+        output_dir (str): Thư mục lưu file PDF
+        max_workers (int, optional): Số tiến trình con, mặc định bằng số lõi CPU; 1 để tạo
+            ngay trong tiến trình hiện tại
+        chunksize (int): Số hóa đơn gửi cho tiến trình con mỗi lần
+        tien_do (callable, optional): Hàm nhận kết quả tạm thời sau mỗi buoc_tien_do hóa đơn
+        buoc_tien_do (int): Số hóa đơn giữa hai lần gọi tien_do
+        
+    Returns:
+        dict: Kết quả gồm số hóa đơn, số hóa đơn đã xử lý, số file đã tạo, danh sách file,
+            danh sách lỗi (mã hóa đơn, lỗi), thời gian chạy (giây) và số hóa đơn mỗi giây
+    """
+    bat_dau = time.perf_counter()
+    ket_qua = {
+        "so_hoa_don": 0,
+        "da_xu_ly": 0,
+        "so_thanh_cong": 0,
+        "files": [],
+        "loi": [],
+        "thoi_gian": 0.0,
+        "hoa_don_moi_giay": 0
+    }
+    
+    tasks = []
+    for hd in hoa_don_list:
+        khach_hang = khach_hang_theo_ma.get(hd.ma_khach_hang)
+        bang_gia = bang_gia_theo_ky.get((hd.thang, hd.nam))
+        if khach_hang is None or bang_gia is None:
+            ket_qua["loi"].append((hd.ma_hoa_don, "Không tìm thấy khách hàng hoặc bảng giá của hóa đơn"))
+            continue
+        tasks.append((hd, khach_hang, bang_gia, output_dir))
+    ket_qua["so_hoa_don"] = len(tasks) + len(ket_qua["loi"])
+    ket_qua["da_xu_ly"] = len(ket_qua["loi"])
+    
+    def cap_nhat(ma_hoa_don, file_name, loi):
+        ket_qua["da_xu_ly"] += 1
+        if loi is None:
+            ket_qua["so_thanh_cong"] += 1
+            ket_qua["files"].append(file_name)
+        else:
+            ket_qua["loi"].append((ma_hoa_don, loi))
+        ket_qua["thoi_gian"] = round(time.perf_counter() - bat_dau, 3)
+        if ket_qua["thoi_gian"] > 0:
+            ket_qua["hoa_don_moi_giay"] = round(ket_qua["so_thanh_cong"] / ket_qua["thoi_gian"], 1)
+        if tien_do and (ket_qua["da_xu_ly"] % buoc_tien_do == 0
+                        or ket_qua["da_xu_ly"] == ket_qua["so_hoa_don"]):
+            tien_do(ket_qua)
+    
+    if max_workers == 1:
+        for ket_qua_hd in map(_tao_hoa_don_worker, tasks):
+            cap_nhat(*ket_qua_hd)
+    elif tasks:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_khoi_tao_worker) as executor:
+            for ket_qua_hd in executor.map(_tao_hoa_don_worker, tasks, chunksize=chunksize):
+                cap_nhat(*ket_qua_hd)
+    
+    ket_qua["thoi_gian"] = round(time.perf_counter() - bat_dau, 3)
+    if ket_qua["thoi_gian"] > 0:
+        ket_qua["hoa_don_moi_giay"] = round(ket_qua["so_thanh_cong"] / ket_qua["thoi_gian"], 1)
+    return ket_qua
+
+
+# ===== XUẤT HÓA ĐƠN GỘP MỘT FILE =====
+class _HoaDonKeTiep(Flowable):
+    """Vị trí trong danh sách phần tử nơi nội dung của hóa đơn kế tiếp được thêm vào"""
+    
+    def wrap(self, availWidth, availHeight):
+        return 0, 0
+    
+    def draw(self):
+        pass
+
+
+class HoaDonGopPDFTemplate(HoaDonPDFTemplate):
+    """
+    Tài liệu gồm nhiều hóa đơn, mỗi hóa đơn bắt đầu ở một trang mới
+    
+    Nội dung hóa đơn được lấy dần từ một iterator ngay trước khi cần vẽ, nên danh sách
+    phần tử chỉ chứa một hóa đơn tại một thời điểm. Font được nhúng và nền trang được ghi
+    một lần cho cả file.
+    """
+    
+    def __init__(self, filename, nguon, **kw):
+        """
+        Khởi tạo tài liệu
+        
+        Args:
+            filename (str): Đường dẫn file PDF
+            nguon (iterator): Sinh danh sách phần tử của từng hóa đơn
+        """
+        self.nguon = nguon
+        self.so_hoa_don_da_them = 0
+        HoaDonPDFTemplate.__init__(self, filename, **kw)
+    
+    def filterFlowables(self, flowables):
+        """Thay vị trí chờ ở đầu danh sách bằng nội dung của hóa đơn kế tiếp"""
+        if not flowables or not isinstance(flowables[0], _HoaDonKeTiep):
+            return
+        elements = next(self.nguon, None)
+        if elements is None:
+            flowables[0] = None
+            return
+        if self.so_hoa_don_da_them:
+            elements.insert(0, PageBreak())
+        self.so_hoa_don_da_them += 1
+        flowables[0:1] = elements + [_HoaDonKeTiep()]
+    
+    def build_gop(self):
+        """Tạo file PDF từ toàn bộ hóa đơn của nguồn"""
+        self.build([_HoaDonKeTiep()])
+
+
+def tao_hoa_don_pdf_gop(hoa_don_list, khach_hang_theo_ma, bang_gia_theo_ky, file_name,
+                        tien_do=None, buoc_tien_do=100):
+    """
+    Tạo một file PDF chứa nhiều hóa đơn (ví dụ toàn bộ hóa đơn của một khu vực để phát tay)
+    
+    Dùng bố cục của HoaDonPDF.tao_noi_dung, mỗi hóa đơn một trang mới. Hóa đơn được đọc
+    lần lượt từ hoa_don_list khi đến lượt vẽ nên có thể truyền một generator với số lượng
+    lớn. Hóa đơn thiếu khách hàng, bảng giá hoặc lỗi khi tạo nội dung được ghi vào danh
+    sách lỗi mà không dừng cả file.
+    
+    Args:
+        hoa_don_list (iterable): Các hóa đơn theo thứ tự in
+        khach_hang_theo_ma (dict): Mã khách hàng -> KhachHang
+        bang_gia_theo_ky (dict): (tháng, năm) -> BangGia của kỳ hóa đơn
+        file_name (str): Đường dẫn file PDF
+        tien_do (callable, optional): Hàm nhận kết quả tạm thời sau mỗi buoc_tien_do hóa đơn
+        buoc_tien_do (int): Số hóa đơn giữa hai lần gọi tien_do
+        
+    Returns:
+        dict: Kết quả gồm số hóa đơn đã xử lý, số hóa đơn đã đưa vào file, đường dẫn file
+            (None nếu không có hóa đơn nào), số trang, danh sách lỗi (mã hóa đơn, lỗi), thời
+            gian chạy (giây) và số hóa đơn mỗi giây
+    """
+    bat_dau = time.perf_counter()
+    ket_qua = {
+        "da_xu_ly": 0,
+        "so_thanh_cong": 0,
+        "file": None,
+        "so_trang": 0,
+        "loi": [],
+        "thoi_gian": 0.0,
+        "hoa_don_moi_giay": 0
+    }
+    renderer = get_renderer()
+    
+    def cap_nhat_thoi_gian():
+        ket_qua["thoi_gian"] = round(time.perf_counter() - bat_dau, 3)
+        if ket_qua["thoi_gian"] > 0:
+            ket_qua["hoa_don_moi_giay"] = round(ket_qua["so_thanh_cong"] / ket_qua["thoi_gian"], 1)
+    
+    def nguon():
+        for hd in hoa_don_list:
+            ket_qua["da_xu_ly"] += 1
+            khach_hang = khach_hang_theo_ma.get(hd.ma_khach_hang)
+            bang_gia = bang_gia_theo_ky.get((hd.thang, hd.nam))
+            if khach_hang is None or bang_gia is None:
+                ket_qua["loi"].append((hd.ma_hoa_don, "Không tìm thấy khách hàng hoặc bảng giá của hóa đơn"))
+                continue
+            try:
+                elements = renderer.tao_noi_dung(hd, khach_hang, bang_gia)
+            except Exception as e:
+                ket_qua["loi"].append((hd.ma_hoa_don, str(e)))
+                continue
+            ket_qua["so_thanh_cong"] += 1
+            if tien_do and ket_qua["so_thanh_cong"] % buoc_tien_do == 0:
+                cap_nhat_thoi_gian()
+                tien_do(ket_qua)
+            yield elements
+    
+    output_dir = os.path.dirname(os.path.abspath(file_name))
+    os.makedirs(output_dir, exist_ok=True)
+    doc = HoaDonGopPDFTemplate(file_name, nguon(), pagesize=A4, **PAGE_MARGINS)
+    doc.build_gop()
+    
+    if ket_qua["so_thanh_cong"]:
+        ket_qua["file"] = file_name
+        ket_qua["so_trang"] = doc.page
+    else:
+        os.remove(file_name)
+    cap_nhat_thoi_gian()
+    if tien_do:
+        tien_do(ket_qua)
+    return ket_qua
+
@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import threading
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+
+# Tên font đăng ký với ReportLab
+FONT_REGULAR = 'Roboto'
+FONT_BOLD = 'Roboto-Bold'
+
+# Font thay thế khi không tìm thấy Roboto
+FONT_REGULAR_FALLBACK = 'Helvetica'
+FONT_BOLD_FALLBACK = 'Helvetica-Bold'
+
+_LOCK = threading.RLock()
+# None khi chưa đăng ký, sau đó là True/False tùy việc đăng ký font Roboto thành công
+_fonts_registered = None
+# Tên bộ style -> bộ style đã tạo
+_STYLE_SETS = {}
+
+
+def _font_paths(ten_file):
+    """Các vị trí có thể chứa một file font, theo thứ tự ưu tiên"""
+    base_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    app_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return [
+        # Tìm trong thư mục font
+        os.path.join(base_dir, 'font', ten_file),
+        os.path.join(base_dir, 'font', 'static', ten_file),
+        os.path.join(app_dir, 'font', ten_file),
+        os.path.join(app_dir, 'font', 'static', ten_file),
+        # Tìm trong thư mục assets
+        os.path.join(base_dir, 'assets', 'fonts', ten_file),
+        os.path.join(app_dir, 'assets', 'fonts', ten_file),
+    ]
+
+
+def _tim_font(ten_file):
+    """Tìm file font, trả về đường dẫn đầu tiên tồn tại hoặc None"""
+    for path in _font_paths(ten_file):
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def register_fonts():
+    """
+    Đăng ký font Roboto và Roboto-Bold với ReportLab, chỉ một lần cho mỗi tiến trình
+    
+    Việc tìm và đọc file TTF chỉ diễn ra ở lần gọi đầu tiên; các lần gọi sau trả về kết
+    quả đã có. Tiến trình con tạo bằng fork đã có sẵn font của tiến trình cha nên cũng
+    không đọc lại.
+    
+    Returns:
+        bool: True nếu font Roboto đã được đăng ký
+    """
+    global _fonts_registered
+    if _fonts_registered is not None:
+        return _fonts_registered
+    
+    with _LOCK:
+        if _fonts_registered is not None:
+            return _fonts_registered
+        
+        da_dang_ky = pdfmetrics.getRegisteredFontNames()
+        if FONT_REGULAR in da_dang_ky and FONT_BOLD in da_dang_ky:
+            _fonts_registered = True
+            return True
+        
+        font_regular_path = _tim_font('Roboto-Regular.ttf')
+        if not font_regular_path:
+            print("Không tìm thấy font Roboto Regular")
+            _fonts_registered = False
+            return False
+        
+        font_bold_path = _tim_font('Roboto-Bold.ttf')
+        if not font_bold_path:
+            print("Không tìm thấy font Roboto Bold, sử dụng Regular")
+            font_bold_path = font_regular_path
+        
+        try:
+            pdfmetrics.registerFont(TTFont(FONT_REGULAR, font_regular_path))
+            pdfmetrics.registerFont(TTFont(FONT_BOLD, font_bold_path))
+            _fonts_registered = True
+        except Exception as e:
+            print(f"Lỗi khi đăng ký font: {e}")
+            _fonts_registered = False
+        return _fonts_registered
+
+
+def font_names():
+    """
+    Lấy tên font thường và font đậm để dùng trong PDF, đăng ký font nếu chưa đăng ký
+    
+    Returns:
+        tuple: (font thường, font đậm), là Helvetica nếu không đăng ký được Roboto
+    """
+    if register_fonts():
+        return FONT_REGULAR, FONT_BOLD
+    return FONT_REGULAR_FALLBACK, FONT_BOLD_FALLBACK
+
+
+def get_style_set(ten, factory):
+    """
+    Lấy một bộ style dùng chung, tạo bằng factory ở lần gọi đầu tiên
+    
+    Bộ style được dùng chung cho mọi lần xuất PDF trong tiến trình nên không được sửa
+    sau khi tạo.
+    
+    Args:
+        ten (str): Tên bộ style
+        factory (callable): Hàm không tham số tạo bộ style
+    
+    Returns:
+        Bộ style do factory tạo
+    """
+    style_set = _STYLE_SETS.get(ten)
+    if style_set is None:
+        with _LOCK:
+            style_set = _STYLE_SETS.get(ten)
+            if style_set is None:
+                style_set = factory()
+                _STYLE_SETS[ten] = style_set
+    return style_set
+
+
+def draw_page_form(canvas, ten, ve_trang, width, height):
+    """
+    Vẽ phần tĩnh của trang dưới dạng form XObject
+    
+    Form được ghi vào tài liệu ở trang đầu tiên, các trang sau chỉ tham chiếu lại bằng
+    doForm nên nội dung tĩnh chỉ có một bản trong file PDF.
+    
+    Args:
+        canvas: Canvas của trang đang vẽ
+        ten (str): Tên form, phân biệt các kiểu trang
+        ve_trang (callable): Hàm (canvas, width, height) vẽ phần tĩnh của trang
+        width (float): Chiều rộng trang
+        height (float): Chiều cao trang
+    """
+    ten_form = f"{ten}_{int(width)}x{int(height)}"
+    if not canvas.hasForm(ten_form):
+        canvas.beginForm(ten_form, 0, 0, width, height)
+        ve_trang(canvas, width, height)
+        canvas.endForm()
+    canvas.doForm(ten_form)
@@ -0,0 +1,31 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import pytest
+
+# Hai ứng dụng có các package utils/models trùng tên: bỏ các module đã nạp của ứng dụng kia
+# rồi đưa thư mục của ứng dụng này lên đầu sys.path trước khi các file test được import
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for _ten_module in list(sys.modules):
+    if _ten_module.split('.')[0] in ('utils', 'models'):
+        del sys.modules[_ten_module]
+sys.path.insert(0, APP_DIR)
+
+from models.bang_gia import BangGia  # noqa: E402
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    """Thư mục dữ liệu trống cho một test"""
+    return str(tmp_path / "data")
+
+
+@pytest.fixture
+def bang_gia_don_gian():
+    """Tạo bảng giá một bậc với đơn giá cho trước, áp dụng từ một ngày"""
+    def tao(ma_bang_gia, ngay_ap_dung, don_gia):
+        return BangGia(ma_bang_gia, ngay_ap_dung, [(float('inf'), don_gia)])
+    return tao
+
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import datetime
+import pytest
+from models.khach_hang import KhachHang
+from models.hoa_don import HoaDon
+from utils.db_handler import DatabaseHandler
+from utils.sqlite_handler import (SQLiteDatabaseHandler, migrate_json_to_sqlite, open_database,
+                                  BACKEND_ENV, DB_FILE)
+
+
+def _tao_du_lieu_json(data_dir):
+    """Tạo dữ liệu JSON gồm 2 khách hàng và 3 hóa đơn"""
+    db = DatabaseHandler(data_dir)
+    for i in (1, 2):
+        assert db.add_khach_hang(KhachHang(f"KH{i}", f"Khách {i}", "Hà Nội", "0900", f"CT{i}"))
+    assert db.add_hoa_don(HoaDon("HD1", "KH1", 1, 2025, 0, 100))
+    assert db.add_hoa_don(HoaDon("HD2", "KH1", 2, 2025, 100, 180))
+    assert db.add_hoa_don(HoaDon("HD3", "KH2", 1, 2025, 0, 50))
+    return db
+
+
+def test_them_sua_xoa_va_truy_van_theo_chi_muc(data_dir):
+    db = SQLiteDatabaseHandler(data_dir)
+    try:
+        assert db.add_khach_hang(KhachHang("KH1", "A", "B", "0900", "CT1"))
+        assert not db.add_khach_hang(KhachHang("KH1", "A", "B", "0900", "CT1"))
+        assert db.add_hoa_don(HoaDon("HD1", "KH1", 1, 2025, 0, 100))
+        assert db.add_hoa_don(HoaDon("HD2", "KH1", 2, 2025, 100, 150))
+        
+        assert [hd.ma_hoa_don for hd in db.get_hoa_don_theo_ky(1, 2025)] == ["HD1"]
+        assert [hd.ma_hoa_don for hd in db.get_hoa_don_by_khach_hang("KH1")] == ["HD1", "HD2"]
+        assert db.get_chi_so_moi_nhat("KH1") == (2025, 2, 150)
+        
+        hd = db.get_hoa_don("HD1")
+        hd.da_thanh_toan = True
+        assert db.update_hoa_don(hd)
+        assert [hd.ma_hoa_don for hd in db.get_hoa_don_chua_thanh_toan()] == ["HD2"]
+        
+        assert db.delete_hoa_don("HD2")
+        assert db.get_hoa_don("HD2") is None
+    finally:
+        db.close()
+
+
+def test_tu_choi_hoa_don_trung_ky(data_dir):
+    db = SQLiteDatabaseHandler(data_dir)
+    try:
+        assert db.add_hoa_don(HoaDon("HD1", "KH1", 1, 2025, 0, 100))
+        assert not db.add_hoa_don(HoaDon("HD2", "KH1", 1, 2025, 0, 100))
+        
+        hd = HoaDon("HD3", "KH1", 2, 2025, 100, 120)
+        assert db.add_hoa_don(hd)
+        hd.thang = 1
+        assert not db.update_hoa_don(hd)
+    finally:
+        db.close()
+
+
+def test_chuyen_du_lieu_json_sang_sqlite(data_dir):
+    json_db = _tao_du_lieu_json(data_dir)
+    
+    ket_qua = migrate_json_to_sqlite(data_dir)
+    assert ket_qua == {"khach_hang": 2, "hoa_don": 3, "bang_gia": 1}
+    
+    db = SQLiteDatabaseHandler(data_dir)
+    try:
+        assert ([kh.to_dict() for kh in db.get_all_khach_hang()]
+                == [kh.to_dict() for kh in json_db.get_all_khach_hang()])
+        assert ([hd.to_dict() for hd in db.get_all_hoa_don()]
+                == [hd.to_dict() for hd in json_db.get_all_hoa_don()])
+        assert [bg.ma_bang_gia for bg in db.get_all_bang_gia()] == ["BG001"]
+    finally:
+        db.close()
+
+
+def test_chuyen_du_lieu_dung_lai_khi_co_hoa_don_trung_ky(data_dir):
+    db = DatabaseHandler(data_dir)
+    # Dữ liệu cũ được ghi trực tiếp, không qua kiểm tra trùng kỳ
+    db._hoa_don_cache.save([HoaDon("HD1", "KH1", 1, 2025, 0, 10), HoaDon("HD2", "KH1", 1, 2025, 0, 20)])
+    
+    with pytest.raises(ValueError):
+        migrate_json_to_sqlite(data_dir)
+
+
+def test_open_database_chuyen_du_lieu_mot_lan(data_dir, monkeypatch):
+    monkeypatch.delenv(BACKEND_ENV, raising=False)
+    json_db = _tao_du_lieu_json(data_dir)
+    
+    db = open_database(data_dir)
+    try:
+        assert isinstance(db, SQLiteDatabaseHandler)
+        assert len(db.get_all_hoa_don()) == 3
+    finally:
+        db.close()
+    assert os.path.exists(os.path.join(data_dir, DB_FILE))
+    assert not os.path.exists(os.path.join(data_dir, DB_FILE + ".tmp"))
+    
+    # Lần mở sau dùng cơ sở dữ liệu đã có, không chuyển lại từ JSON
+    json_db.add_hoa_don(HoaDon("HD4", "KH2", 2, 2025, 50, 60))
+    db = open_database(data_dir)
+    try:
+        assert db.get_hoa_don("HD4") is None
+    finally:
+        db.close()
+
+
+def test_open_database_chon_json(data_dir, monkeypatch):
+    assert type(open_database(data_dir, backend="json")) is DatabaseHandler
+    
+    monkeypatch.setenv(BACKEND_ENV, "json")
+    assert type(open_database(data_dir)) is DatabaseHandler
+    assert not os.path.exists(os.path.join(data_dir, DB_FILE))
+    
+    with pytest.raises(ValueError):
+        open_database(data_dir, backend="csv")
+
+
+def test_open_database_giu_json_khi_khong_chuyen_duoc(data_dir, monkeypatch):
+    monkeypatch.delenv(BACKEND_ENV, raising=False)
+    db = DatabaseHandler(data_dir)
+    db._hoa_don_cache.save([HoaDon("HD1", "KH1", 1, 2025, 0, 10), HoaDon("HD2", "KH1", 1, 2025, 0, 20)])
+    
+    assert type(open_database(data_dir)) is DatabaseHandler
+    assert not os.path.exists(os.path.join(data_dir, DB_FILE))
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pytest
+
+pytest.importorskip("reportlab")
+pytest.importorskip("num2words")
+
+from models.hoa_don_pdf import (crc16_ccitt, tao_noi_dung_viet_qr, create_viet_qr,  # noqa: E402
+                                VIETQR_BANK_BIN, VIETQR_ACCOUNT)
+
+
+def _doc_tlv(payload):
+    """Tách nội dung EMVCo thành các cặp (ID, giá trị)"""
+    truong = {}
+    i = 0
+    while i < len(payload):
+        tag, do_dai = payload[i:i + 2], int(payload[i + 2:i + 4])
+        truong[tag] = payload[i + 4:i + 4 + do_dai]
+        i += 4 + do_dai
+    assert i == len(payload)
+    return truong
+
+
+def test_crc16_ccitt():
+    # Giá trị kiểm tra chuẩn của CRC-16/CCITT-FALSE
+    assert crc16_ccitt("123456789") == "29B1"
+    assert crc16_ccitt("") == "FFFF"
+
+
+def test_noi_dung_co_so_tien():
+    payload = tao_noi_dung_viet_qr("HD0000000001", 125000)
+    truong = _doc_tlv(payload)
+    
+    assert truong["00"] == "01"
+    assert truong["01"] == "12"
+    assert truong["53"] == "704"
+    assert truong["54"] == "125000"
+    assert truong["58"] == "VN"
+    assert _doc_tlv(truong["62"]) == {"08": "Thanh toan hoa don HD0000000001"}
+    
+    tai_khoan = _doc_tlv(truong["38"])
+    assert tai_khoan["00"] == "A000000727"
+    assert _doc_tlv(tai_khoan["01"]) == {"00": VIETQR_BANK_BIN, "01": VIETQR_ACCOUNT}
+    assert tai_khoan["02"] == "QRIBFTTA"
+    
+    # CRC tính trên toàn bộ nội dung kể cả "6304"
+    assert payload[:-4].endswith("6304")
+    assert truong["63"] == crc16_ccitt(payload[:-4])
+
+
+def test_noi_dung_khong_co_so_tien():
+    truong = _doc_tlv(tao_noi_dung_viet_qr("HD1", 0))
+    assert truong["01"] == "11"
+    assert "54" not in truong
+
+
+def test_ma_qr_dung_lai_ma_tran_nhung_khong_dung_lai_flowable():
+    qr1 = create_viet_qr("HD1", 1000)
+    qr2 = create_viet_qr("HD1", 1000)
+    assert qr1 is not qr2
+    assert qr1.cac_doan is qr2.cac_doan
@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import operator
+
+# Các hàm đo được hỗ trợ
+SUM = 'sum'
+COUNT = 'count'
+COUNT_DISTINCT = 'count_distinct'
+MIN = 'min'
+MAX = 'max'
+AVG = 'avg'
+
+
+def _sum_final(values):
+    return sum(values)
+
+
+def _avg_final(values):
+    return sum(values) / len(values) if values else 0
+
+
+def _append(state, value):
+    state.append(value)
+    return state
+
+
+def _add(state, value):
+    state.add(value)
+    return state
+
+
+def _min(state, value):
+    return value if state is None or value < state else state
+
+
+def _max(state, value):
+    return value if state is None or value > state else state
+
+
+# Hàm đo -> (khởi tạo trạng thái, cập nhật, kết quả)
+# Tổng được cộng bằng sum() ở cuối để kết quả giống hệt khi dùng sum() trực tiếp
+_METRICS = {
+    SUM: (list, _append, _sum_final),
+    COUNT: (int, lambda state, value: state + 1, lambda state: state),
+    COUNT_DISTINCT: (set, _add, len),
+    MIN: (lambda: None, _min, lambda state: state),
+    MAX: (lambda: None, _max, lambda state: state),
+    AVG: (list, _append, _avg_final),
+}
+
+
+def _getter(field):
+    """
+    Chuyển tên thuộc tính hoặc hàm thành hàm lấy giá trị
+    
+    Args:
+        field (str | callable | None): Tên thuộc tính hoặc hàm
+    
+    Returns:
+        callable: Hàm lấy giá trị hoặc None
+    """
+    if field is None or callable(field):
+        return field
+    return operator.attrgetter(field)
+
+
+def aggregate(items, group_by=(), metrics=None, where=None, keys=(), rollup=False):
+    """
+    Gom nhóm và tính các chỉ số trong một lần duyệt dữ liệu
+    
+    Mỗi chỉ số được khai báo bằng bộ (hàm đo, trường, điều kiện):
+        - hàm đo: SUM, COUNT, COUNT_DISTINCT, MIN, MAX hoặc AVG
+        - trường: tên thuộc tính hoặc hàm lấy giá trị; với COUNT, trường là điều kiện
+          để đếm (bỏ trống để đếm mọi dòng)
+        - điều kiện (không bắt buộc): chỉ tính các dòng thỏa mãn
+    
+    Ví dụ:
+        aggregate(hoa_don_list, group_by=['thang'], metrics={
+            "doanh_thu": (SUM, 'tong_tien'),
+            "so_hoa_don": (COUNT,),
+            "da_thanh_toan": (COUNT, 'da_thanh_toan'),
+            "so_khach_hang": (COUNT_DISTINCT, 'ma_khach_hang'),
+        })
+    
+    Args:
+        items (iterable): Dữ liệu cần thống kê
+        group_by (list): Các tên thuộc tính hoặc hàm dùng làm khóa nhóm
+        metrics (dict): Tên chỉ số -> khai báo chỉ số
+        where (callable, optional): Điều kiện lọc dòng
+        keys (iterable): Các khóa nhóm luôn có trong kết quả, kể cả khi không có dòng nào
+        rollup (bool): Tính thêm tổng của toàn bộ dữ liệu với khóa ()
+    
+    Returns:
+        dict: Khóa nhóm -> {tên chỉ số: giá trị}. Khóa nhóm là giá trị của trường khi chỉ
+            gom theo một trường, bộ giá trị khi gom theo nhiều trường và () khi không gom
+    """
+    key_getters = [_getter(field) for field in group_by]
+    if not key_getters:
+        key_func = lambda item: ()
+        keys = [()]
+        rollup = False
+    elif len(key_getters) == 1:
+        key_func = key_getters[0]
+    else:
+        key_func = lambda item: tuple(getter(item) for getter in key_getters)
+    
+    specs = []
+    for name, spec in (metrics or {}).items():
+        kind, field, condition = (tuple(spec) + (None, None))[:3]
+        if kind not in _METRICS:
+            raise ValueError(f"Hàm đo không hợp lệ: {kind}")
+        field = _getter(field)
+        condition = _getter(condition)
+        if kind == COUNT and field is not None:
+            # Đếm theo trường: chỉ đếm các dòng có giá trị đúng
+            if condition is None:
+                condition = field
+            else:
+                condition = (lambda f, c: lambda item: c(item) and f(item))(field, condition)
+            field = None
+        specs.append((name, _METRICS[kind], field, condition))
+    
+    def new_state():
+        return [init() for _, (init, _, _), _, _ in specs]
+    
+    groups = {key: new_state() for key in keys}
+    total = new_state() if rollup else None
+    
+    for item in items:
+        if where is not None and not where(item):
+            continue
+        
+        key = key_func(item)
+        state = groups.get(key)
+        if state is None:
+            state = groups[key] = new_state()
+        
+        for i, (_, (_, update, _), field, condition) in enumerate(specs):
+            if condition is not None and not condition(item):
+                continue
+            value = field(item) if field is not None else None
+            state[i] = update(state[i], value)
+            if total is not None:
+                total[i] = update(total[i], value)
+    
+    def finalize(state):
+        return {name: final(value) for (name, (_, _, final), _, _), value in zip(specs, state)}
+    
+    result = {key: finalize(state) for key, state in groups.items()}
+    if total is not None:
+        result[()] = finalize(total)
+    return result
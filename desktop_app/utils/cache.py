@@ -0,0 +1,355 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import threading
+
+# Bộ nhớ đệm dùng chung cho toàn tiến trình, khóa theo đường dẫn tuyệt đối của file
+_TABLE_CACHES = {}
+_REGISTRY_LOCK = threading.Lock()
+
+
+def clone(obj):
+    """
+    Tạo bản sao nông của một đối tượng mô hình (KhachHang, HoaDon, BangGia)
+    
+    Nhanh hơn copy.copy vì chỉ sao chép __dict__, đủ dùng cho các mô hình
+    chỉ chứa giá trị nguyên thủy và datetime.
+    
+    Args:
+        obj: Đối tượng cần sao chép
+    
+    Returns:
+        Bản sao của đối tượng
+    """
+    new_obj = object.__new__(type(obj))
+    new_obj.__dict__.update(obj.__dict__)
+    return new_obj
+
+
+class TableCache:
+    """
+    Bộ nhớ đệm các đối tượng đã phân tích cú pháp của một file dữ liệu JSON
+    
+    Lưu các đối tượng theo khóa chính (giữ thứ tự trong file) và kiểm tra lại
+    chữ ký file (inode, mtime, kích thước) trước mỗi lần đọc, nên chỉ phải đọc lại
+    file khi nó bị thay đổi từ bên ngoài. Các thao tác ghi của DatabaseHandler cập
+    nhật trực tiếp bộ nhớ đệm rồi ghi nhận chữ ký mới của file.
+    
+    Có thể đăng ký thêm chỉ mục phụ (ví dụ mã khách hàng -> các hóa đơn) và chỉ mục dẫn
+    xuất (đối tượng tự tổng hợp dữ liệu, ví dụ chỉ số mới nhất của từng khách hàng). Chỉ
+    mục được xây dựng ở lần tra cứu đầu tiên sau khi đọc file và được cập nhật theo từng
+    lần ghi.
+    """
+    
+    def __init__(self, path, model, key_attr):
+        """
+        Khởi tạo bộ nhớ đệm
+        
+        Args:
+            path (str): Đường dẫn file JSON
+            model (type): Lớp mô hình có phương thức from_dict
+            key_attr (str): Tên thuộc tính khóa chính
+        """
+        self.path = path
+        self.model = model
+        self.key_attr = key_attr
+        self.records = {}
+        self.signature = None
+        # Tăng mỗi khi dữ liệu trong bộ nhớ đệm thay đổi
+        self.generation = 0
+        self.lock = threading.RLock()
+        # Chỉ mục phụ: tên -> hàm lấy khóa phụ, tên -> {khóa phụ: {khóa chính: đối tượng}}
+        self.index_funcs = {}
+        self.indexes = {}
+        # Chỉ mục dẫn xuất: tên -> hàm tạo chỉ mục, tên -> đối tượng chỉ mục
+        self.derived_factories = {}
+        self.derived = {}
+    
+    @staticmethod
+    def _file_signature(path):
+        """
+        Lấy chữ ký của một file
+        
+        Args:
+            path (str): Đường dẫn file
+        
+        Returns:
+            tuple: (inode, mtime_ns, size) hoặc None nếu file không tồn tại
+        """
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+    
+    def _signature(self):
+        """
+        Lấy chữ ký hiện tại của dữ liệu
+        
+        Returns:
+            tuple: Chữ ký của file hoặc None nếu file không tồn tại
+        """
+        return self._file_signature(self.path)
+    
+    def _read(self):
+        """
+        Đọc toàn bộ dữ liệu từ file
+        
+        Returns:
+            dict: Các đối tượng theo khóa chính
+        """
+        with open(self.path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        records = {}
+        for item in data:
+            obj = self.model.from_dict(item)
+            records[getattr(obj, self.key_attr)] = obj
+        return records
+    
+    def load(self):
+        """
+        Lấy các đối tượng, đọc lại file nếu file đã thay đổi
+        
+        Các đối tượng trả về thuộc bộ nhớ đệm, không được sửa trực tiếp.
+        
+        Returns:
+            dict: Các đối tượng theo khóa chính
+        """
+        with self.lock:
+            signature = self._signature()
+            if signature != self.signature or signature is None:
+                self.records = self._read()
+                self.indexes = {}
+                self.derived = {}
+                self.signature = signature
+                self.generation += 1
+            return self.records
+    
+    @staticmethod
+    def _dump(objects, path):
+        """
+        Ghi danh sách đối tượng ra file JSON và đẩy xuống đĩa
+        
+        Args:
+            objects (iterable): Các đối tượng mô hình
+            path (str): Đường dẫn file cần ghi
+        """
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump([obj.to_dict() for obj in objects], f, ensure_ascii=False, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+    
+    def save(self, objects):
+        """
+        Ghi toàn bộ dữ liệu xuống file một cách nguyên tử
+        
+        Ghi ra file tạm rồi đổi tên, nên nếu tiến trình bị dừng giữa chừng thì
+        file cũ vẫn còn nguyên vẹn.
+        
+        Args:
+            objects (iterable): Các đối tượng mô hình cần lưu
+        """
+        tmp_path = self.path + '.tmp'
+        self._dump(objects, tmp_path)
+        os.replace(tmp_path, self.path)
+    
+    def invalidate(self):
+        """Buộc đọc lại file ở lần truy cập tiếp theo"""
+        with self.lock:
+            self.signature = None
+    
+    def add_index(self, name, key_func):
+        """
+        Đăng ký một chỉ mục phụ
+        
+        Args:
+            name (str): Tên chỉ mục
+            key_func (callable): Hàm lấy khóa phụ từ một đối tượng
+        """
+        with self.lock:
+            if name not in self.index_funcs:
+                self.index_funcs[name] = key_func
+    
+    def _get_index(self, name):
+        """
+        Lấy chỉ mục phụ, xây dựng lại nếu chưa có
+        
+        Args:
+            name (str): Tên chỉ mục
+        
+        Returns:
+            dict: {khóa phụ: {khóa chính: đối tượng}}
+        """
+        index = self.indexes.get(name)
+        if index is None:
+            key_func = self.index_funcs[name]
+            index = {}
+            for key, obj in self.records.items():
+                index.setdefault(key_func(obj), {})[key] = obj
+            self.indexes[name] = index
+        return index
+    
+    def add_derived_index(self, name, factory):
+        """
+        Đăng ký một chỉ mục dẫn xuất
+        
+        Đối tượng chỉ mục được tạo bằng factory(cache) từ dữ liệu hiện có và phải có các
+        phương thức put(obj, old) (old là đối tượng bị thay thế hoặc None) và remove(old),
+        được gọi sau khi dữ liệu và các chỉ mục phụ đã được cập nhật.
+        
+        Args:
+            name (str): Tên chỉ mục
+            factory (callable): Hàm tạo đối tượng chỉ mục
+        """
+        with self.lock:
+            if name not in self.derived_factories:
+                self.derived_factories[name] = factory
+    
+    def derived_index(self, name):
+        """
+        Lấy chỉ mục dẫn xuất, đọc lại file và xây dựng lại chỉ mục nếu cần
+        
+        Chỉ nên dùng đối tượng trả về khi đang giữ khóa của bộ nhớ đệm.
+        
+        Args:
+            name (str): Tên chỉ mục
+        
+        Returns:
+            Đối tượng chỉ mục
+        """
+        with self.lock:
+            self.load()
+            index = self.derived.get(name)
+            if index is None:
+                index = self.derived[name] = self.derived_factories[name](self)
+            return index
+    
+    def lookup(self, name, value):
+        """
+        Tra cứu các đối tượng theo chỉ mục phụ
+        
+        Args:
+            name (str): Tên chỉ mục
+            value: Giá trị khóa phụ cần tìm
+        
+        Returns:
+            list: Các đối tượng có khóa phụ bằng value, theo thứ tự trong file
+        """
+        with self.lock:
+            self.load()
+            return list(self._get_index(name).get(value, {}).values())
+    
+    def _put(self, obj):
+        """Thêm hoặc thay thế một đối tượng và cập nhật các chỉ mục phụ"""
+        key = getattr(obj, self.key_attr)
+        old = self.records.get(key)
+        self.records[key] = obj
+        for name, index in self.indexes.items():
+            key_func = self.index_funcs[name]
+            new_value = key_func(obj)
+            if old is not None:
+                old_value = key_func(old)
+                if old_value == new_value:
+                    index[new_value][key] = obj
+                    continue
+                self._unindex(index, old_value, key)
+            index.setdefault(new_value, {})[key] = obj
+        for index in self.derived.values():
+            index.put(obj, old)
+    
+    def _remove(self, key):
+        """Xóa một đối tượng và cập nhật các chỉ mục phụ"""
+        old = self.records.pop(key, None)
+        if old is not None:
+            for name, index in self.indexes.items():
+                self._unindex(index, self.index_funcs[name](old), key)
+            for index in self.derived.values():
+                index.remove(old)
+    
+    @staticmethod
+    def _unindex(index, value, key):
+        """Bỏ một khóa chính khỏi nhóm của chỉ mục phụ, xóa nhóm nếu rỗng"""
+        group = index.get(value)
+        if group is not None:
+            group.pop(key, None)
+            if not group:
+                del index[value]
+    
+    def put(self, obj):
+        """
+        Thêm hoặc thay thế một đối tượng sau khi đã ghi xuống file
+        
+        Args:
+            obj: Đối tượng mô hình
+        """
+        with self.lock:
+            self._put(obj)
+            self.generation += 1
+    
+    def remove(self, key):
+        """
+        Xóa một đối tượng sau khi đã ghi xuống file
+        
+        Args:
+            key: Khóa chính của đối tượng
+        """
+        with self.lock:
+            self._remove(key)
+            self.generation += 1
+    
+    def apply(self, puts=(), deletes=()):
+        """
+        Áp dụng các thay đổi sau khi đã ghi xuống file
+        
+        Args:
+            puts (iterable): Các đối tượng cần thêm hoặc thay thế
+            deletes (iterable): Các khóa chính cần xóa
+        """
+        with self.lock:
+            for key in deletes:
+                self._remove(key)
+            for obj in puts:
+                self._put(obj)
+            self.generation += 1
+    
+    def replace_all(self, records):
+        """
+        Thay thế toàn bộ dữ liệu sau khi đã ghi toàn bộ file bằng save()
+        
+        Args:
+            records (dict): Các đối tượng theo khóa chính
+        """
+        with self.lock:
+            self.records = records
+            self.indexes = {}
+            self.derived = {}
+            self.generation += 1
+    
+    def mark_written(self):
+        """Ghi nhận chữ ký mới của file sau khi chính tiến trình này ghi file"""
+        with self.lock:
+            self.signature = self._signature()
+
+
+def get_table_cache(path, model, key_attr, cache_class=TableCache):
+    """
+    Lấy bộ nhớ đệm dùng chung cho một file dữ liệu
+    
+    Args:
+        path (str): Đường dẫn file JSON
+        model (type): Lớp mô hình
+        key_attr (str): Tên thuộc tính khóa chính
+        cache_class (type): Lớp bộ nhớ đệm cần tạo nếu chưa có
+    
+    Returns:
+        TableCache: Bộ nhớ đệm của file
+    """
+    key = os.path.abspath(path)
+    with _REGISTRY_LOCK:
+        cache = _TABLE_CACHES.get(key)
+        if cache is None or type(cache) is not cache_class:
+            cache = cache_class(path, model, key_attr)
+            _TABLE_CACHES[key] = cache
+        return cache
@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import time
+import hashlib
+import threading
+
+# Bộ nhớ đệm dùng chung cho toàn tiến trình, khóa theo đường dẫn tuyệt đối của thư mục
+_CACHES = {}
+_REGISTRY_LOCK = threading.Lock()
+
+# Khoảng thời gian tối thiểu giữa hai lần dọn các mục quá hạn (giây)
+SWEEP_INTERVAL = 3600
+
+
+def user_cache_dir(*parts):
+    """
+    Lấy thư mục bộ nhớ đệm của ứng dụng trong thư mục cache của người dùng
+    
+    Là %LOCALAPPDATA%\\vtn_vip trên Windows, $XDG_CACHE_HOME/vtn_vip hoặc ~/.cache/vtn_vip
+    trên các hệ điều hành khác, nên không nằm trong thư mục mã nguồn.
+    
+    Args:
+        *parts: Các thư mục con
+    
+    Returns:
+        str: Đường dẫn thư mục (chưa được tạo)
+    """
+    if os.name == 'nt':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'vtn_vip', *parts)
+
+
+def content_hash(*parts):
+    """
+    Tính mã băm SHA-256 của các phần nội dung
+    
+    Args:
+        *parts: Các giá trị có thể chuyển thành JSON (dictionary, chuỗi, số...)
+    
+    Returns:
+        str: Mã băm dạng hexa
+    """
+    data = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+class PdfCache:
+    """
+    Bộ nhớ đệm file PDF trên đĩa, đánh địa chỉ theo mã băm nội dung
+    
+    Mỗi mục là một file <khóa>.pdf trong thư mục đệm. Thời gian sửa file được dùng làm
+    thời điểm truy cập gần nhất: mục quá max_age giây không được dùng nữa và bị xóa khi
+    dọn định kỳ (tối đa mỗi SWEEP_INTERVAL giây một lần, lúc ghi), còn khi tổng dung lượng
+    vượt max_bytes thì các mục lâu không dùng nhất bị xóa trước. File được ghi ra file tạm
+    rồi đổi tên nên nhiều tiến trình có thể dùng chung một thư mục.
+    """
+    
+    def __init__(self, path, max_bytes=200 * 1024 * 1024, max_age=30 * 24 * 3600):
+        """
+        Khởi tạo bộ nhớ đệm
+        
+        Args:
+            path (str): Thư mục lưu các file PDF
+            max_bytes (int): Tổng dung lượng tối đa (byte)
+            max_age (int): Thời gian tối đa một mục không được dùng (giây)
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        # Tổng dung lượng, None khi chưa quét thư mục
+        self._total = None
+        # Thời điểm dọn các mục quá hạn gần nhất
+        self._last_sweep = 0
+    
+    def _file(self, key):
+        """Đường dẫn file của một khóa"""
+        return os.path.join(self.path, f"{key}.pdf")
+    
+    def _entries(self):
+        """Các mục hiện có: danh sách (thời điểm dùng gần nhất, dung lượng, đường dẫn)"""
+        entries = []
+        if not os.path.isdir(self.path):
+            return entries
+        with os.scandir(self.path) as it:
+            for entry in it:
+                if entry.is_file() and entry.name.endswith('.pdf'):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+    
+    def get(self, key):
+        """
+        Đọc nội dung đã lưu của một khóa
+        
+        Args:
+            key (str): Khóa (mã băm nội dung)
+        
+        Returns:
+            bytes: Nội dung file PDF hoặc None nếu chưa có hoặc đã quá hạn
+        """
+        file_path = self._file(key)
+        try:
+            if time.time() - os.path.getmtime(file_path) > self.max_age:
+                self._remove(file_path)
+                return None
+            with open(file_path, 'rb') as f:
+                data = f.read()
+            # Đánh dấu mục vừa được dùng
+            os.utime(file_path)
+            return data
+        except FileNotFoundError:
+            return None
+    
+    def put(self, key, data):
+        """
+        Lưu nội dung của một khóa rồi dọn các mục quá hạn hoặc xóa bớt nếu vượt dung lượng
+        
+        Args:
+            key (str): Khóa (mã băm nội dung)
+            data (bytes): Nội dung file PDF
+        """
+        os.makedirs(self.path, exist_ok=True)
+        file_path = self._file(key)
+        tmp_path = f"{file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, file_path)
+        
+        with self.lock:
+            if self._total is not None:
+                self._total += len(data)
+            if (self._total is None or self._total > self.max_bytes
+                    or time.time() - self._last_sweep >= SWEEP_INTERVAL):
+                self._evict()
+    
+    def _remove(self, file_path):
+        """Xóa một mục"""
+        try:
+            os.remove(file_path)
+        except FileNotFoundError:
+            pass
+    
+    def _evict(self):
+        """Xóa các mục quá hạn, sau đó các mục lâu không dùng nhất cho đến khi đủ dung lượng"""
+        now = time.time()
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for mtime, size, file_path in entries:
+            if total <= self.max_bytes and now - mtime <= self.max_age:
+                continue
+            self._remove(file_path)
+            total -= size
+        self._total = total
+        self._last_sweep = now
+    
+    def clear(self):
+        """Xóa toàn bộ bộ nhớ đệm"""
+        with self.lock:
+            for _, _, file_path in self._entries():
+                self._remove(file_path)
+            self._total = 0
+
+
+def get_pdf_cache(path):
+    """
+    Lấy bộ nhớ đệm PDF dùng chung cho một thư mục
+    
+    Args:
+        path (str): Thư mục lưu các file PDF
+    
+    Returns:
+        PdfCache: Bộ nhớ đệm của thư mục
+    """
+    key = os.path.abspath(path)
+    with _REGISTRY_LOCK:
+        cache = _CACHES.get(key)
+        if cache is None:
+            cache = PdfCache(path)
+            _CACHES[key] = cache
+        return cache
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+def missing_months(ky_truoc, thang, nam):
+    """
+    Đếm số tháng không có hóa đơn giữa kỳ trước và một kỳ hóa đơn
+    
+    Args:
+        ky_truoc (tuple): (năm, tháng, ...) của kỳ trước hoặc None
+        thang (int): Tháng của kỳ hóa đơn
+        nam (int): Năm của kỳ hóa đơn
+    
+    Returns:
+        int: Số tháng bị thiếu, 0 nếu kỳ trước là tháng liền trước hoặc không có kỳ trước
+    """
+    if ky_truoc is None:
+        return 0
+    return max(0, (nam * 12 + thang) - (ky_truoc[0] * 12 + ky_truoc[1]) - 1)
+
+
+class LatestReadingIndex:
+    """
+    Chỉ mục chỉ số công tơ mới nhất của từng khách hàng: mã khách hàng -> (năm, tháng,
+    chỉ số cuối, mã hóa đơn) của hóa đơn có kỳ muộn nhất
+    
+    Được đăng ký làm chỉ mục dẫn xuất của bộ nhớ đệm hóa đơn nên được cập nhật theo từng
+    lần ghi. Khi hóa đơn mới nhất của một khách hàng bị xóa hoặc sửa, khách hàng đó được
+    đánh dấu và tính lại từ các hóa đơn của khách hàng ở lần tra cứu kế tiếp. Khi nhiều hóa
+    đơn cùng kỳ, hóa đơn đứng sau được dùng.
+    """
+    
+    def __init__(self, hoa_don_list, hoa_don_cua_khach_hang):
+        """
+        Tạo chỉ mục
+        
+        Args:
+            hoa_don_list (iterable): Các hóa đơn hiện có
+            hoa_don_cua_khach_hang (callable): Hàm lấy các hóa đơn của một khách hàng, dùng
+                để tính lại khách hàng đã bị đánh dấu
+        """
+        self.hoa_don_cua_khach_hang = hoa_don_cua_khach_hang
+        self.latest = {}
+        # Các khách hàng cần tính lại hóa đơn mới nhất
+        self.stale = set()
+        for hd in hoa_don_list:
+            self._add(hd)
+    
+    def _add(self, hd):
+        """Cập nhật chỉ mục với một hóa đơn"""
+        if hd.nam is None or hd.thang is None or hd.ma_khach_hang in self.stale:
+            return
+        hien_tai = self.latest.get(hd.ma_khach_hang)
+        if hien_tai is None or (hd.nam, hd.thang) >= hien_tai[:2]:
+            self.latest[hd.ma_khach_hang] = (hd.nam, hd.thang, hd.chi_so_cuoi, hd.ma_hoa_don)
+    
+    def put(self, obj, old):
+        """Cập nhật chỉ mục khi một hóa đơn được thêm hoặc thay thế"""
+        if old is not None:
+            self.remove(old)
+        self._add(obj)
+    
+    def remove(self, old):
+        """Cập nhật chỉ mục khi một hóa đơn bị xóa"""
+        hien_tai = self.latest.get(old.ma_khach_hang)
+        if hien_tai is not None and hien_tai[3] == old.ma_hoa_don:
+            del self.latest[old.ma_khach_hang]
+            self.stale.add(old.ma_khach_hang)
+    
+    def _refresh(self, ma_khach_hang):
+        """Tính lại hóa đơn mới nhất của một khách hàng đã bị đánh dấu"""
+        self.stale.discard(ma_khach_hang)
+        for hd in self.hoa_don_cua_khach_hang(ma_khach_hang):
+            self._add(hd)
+    
+    def get(self, ma_khach_hang):
+        """
+        Lấy chỉ số mới nhất của một khách hàng
+        
+        Args:
+            ma_khach_hang (str): Mã khách hàng
+        
+        Returns:
+            tuple: (năm, tháng, chỉ số cuối, mã hóa đơn) hoặc None nếu chưa có hóa đơn
+        """
+        if ma_khach_hang in self.stale:
+            self._refresh(ma_khach_hang)
+        return self.latest.get(ma_khach_hang)
+    
+    def items(self):
+        """
+        Lấy chỉ số mới nhất của tất cả khách hàng
+        
+        Returns:
+            list: Các cặp (mã khách hàng, (năm, tháng, chỉ số cuối, mã hóa đơn))
+        """
+        for ma_khach_hang in list(self.stale):
+            self._refresh(ma_khach_hang)
+        return list(self.latest.items())